@@ -488,7 +488,7 @@ class TestCommand(TestBaseCommand):
         '''
         Finds all the tests modules in tests/, and runs them.
         '''
-        excludes = ["dist.py", "test_urls.py", "test_inject.py"]
+        excludes = ["dist.py", "test_urls.py", "test_inject.py", "perf.py"]
         testfiles = self._find_tests_in_dir("tests", excludes)
 
         # Put clitest at the end, since it takes the longest
@@ -560,6 +560,15 @@ class TestInitrdInject(TestBaseCommand):
         TestBaseCommand.run(self)
 
 
+class TestPerf(TestBaseCommand):
+    description = "Run performance microbenchmarks"
+
+    def run(self):
+        self._testfiles = ["tests.perf"]
+        self._force_verbose = True
+        TestBaseCommand.run(self)
+
+
 class TestDist(TestBaseCommand):
     description = "Tests to run before cutting a release"
 
@@ -700,6 +709,7 @@ distutils.core.setup(
         'test_ui': TestUI,
         'test_urls': TestURLFetch,
         'test_initrd_inject': TestInitrdInject,
+        'test_perf': TestPerf,
         'test_dist': TestDist,
     },
 
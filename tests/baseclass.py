@@ -0,0 +1,105 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import unittest
+
+from tests import utils
+
+_gi_error = utils.init_virtmanager()
+if not _gi_error:
+    from gi.repository import GLib
+    from virtManager.baseclass import _IdleEmitDispatcher
+
+# pylint: disable=protected-access
+
+
+class _FakeObject(object):
+    """
+    Records emissions into a list shared by every _FakeObject
+    """
+    def __init__(self, name, emitted):
+        self.name = name
+        self._emitted = emitted
+
+    def emit(self, signal, *args):
+        self._emitted.append((self.name, signal) + args)
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestIdleEmit(unittest.TestCase):
+    def setUp(self):
+        self.emitted = []
+        self.dispatcher = _IdleEmitDispatcher()
+        self.obj1 = _FakeObject("obj1", self.emitted)
+        self.obj2 = _FakeObject("obj2", self.emitted)
+
+    def _iterate(self):
+        """
+        Run a single idle callback, return True if more are pending
+        """
+        return GLib.MainContext.default().iteration(False)
+
+    def _flush(self):
+        while self._iterate():
+            pass
+
+    def testMerge(self):
+        self.dispatcher.queue(self.obj1, "state-changed", ())
+        self.dispatcher.queue(self.obj2, "state-changed", ())
+        self.dispatcher.queue(self.obj1, "resources-sampled", ())
+        # Duplicate of the first emission, folded in at its position
+        self.dispatcher.queue(self.obj1, "state-changed", ())
+        # Different args are separate emissions
+        self.dispatcher.queue(self.obj2, "state-changed", (1,))
+        # Unhashable args are never folded
+        self.dispatcher.queue(self.obj2, "changed", ([],))
+        self.dispatcher.queue(self.obj2, "changed", ([],))
+        self._flush()
+
+        self.assertEqual(self.emitted, [
+            ("obj1", "state-changed"),
+            ("obj2", "state-changed"),
+            ("obj1", "resources-sampled"),
+            ("obj2", "state-changed", 1),
+            ("obj2", "changed", []),
+            ("obj2", "changed", []),
+        ])
+        self.assertEqual(self.dispatcher.get_stats(), {
+            "queued": 7, "merged": 1, "emitted": 6, "deferred": 0})
+
+        # Once emitted, the same signal is queued again
+        self.dispatcher.queue(self.obj1, "state-changed", ())
+        self._flush()
+        self.assertEqual(self.emitted[-1], ("obj1", "state-changed"))
+        self.assertEqual(self.dispatcher.get_stats()["emitted"], 7)
+
+    def testBudget(self):
+        self.dispatcher.budget = 3
+        for idx in range(8):
+            self.dispatcher.queue(self.obj1, "changed", (idx,))
+
+        self._iterate()
+        self.assertEqual(len(self.emitted), 3)
+        self.assertEqual(self.dispatcher.get_stats()["deferred"], 1)
+        self._iterate()
+        self.assertEqual(len(self.emitted), 6)
+        self._flush()
+        self.assertEqual(self.emitted,
+                         [("obj1", "changed", idx) for idx in range(8)])
+        self.assertEqual(self.dispatcher.get_stats(), {
+            "queued": 8, "merged": 0, "emitted": 8, "deferred": 2})
+
+    def testEmitError(self):
+        # One failing handler doesn't stop the rest of the queue
+        def _fail(*args):
+            raise RuntimeError("fake emit failure %s" % (args,))
+        badobj = _FakeObject("bad", self.emitted)
+        badobj.emit = _fail
+
+        self.dispatcher.queue(badobj, "changed", ())
+        self.dispatcher.queue(self.obj1, "changed", ())
+        self._flush()
+        self.assertEqual(self.emitted, [("obj1", "changed")])
+        self.assertEqual(self.dispatcher.get_stats()["emitted"], 2)
@@ -4,7 +4,6 @@
 # See the COPYING file in the top-level directory.
 
 import atexit
-from distutils.spawn import find_executable
 import io
 import logging
 import os
@@ -29,7 +28,6 @@ os.environ["DISPLAY"] = ":3.4"
 TMP_IMAGE_DIR = "/tmp/__virtinst_cli_"
 XMLDIR = "tests/cli-test-xml"
 OLD_OSINFO = utils.has_old_osinfo()
-HAS_ISOINFO = find_executable("isoinfo")
 
 # Images that will be created by virt-install/virt-clone, and removed before
 # each run
@@ -89,11 +87,6 @@ def has_old_osinfo():
         return "osinfo is too old"
 
 
-def missing_isoinfo():
-    if not HAS_ISOINFO:
-        return "isoinfo not installed"
-
-
 ######################
 # Test class helpers #
 ######################
@@ -852,8 +845,8 @@ c.add_compare("--arch s390x --machine s390-ccw-virtio --connect " + utils.URIs.k
 c.add_compare("--connect " + utils.URIs.kvm_session + " --disk size=8 --os-variant fedora21 --cdrom %(EXISTIMG1)s", "kvm-session-defaults", prerun_check=has_old_osinfo)
 
 # misc KVM config tests
-c.add_compare("--disk none --location %(ISO-NO-OS)s,kernel=frib.img,initrd=/frob.img", "location-manual-kernel", prerun_check=missing_isoinfo)  # --location with an unknown ISO but manually specified kernel paths
-c.add_compare("--disk %(EXISTIMG1)s --location %(ISOTREE)s --nonetworks", "location-iso", prerun_check=missing_isoinfo)  # Using --location iso mounting
+c.add_compare("--disk none --location %(ISO-NO-OS)s,kernel=frib.img,initrd=/frob.img", "location-manual-kernel")  # --location with an unknown ISO but manually specified kernel paths
+c.add_compare("--disk %(EXISTIMG1)s --location %(ISOTREE)s --nonetworks", "location-iso")  # Using --location iso mounting
 c.add_compare("--disk %(EXISTIMG1)s --cdrom %(ISOLABEL)s", "cdrom-centos-label")  # Using --cdrom with centos CD label, should use virtio etc.
 c.add_compare("--disk %(EXISTIMG1)s --pxe --os-variant rhel5.4", "kvm-rhel5")  # RHEL5 defaults
 c.add_compare("--disk %(EXISTIMG1)s --pxe --os-variant rhel6.4", "kvm-rhel6")  # RHEL6 defaults
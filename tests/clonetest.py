@@ -6,10 +6,14 @@
 import unittest
 import os
 import logging
+import shutil
+import tempfile
 
 from tests import utils
 
 from virtinst import Cloner
+from virtinst import progress
+from virtinst.diskbackend import CloneStorageCreator
 
 ORIG_NAME  = "clone-orig"
 CLONE_NAME = "clone-new"
@@ -170,3 +174,62 @@ class TestClone(unittest.TestCase):
 
     def testCloneChannelSource(self):
         self._clone("channel-source")
+
+
+class TestCloneLocal(unittest.TestCase):
+    """
+    Test the local file copying done by CloneStorageCreator
+    """
+    SIZE = 32 * 1024 * 1024
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="virtinst-clone-")
+        self.input_path = os.path.join(self.tmpdir, "input.img")
+        self.output_path = os.path.join(self.tmpdir, "output.img")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _clone_local(self, sparse):
+        conn = utils.URIs.open_testdefault_cached()
+        creator = CloneStorageCreator(conn, self.output_path,
+                self.input_path, float(self.SIZE) / (1024 ** 3), sparse)
+        meter = progress.BaseMeter()
+        meter.start(size=self.SIZE)
+        # pylint: disable=protected-access
+        creator._clone_local(meter, self.SIZE)
+
+        self.assertEqual(open(self.input_path, "rb").read(),
+                         open(self.output_path, "rb").read())
+        return os.stat(self.output_path).st_blocks * 512
+
+    def _write_data(self, f):
+        for offset in [0, 5 * 1024 * 1024, 20 * 1024 * 1024 + 123]:
+            f.seek(offset)
+            f.write(os.urandom(300 * 1024))
+
+    def testCloneSparseFile(self):
+        # Holes in the input should stay holes in the output
+        with open(self.input_path, "wb") as f:
+            f.truncate(self.SIZE)
+            self._write_data(f)
+        allocated = self._clone_local(True)
+        self.assertTrue(allocated < self.SIZE // 4)
+
+    def testCloneAllocatedZeros(self):
+        # A fully allocated input with runs of zeros should still
+        # produce a sparse output
+        with open(self.input_path, "wb") as f:
+            f.write(bytes(self.SIZE))
+            self._write_data(f)
+        allocated = self._clone_local(True)
+        self.assertTrue(allocated < self.SIZE // 4)
+
+    def testCloneNonSparse(self):
+        # Existing output file, so the contents are copied in full
+        with open(self.input_path, "wb") as f:
+            f.truncate(self.SIZE)
+            self._write_data(f)
+        with open(self.output_path, "wb") as f:
+            f.write(os.urandom(1024))
+        self._clone_local(True)
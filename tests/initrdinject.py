@@ -0,0 +1,142 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import gzip
+import lzma
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from virtinst import initrdinject
+
+
+def _read_newc(data):
+    """
+    Parse a newc cpio archive, return a list of
+    (name, mode, uid, gid, content) tuples
+    """
+    def _align(offset):
+        return offset + ((4 - (offset % 4)) % 4)
+
+    ret = []
+    offset = 0
+    while True:
+        header = data[offset:offset + 110]
+        assert header[:6] == b"070701"
+        fields = [int(header[6 + (i * 8):14 + (i * 8)], 16)
+                  for i in range(13)]
+        mode, uid, gid = fields[1:4]
+        filesize = fields[6]
+        namesize = fields[11]
+
+        offset += 110
+        name = data[offset:offset + namesize - 1].decode("utf-8")
+        offset = _align(offset + namesize)
+        content = data[offset:offset + filesize]
+        offset = _align(offset + filesize)
+
+        if name == "TRAILER!!!":
+            break
+        ret.append((name, mode, uid, gid, content))
+    return ret
+
+
+class TestInitrdInject(unittest.TestCase):
+    """
+    Round trip tests for the in-process initrd cpio writer
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="virtinst-initrdinject-")
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        self.initrd = os.path.join(self.tmpdir, "initrd.img")
+        self.origdata = b"original initrd contents\0" * 37
+        with open(self.initrd, "wb") as f:
+            f.write(self.origdata)
+
+        self.files = {}
+        for name, content in [
+                ("new-kickstart.ks",
+                 open("tests/inject-data/new-kickstart.ks", "rb").read()),
+                ("empty.cfg", b""),
+                ("odd-size.bin", os.urandom(12345)),
+                ("big.bin", os.urandom(3 * 1024 * 1024 + 3))]:
+            path = os.path.join(self.tmpdir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            os.chmod(path, 0o640)
+            self.files[path] = content
+
+    def _check_roundtrip(self, compression, decompress):
+        kwargs = {}
+        if compression:
+            kwargs["compression"] = compression
+        initrdinject.perform_initrd_injections(self.initrd,
+                                               sorted(self.files), **kwargs)
+
+        data = open(self.initrd, "rb").read()
+        self.assertEqual(data[:len(self.origdata)], self.origdata)
+        entries = _read_newc(decompress(data[len(self.origdata):]))
+
+        self.assertEqual(entries[0][0], ".")
+        self.assertEqual(entries[0][1], stat.S_IFDIR | 0o775)
+        self.assertEqual(len(entries), len(self.files) + 1)
+        for (name, mode, uid, gid, content), path in zip(
+                entries[1:], sorted(self.files)):
+            self.assertEqual(name, os.path.basename(path))
+            self.assertEqual(mode, stat.S_IFREG | 0o640)
+            self.assertEqual((uid, gid), (0, 0))
+            self.assertEqual(content, self.files[path])
+
+    def testDefault(self):
+        # gzip unless asked otherwise
+        self._check_roundtrip(None, gzip.decompress)
+
+    def testGzip(self):
+        self._check_roundtrip("gzip", gzip.decompress)
+
+    def testXZ(self):
+        self._check_roundtrip("xz", lzma.decompress)
+
+    def testZstd(self):
+        if "zstd" not in initrdinject.get_initrd_compressions():
+            self.skipTest("zstandard module not available")
+        import zstandard  # pylint: disable=import-error
+        def _decompress(data):
+            return zstandard.ZstdDecompressor().decompressobj(
+                    ).decompress(data)
+        self._check_roundtrip("zstd", _decompress)
+
+    def testUnknownCompression(self):
+        self.assertRaises(ValueError, initrdinject.perform_initrd_injections,
+                          self.initrd, sorted(self.files), compression="lz4")
+
+    def testNoInjections(self):
+        initrdinject.perform_initrd_injections(self.initrd, [])
+        self.assertEqual(open(self.initrd, "rb").read(), self.origdata)
+
+    def testMatchesCpio(self):
+        if not shutil.which("cpio"):
+            self.skipTest("cpio binary not available")
+
+        # Have the real cpio tool extract our archive
+        initrdinject.perform_initrd_injections(self.initrd,
+                                               sorted(self.files))
+        archive = gzip.decompress(
+                open(self.initrd, "rb").read()[len(self.origdata):])
+
+        extractdir = os.path.join(self.tmpdir, "extract")
+        os.mkdir(extractdir)
+        import subprocess
+        proc = subprocess.Popen(["cpio", "--extract", "--quiet",
+                                 "--no-absolute-filenames"],
+                                stdin=subprocess.PIPE, cwd=extractdir)
+        proc.communicate(archive)
+        self.assertEqual(proc.returncode, 0)
+        for path, content in self.files.items():
+            extracted = os.path.join(extractdir, os.path.basename(path))
+            self.assertEqual(open(extracted, "rb").read(), content)
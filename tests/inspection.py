@@ -0,0 +1,244 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tests import utils
+from virtcli import CLIConfig
+
+_gi_error = utils.init_virtmanager()
+if not _gi_error:
+    from virtManager import inspection
+    from virtManager.config import vmmConfig
+    from virtManager.domain import (vmmInspectionApplication,
+            vmmInspectionData)
+
+# pylint: disable=protected-access
+
+
+class _FakeDisk(object):
+    def __init__(self, path):
+        self.path = path
+
+
+class _FakeVM(object):
+    """
+    Just the bits of a vmmDomain that the inspection code reads
+    """
+    def __init__(self, uuid, cachedir, diskpaths):
+        self._uuid = uuid
+        self._cachedir = cachedir
+        self.disks = [_FakeDisk(p) for p in diskpaths]
+        self.inspection = None
+
+    def get_uuid(self):
+        return self._uuid
+
+    def get_name(self):
+        return "vm-" + self._uuid
+
+    def get_cache_dir(self):
+        return self._cachedir
+
+    def get_disk_devices_norefresh(self):
+        return self.disks
+
+
+class _FakeConn(object):
+    def __init__(self, vm):
+        self._vm = vm
+
+    def get_uri(self):
+        return "test:///fake"
+
+    def get_vm(self, connkey):
+        if connkey == self._vm.get_name():
+            return self._vm
+        return None
+
+
+def _make_data():
+    data = vmmInspectionData()
+    data.os_type = "linux"
+    data.distro = "fedora"
+    data.major_version = 30
+    data.minor_version = 0
+    data.hostname = "fakehost"
+    data.product_name = "Fedora 30"
+    data.package_format = "rpm"
+    data.icon = b"\x89PNG\x00\xff fake icon"
+    app = vmmInspectionApplication()
+    app.name = "bash"
+    app.version = "5.0"
+    app.epoch = 0
+    data.applications = [app]
+    return data
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestInspectionDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="virtmanager-inspection-")
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.diskpath = os.path.join(self.tmpdir, "disk.img")
+        with open(self.diskpath, "wb") as f:
+            f.write(b"\0" * 1024)
+        self.vm = _FakeVM("1234", self.tmpdir, [self.diskpath])
+
+    def _save(self):
+        signature = inspection._get_disk_signature(self.vm)
+        inspection._save_disk_cache(self.vm, signature, _make_data())
+
+    def _load(self):
+        signature = inspection._get_disk_signature(self.vm)
+        return inspection._load_disk_cache(self.vm, signature)
+
+    def testRoundTrip(self):
+        self.assertEqual(self._load(), None)
+        self._save()
+        data = self._load()
+        orig = _make_data()
+        for key, val in orig.__dict__.items():
+            if key == "applications":
+                continue
+            self.assertEqual(getattr(data, key), val)
+        self.assertEqual(len(data.applications), 1)
+        self.assertEqual(data.applications[0].__dict__,
+                         orig.applications[0].__dict__)
+
+    def testInvalidation(self):
+        self._save()
+        self.assertTrue(self._load())
+
+        # New mtime
+        st = os.stat(self.diskpath)
+        os.utime(self.diskpath, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        self.assertEqual(self._load(), None)
+        self._save()
+        self.assertTrue(self._load())
+
+        # New size, with the mtime put back
+        st = os.stat(self.diskpath)
+        with open(self.diskpath, "ab") as f:
+            f.write(b"\0")
+        os.utime(self.diskpath, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(self._load(), None)
+        self._save()
+        self.assertTrue(self._load())
+
+        # Different disk path
+        newpath = self.diskpath + ".new"
+        shutil.copy2(self.diskpath, newpath)
+        self.vm.disks = [_FakeDisk(newpath)]
+        self.assertEqual(self._load(), None)
+
+        # Different VM using the same cache dir
+        self.vm.disks = [_FakeDisk(self.diskpath)]
+        self.assertTrue(self._load())
+        self.vm._uuid = "5678"
+        self.assertEqual(self._load(), None)
+
+    def testCorrupt(self):
+        self._save()
+        cachefile = os.path.join(self.tmpdir, inspection._CACHE_FILENAME)
+        for content in ["", "{not json", "[]", '{"version": 1}',
+                        '{"version": 999, "uuid": "1234", "disks": []}']:
+            with open(cachefile, "w") as f:
+                f.write(content)
+            self.assertEqual(self._load(), None)
+
+        # A good save replaces the broken file
+        self._save()
+        self.assertTrue(self._load())
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestInspectionQueue(unittest.TestCase):
+    def setUp(self):
+        config = vmmConfig.get_instance(CLIConfig, True)
+        self.addCleanup(config.set_libguestfs_inspect_vms,
+                        config.get_libguestfs_inspect_vms())
+        # Disabled, so no threads or connmanager hookups are started
+        config.set_libguestfs_inspect_vms(False)
+
+        with mock.patch.object(inspection.vmmInspection,
+                               "_cleanup_on_app_close"):
+            self.inspection = inspection.vmmInspection()
+
+        self.vm = _FakeVM("1234", None, [])
+        self.conn = _FakeConn(self.vm)
+        self.inspection._conns[self.conn.get_uri()] = self.conn
+
+    def testRefreshWhileInspecting(self):
+        insp = self.inspection
+        calls = []
+        done = threading.Event()
+
+        def _process_vm(conn, vm, force=False):
+            ignore = conn
+            calls.append(force)
+            if len(calls) == 1:
+                # Refresh requested while the first inspection is
+                # still running
+                insp._process_queue_item(("vm_refresh", conn.get_uri(),
+                                          vm.get_name(), vm.get_uuid()))
+                self.assertTrue(insp._work_q.empty())
+            else:
+                done.set()
+        insp._process_vm = _process_vm
+
+        insp._process_queue_item(
+                ("vm_added", self.conn.get_uri(), self.vm.get_name()))
+        worker = threading.Thread(target=insp._run_worker,
+                                  args=(insp._work_q,))
+        worker.daemon = True
+        worker.start()
+
+        done.wait(10)
+        insp._work_q.put(None)
+        worker.join(10)
+        self.assertEqual(calls, [False, True])
+        self.assertEqual(insp._in_progress, set())
+        self.assertEqual(insp._pending_refresh, {})
+
+    def testCleanupResetsInProgress(self):
+        # A worker stopped mid-inspection leaves its VM in progress
+        insp = self.inspection
+        insp._process_queue_item(
+                ("vm_added", self.conn.get_uri(), self.vm.get_name()))
+        insp._process_queue_item(("vm_refresh", self.conn.get_uri(),
+                                  self.vm.get_name(), self.vm.get_uuid()))
+        self.assertEqual(insp._in_progress, set([self.vm.get_uuid()]))
+
+        insp._cleanup()
+        self.assertEqual(insp._in_progress, set())
+        self.assertEqual(insp._pending_refresh, {})
+
+        # After a restart the VM is queued again
+        insp._conns[self.conn.get_uri()] = self.conn
+        insp._process_queue_item(
+                ("vm_added", self.conn.get_uri(), self.vm.get_name()))
+        self.assertEqual(insp._work_q.get_nowait(),
+                         (self.conn, self.vm, False))
+
+    def testForceSkipsMemoryCache(self):
+        insp = self.inspection
+        stale = vmmInspectionData()
+        fresh = _make_data()
+        insp._cached_data[self.vm.get_uuid()] = stale
+        self.vm.inspection_data_updated = lambda: None
+        self.conn.is_remote = lambda: True
+        insp._inspect_vm = lambda conn, vm: fresh
+
+        insp._process_vm(self.conn, self.vm)
+        self.assertTrue(self.vm.inspection is stale)
+        insp._process_vm(self.conn, self.vm, force=True)
+        self.assertTrue(self.vm.inspection is fresh)
+        self.assertTrue(insp._cached_data[self.vm.get_uuid()] is fresh)
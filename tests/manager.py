@@ -0,0 +1,121 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import unittest
+
+from tests import utils
+
+_gi_error = utils.init_virtmanager()
+if not _gi_error:
+    from gi.repository import Gtk
+    from virtManager import manager
+
+# pylint: disable=protected-access
+
+
+class _FakeHandle(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeManager(object):
+    """
+    Just the row bookkeeping bits of vmmManager, over a sorted
+    TreeStore like the real one
+    """
+    def __init__(self):
+        self._row_refs = {}
+        self._sparkline_data = {}
+        self.model = Gtk.TreeStore(object, str)
+        self.model.set_sort_column_id(manager.ROW_SORT_KEY,
+                                      Gtk.SortType.ASCENDING)
+
+    def get_row(self, conn_or_vm):
+        return manager.vmmManager.get_row(self, conn_or_vm)
+
+    def _append_row(self, parentiter, row):
+        manager.vmmManager._append_row(self, parentiter, row)
+
+    def _remove_row(self, rowiter):
+        manager.vmmManager._remove_row(self, rowiter)
+
+    def add(self, parent, handle):
+        row = [None, None]
+        row[manager.ROW_HANDLE] = handle
+        row[manager.ROW_SORT_KEY] = handle.name
+        parentiter = parent and self.get_row(parent).iter or None
+        self._append_row(parentiter, row)
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestManagerRows(unittest.TestCase):
+    """
+    Check vmmManager's handle -> row index stays correct as rows
+    are added, removed and moved around by sorting
+    """
+    def setUp(self):
+        self.fake = _FakeManager()
+        self.conns = [_FakeHandle("conn%d" % idx) for idx in range(2)]
+        self.vms = {}
+        for conn in self.conns:
+            self.fake.add(None, conn)
+            # Added in reverse order, so sorting moves every row
+            self.vms[conn] = [_FakeHandle("%s-vm%02d" % (conn.name, idx))
+                              for idx in reversed(range(20))]
+            for vm in self.vms[conn]:
+                self.fake.add(conn, vm)
+
+    def _check_rows(self):
+        for conn in self.conns:
+            row = self.fake.get_row(conn)
+            self.assertTrue(row[manager.ROW_HANDLE] is conn)
+            self.assertEqual(row.parent, None)
+            for vm in self.vms[conn]:
+                row = self.fake.get_row(vm)
+                self.assertTrue(row[manager.ROW_HANDLE] is vm)
+                self.assertTrue(row.parent[manager.ROW_HANDLE] is conn)
+
+    def testAdd(self):
+        self._check_rows()
+        names = [row[manager.ROW_SORT_KEY] for row in
+                 self.fake.get_row(self.conns[0]).iterchildren()]
+        self.assertEqual(names, sorted(names))
+
+    def testRemove(self):
+        conn = self.conns[0]
+        for vm in self.vms[conn][::2]:
+            self.fake._remove_row(self.fake.get_row(vm).iter)
+            self.assertEqual(self.fake.get_row(vm), None)
+        removed = self.vms[conn][::2]
+        self.vms[conn] = self.vms[conn][1::2]
+        self._check_rows()
+        for vm in removed:
+            self.assertEqual(self.fake.get_row(vm), None)
+
+        # Removing a conn row drops its VM rows too
+        self.fake._remove_row(self.fake.get_row(conn).iter)
+        self.assertEqual(self.fake.get_row(conn), None)
+        for vm in self.vms[conn]:
+            self.assertEqual(self.fake.get_row(vm), None)
+        self.conns.remove(conn)
+        self._check_rows()
+
+    def testReorder(self):
+        # Renaming resorts the rows underneath the references
+        conn = self.conns[1]
+        for vm in self.vms[conn]:
+            vm.name = "zz" + vm.name[::-1]
+            self.fake.get_row(vm)[manager.ROW_SORT_KEY] = vm.name
+        self._check_rows()
+
+        self.fake.model.set_sort_column_id(manager.ROW_SORT_KEY,
+                                           Gtk.SortType.DESCENDING)
+        self._check_rows()
+
+        # New rows land in the middle of the sorted list
+        vm = _FakeHandle("zz-new")
+        self.vms[conn].append(vm)
+        self.fake.add(conn, vm)
+        self._check_rows()
@@ -0,0 +1,133 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import unittest
+
+from virtinst import DeviceDisk
+from virtinst.pathindex import DiskPathIndex
+
+# pylint: disable=protected-access
+
+
+class _Disk(object):
+    def __init__(self, path, shareable=False, read_only=False):
+        self.path = path
+        self.shareable = shareable
+        self.read_only = read_only
+
+
+class _Guest(object):
+    """
+    Just the bits of a Guest that DiskPathIndex reads
+    """
+    class _OS(object):
+        def __init__(self, kernel, initrd, dtb):
+            self.kernel = kernel
+            self.initrd = initrd
+            self.dtb = dtb
+
+    class _Devices(object):
+        def __init__(self, disks):
+            self.disk = disks
+
+    def __init__(self, name, disks=None, kernel=None, initrd=None, dtb=None):
+        self.name = name
+        self.os = self._OS(kernel, initrd, dtb)
+        self.devices = self._Devices(disks or [])
+
+
+class _Vol(object):
+    def __init__(self, target_path, backing_store=None):
+        self.target_path = target_path
+        self.backing_store = backing_store
+
+
+class _Conn(object):
+    def __init__(self, index):
+        self._index = index
+
+    def get_path_index(self):
+        return self._index
+
+
+class TestDiskPathIndex(unittest.TestCase):
+    def setUp(self):
+        self.vols = [
+            _Vol("/pool/base.img"),
+            _Vol("/pool/mid.qcow2", "/pool/base.img"),
+            _Vol("/pool/top1.qcow2", "/pool/mid.qcow2"),
+            _Vol("/pool/top2.qcow2", "/pool/mid.qcow2"),
+            _Vol("/pool/other.img"),
+        ]
+        self.guests = [
+            _Guest("vm-top1", [_Disk("/pool/top1.qcow2")]),
+            _Guest("vm-shared", [_Disk("/pool/other.img", shareable=True)]),
+            _Guest("vm-readonly", [_Disk("/pool/other.img", read_only=True),
+                                   _Disk(None)]),
+            _Guest("vm-kernel", [_Disk("/pool/top2.qcow2")],
+                   kernel="/boot/vmlinuz", initrd="/boot/initrd.img"),
+        ]
+        self.index = DiskPathIndex()
+        self.index.sync(self.guests, self.vols)
+
+    def _in_use_by(self, path, **kwargs):
+        return DeviceDisk.path_in_use_by(_Conn(self.index), path, **kwargs)
+
+    def testBackingChain(self):
+        self.assertEqual(sorted(self.index.get_backed_paths("/pool/base.img")),
+                         ["/pool/mid.qcow2", "/pool/top1.qcow2",
+                          "/pool/top2.qcow2"])
+        self.assertEqual(
+            sorted(self.index.get_backed_paths("/pool/mid.qcow2")),
+            ["/pool/top1.qcow2", "/pool/top2.qcow2"])
+        self.assertEqual(self.index.get_backed_paths("/pool/top1.qcow2"), [])
+
+        # VMs using a volume backed by 'path' are users of 'path'
+        self.assertEqual(self._in_use_by("/pool/base.img"),
+                         ["vm-top1", "vm-kernel"])
+        self.assertEqual(self._in_use_by("/pool/top1.qcow2"), ["vm-top1"])
+        self.assertEqual(self._in_use_by("/pool/unused.img"), [])
+
+    def testShareableReadOnly(self):
+        self.assertEqual(self._in_use_by("/pool/other.img"),
+                         ["vm-shared", "vm-readonly"])
+        self.assertEqual(self._in_use_by("/pool/other.img", shareable=True),
+                         ["vm-readonly"])
+        self.assertEqual(self._in_use_by("/pool/other.img", read_only=True),
+                         ["vm-shared"])
+
+    def testBootPaths(self):
+        self.assertEqual(self._in_use_by("/boot/vmlinuz"), ["vm-kernel"])
+        self.assertEqual(self._in_use_by("/boot/initrd.img"), ["vm-kernel"])
+        # Kernel and initrd are only read by the VM
+        self.assertEqual(self._in_use_by("/boot/vmlinuz", read_only=True), [])
+
+        users = self.index.get_users(["/boot/vmlinuz"])
+        self.assertEqual(len(users), 1)
+        self.assertEqual(users[0][1], [("/boot/vmlinuz", True, False, False)])
+
+    def testIncrementalSync(self):
+        # A changed guest shows up as a new object. The old object's
+        # paths go away with it
+        newtop1 = _Guest("vm-top1", [_Disk("/pool/other.img")])
+        guests = [newtop1] + self.guests[1:3]
+        vols = self.vols[:3]
+        self.index.sync(guests, vols)
+
+        self.assertEqual(self._in_use_by("/pool/top1.qcow2"), [])
+        self.assertEqual(self._in_use_by("/boot/vmlinuz"), [])
+        self.assertEqual(self._in_use_by("/pool/other.img"),
+                         ["vm-top1", "vm-shared", "vm-readonly"])
+        self.assertEqual(sorted(self.index.get_backed_paths("/pool/base.img")),
+                         ["/pool/mid.qcow2", "/pool/top1.qcow2"])
+        self.assertEqual(self.index.get_backed_paths("/pool/mid.qcow2"),
+                         ["/pool/top1.qcow2"])
+
+        # Dropping everything leaves an empty index
+        self.index.sync([], [])
+        self.assertEqual(self.index.get_users(["/pool/other.img"]), [])
+        self.assertEqual(self.index.get_backed_paths("/pool/base.img"), [])
+        self.assertEqual(self.index._users, {})
+        self.assertEqual(self.index._backed, {})
@@ -0,0 +1,671 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+"""
+Microbenchmarks for hot paths. These aren't pass/fail tests, they print
+timings so changes can be compared. Run with ./setup.py test_perf
+"""
+
+import os
+import time
+import unittest
+
+from virtcli import CLIConfig
+
+
+# pylint: disable=protected-access
+# Benchmarks poke at internals directly
+
+
+def _timeit(func, iterations=1):
+    start = time.time()
+    for ignore in range(iterations):
+        func()
+    return (time.time() - start) / iterations
+
+
+def _report(title, results):
+    print("\n%s" % title)
+    for label, secs in results:
+        print("    %-30s %10.3f ms" % (label, secs * 1000))
+
+
+def _init_vmm_config():
+    """
+    Set up enough of virt-manager's environment that virtManager
+    objects can be instantiated without a running app
+    """
+    from tests import utils
+    error = utils.init_virtmanager()
+    if error:
+        raise unittest.SkipTest("virtManager unavailable: %s" % error)
+    from virtManager.config import vmmConfig
+    return vmmConfig.get_instance(CLIConfig, True)
+
+
+_DOMAIN_TEMPLATE = """
+<domain type='test'>
+  <name>perf%(idx)d</name>
+  <uuid>00000000-0000-0000-0000-%(idx)012d</uuid>
+  <memory>65536</memory>
+  <vcpu>1</vcpu>
+  <os><type>hvm</type></os>
+  <devices>%(disks)s
+  </devices>
+</domain>"""
+
+_DISK_TEMPLATE = """
+    <disk type='file' device='disk'>
+      <source file='%(path)s'/>
+      <target dev='hd%(letter)s'/>
+    </disk>"""
+
+
+def _make_testdriver(testcase, vmdisks, extraxml=""):
+    """
+    Write a test driver XML file with one VM per entry in vmdisks,
+    each a list of disk paths, followed by extraxml. Returns the
+    path, which is removed when the test finishes.
+    """
+    import tempfile
+
+    fd, path = tempfile.mkstemp(prefix="virtinst-perf-", suffix=".xml")
+    with os.fdopen(fd, "w") as f:
+        f.write("<node>\n")
+        for idx, diskpaths in enumerate(vmdisks):
+            disks = "".join(
+                _DISK_TEMPLATE % {"path": diskpath, "letter": chr(97 + num)}
+                for num, diskpath in enumerate(diskpaths))
+            f.write(_DOMAIN_TEMPLATE % {"idx": idx, "disks": disks})
+        f.write(extraxml)
+        f.write("</node>\n")
+    testcase.addCleanup(os.unlink, path)
+    return path
+
+
+class TestStatsPerf(unittest.TestCase):
+    """
+    Cost of recording and reading VM stats history
+    """
+    def setUp(self):
+        self.config = _init_vmm_config()
+
+    def testVMStatsTick(self):
+        from virtManager.statsmanager import _VMStatsList
+        history = self.config.get_stats_history_length()
+
+        def _sample(statslist, tick):
+            statslist.append_stats(
+                float(tick), tick * 1000, tick * 1000,
+                12.5, 25.0, 1024 * 1024, 50.0,
+                tick * 4096, tick * 8192,
+                tick * 2048, tick * 1024)
+
+        results = []
+        for vmcount in [10, 100, 300, 1000]:
+            statslists = [_VMStatsList() for ignore in range(vmcount)]
+            for tick in range(history + 1):
+                for statslist in statslists:
+                    _sample(statslist, tick)
+
+            state = {"tick": history + 1}
+            def _tick():
+                state["tick"] += 1
+                for statslist in statslists:
+                    _sample(statslist, state["tick"])
+                    statslist.get_vector("cpuGuestPercent", None)
+                    statslist.get_in_out_vector(
+                            "diskRdRate", "diskWrRate", 40, None)
+
+            results.append(("%d VMs per tick" % vmcount,
+                            _timeit(_tick, 20)))
+
+            vector = statslists[0].get_vector("cpuGuestPercent", None)
+            self.assertEqual(len(vector), history + 1)
+            self.assertEqual(vector[0], 0.25)
+
+        _report("VM stats append + vector read, history=%d" % history,
+                results)
+
+    def testHostAggregate(self):
+        """
+        Incremental host totals vs a full rescan of every VM. Correctness
+        is checked by tests/statsmanager.py
+        """
+        import random
+        from virtManager.statsmanager import (_HostStatsAggregate,
+                _VMStatsList)
+
+        rand = random.Random(1234)
+        vmcount = 500
+        statslists = dict((idx, _VMStatsList()) for idx in range(vmcount))
+        aggregate = _HostStatsAggregate()
+        counters = dict((idx, [0, 0, 0, 0]) for idx in statslists)
+
+        def _sample(tick, idx):
+            for i in range(4):
+                counters[idx][i] += rand.randint(0, 100000)
+            statslists[idx].append_stats(
+                float(tick), rand.randint(0, 10 ** 9), tick * 10 ** 9,
+                rand.random() * 100, rand.random() * 100,
+                rand.randint(0, 1024 * 1024), rand.random() * 100,
+                *counters[idx])
+            aggregate.update(idx, statslists[idx], True)
+
+        def _rescan():
+            ret = dict.fromkeys(_HostStatsAggregate.FIELDS, 0)
+            for statslist in statslists.values():
+                for name in ret:
+                    ret[name] += statslist.get_record(name)
+            return ret
+
+        state = {"tick": 0}
+        def _incremental():
+            state["tick"] += 1
+            for idx in statslists:
+                _sample(state["tick"], idx)
+            for name in _HostStatsAggregate.FIELDS:
+                aggregate.get_total(name)
+        def _full():
+            state["tick"] += 1
+            for idx in statslists:
+                _sample(state["tick"], idx)
+            _rescan()
+
+        _report("Host stats totals, %d VMs" % len(statslists), [
+            ("incremental per tick", _timeit(_incremental, 10)),
+            ("sample + full rescan per tick", _timeit(_full, 10)),
+        ])
+
+
+class TestConnectPerf(unittest.TestCase):
+    """
+    Cost of initializing the objects found on a fresh connection
+    """
+    def setUp(self):
+        self.config = _init_vmm_config()
+
+    def _make_testdriver(self, count):
+        return _make_testdriver(self, [
+            ["/var/lib/libvirt/images/perf%d.img" % idx]
+            for idx in range(count)])
+
+    def testInitNewVMs(self):
+        from virtinst import pollhelpers
+        from virtManager import connection
+        from virtManager.domain import vmmDomain
+
+        results = []
+        for count in [500, 2000]:
+            conn = connection.vmmConnection(
+                    "test://%s" % self._make_testdriver(count))
+            conn.get_backend().open(None, None)
+
+            def _fetch_new_vms():
+                return pollhelpers.fetch_vms(conn.get_backend(), {},
+                        (lambda obj, key: vmmDomain(conn, obj, key)))[1]
+
+            def _serial():
+                for vm in _fetch_new_vms():
+                    vm.init_libvirt_state()
+
+            def _parallel():
+                vms = _fetch_new_vms()
+                conn._prime_new_vms(vms)
+                threads = connection._run_parallel(
+                        lambda vm: vm.init_libvirt_state(), vms,
+                        connection._INIT_THREAD_COUNT,
+                        "perf init")
+                for thread in threads:
+                    thread.join()
+
+            results.append(("%d VMs serial" % count, _timeit(_serial)))
+            results.append(("%d VMs bulk + parallel" % count,
+                            _timeit(_parallel)))
+            conn.get_backend().close()
+
+        _report("Initializing newly discovered VMs", results)
+
+
+class TestXMLParsePerf(unittest.TestCase):
+    """
+    Cost of parsing a large domain and reading back every XML property
+    """
+    def _make_domain_xml(self, count):
+        xml = open("tests/xmlparse-xml/change-disk-in.xml").read()
+
+        # Replicate the fixture's disks until we have 'count' of them
+        start = xml.index("    <disk ")
+        end = xml.rindex("</disk>\n") + len("</disk>\n")
+        disks = [d + "</disk>\n" for d in
+                 xml[start:end].split("</disk>\n") if d.strip()]
+        newdisks = [disks[idx % len(disks)] for idx in range(count)]
+        return xml[:start] + "".join(newdisks) + xml[end:]
+
+    def _read_all_props(self, obj):
+        from virtinst import util
+        for propname in obj._all_xml_props():
+            getattr(obj, propname)
+        for propname in obj._all_child_props():
+            for child in util.listify(getattr(obj, propname)):
+                self._read_all_props(child)
+
+    def testParseReadDevices(self):
+        import virtinst
+        from tests import utils
+        conn = utils.URIs.open_testdefault_cached()
+        xml = self._make_domain_xml(200)
+
+        def _parse():
+            return virtinst.Guest(conn, parsexml=xml)
+
+        guest = _parse()
+        self.assertEqual(len(guest.devices.disk), 200)
+
+        def _read():
+            for dev in guest.devices.get_all():
+                self._read_all_props(dev)
+
+        def _parse_read():
+            newguest = _parse()
+            for dev in newguest.devices.get_all():
+                self._read_all_props(dev)
+
+        _report("Parsing a 200 disk domain", [
+            ("parse", _timeit(_parse, 5)),
+            ("read all device props", _timeit(_read, 5)),
+            ("parse + read all", _timeit(_parse_read, 5)),
+        ])
+
+
+class TestLazyParsePerf(unittest.TestCase):
+    """
+    Cost of parsing the xmlparse fixtures when only a couple top level
+    properties are wanted, compared to instantiating every child object
+    """
+    def _parse_all_children(self, obj):
+        from virtinst import util
+        for propname in obj._all_child_props():
+            for child in util.listify(getattr(obj, propname)):
+                self._parse_all_children(child)
+
+    def testParseFixtures(self):
+        import glob
+        import tracemalloc
+        import virtinst
+        from tests import utils
+        conn = utils.URIs.open_testdefault_cached()
+
+        xmls = []
+        for f in sorted(glob.glob("tests/xmlparse-xml/change-*-in.xml")):
+            xml = open(f).read()
+            if xml.lstrip().startswith("<domain"):
+                xmls.append(xml)
+
+        def _lazy():
+            ret = []
+            for xml in xmls:
+                guest = virtinst.Guest(conn, parsexml=xml)
+                ignore = guest.name, guest.uuid
+                ret.append(guest)
+            return ret
+
+        def _full():
+            ret = _lazy()
+            for guest in ret:
+                self._parse_all_children(guest)
+            return ret
+
+        def _memory(func):
+            tracemalloc.start()
+            try:
+                keep = func()
+                ignore = keep
+                return tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+        _report("Parsing %d domain fixtures" % len(xmls), [
+            ("name/uuid only", _timeit(_lazy, 10)),
+            ("all child objects", _timeit(_full, 10)),
+        ])
+        print("    %-30s %10d KiB" % ("name/uuid only memory",
+                                      _memory(_lazy) / 1024))
+        print("    %-30s %10d KiB" % ("all child objects memory",
+                                      _memory(_full) / 1024))
+
+
+class TestGetXMLPerf(unittest.TestCase):
+    """
+    Cost of generating XML for build mode objects, which write their
+    values into a copy of the backing document
+    """
+    def testCLIOutputs(self):
+        import glob
+        import virtinst
+        from virtinst import xmlapi
+        from tests import utils
+        conn = utils.URIs.open_testdefault_cached()
+
+        xmls = []
+        for f in sorted(glob.glob("tests/cli-test-xml/compare/*.xml")):
+            xml = open(f).read()
+            if xml.startswith("<domain"):
+                xmls.append(xml)
+        apis = [xmlapi.XMLAPI(xml) for xml in xmls]
+
+        def _reparse():
+            for api in apis:
+                xmlapi.XMLAPI(api._doc.children.serialize())
+
+        def _copy():
+            for api in apis:
+                api.copy_api()
+
+        disks = []
+        for xml in xmls:
+            guest = virtinst.Guest(conn, parsexml=xml)
+            disk = virtinst.DeviceDisk(conn)
+            disk.device = "cdrom"
+            disk.target = "hdz"
+            guest.add_device(disk)
+            disks.append(disk)
+
+        def _get_xml():
+            for disk in disks:
+                disk.get_xml()
+
+        _report("Copying %d cli-test-xml domains" % len(xmls), [
+            ("serialize + reparse", _timeit(_reparse, 10)),
+            ("copy_api", _timeit(_copy, 10)),
+            ("build mode device get_xml", _timeit(_get_xml, 10)),
+        ])
+
+
+class TestManagerRowPerf(unittest.TestCase):
+    """
+    Cost of vmmManager row lookups, which happen for every VM signal.
+    Uses a bare Gtk.TreeStore, no manager window is created
+    """
+    def testRowLookup(self):
+        _init_vmm_config()
+        from gi.repository import Gtk
+        from virtManager import manager
+
+        class _FakeHandle(object):
+            def __init__(self, name):
+                self.name = name
+
+        class _FakeManager(object):
+            get_row = manager.vmmManager.get_row
+            _append_row = manager.vmmManager._append_row
+            _remove_row = manager.vmmManager._remove_row
+
+            def __init__(self):
+                self._row_refs = {}
+                self._sparkline_data = {}
+                self.model = Gtk.TreeStore(object, str)
+                self.model.set_sort_column_id(manager.ROW_SORT_KEY,
+                                              Gtk.SortType.ASCENDING)
+
+        def _walk_row(model, obj):
+            # The pre-index lookup, walks the tree every time
+            for conn_row in model:
+                if conn_row[manager.ROW_HANDLE] == obj:
+                    return conn_row
+                for vm_row in conn_row.iterchildren():
+                    if vm_row[manager.ROW_HANDLE] == obj:
+                        return vm_row
+
+        def _make_row(handle):
+            row = [None, None]
+            row[manager.ROW_HANDLE] = handle
+            row[manager.ROW_SORT_KEY] = handle.name
+            return row
+
+        fake = _FakeManager()
+        conn = _FakeHandle("conn")
+        fake._append_row(None, _make_row(conn))
+        vms = [_FakeHandle("vm%04d" % (2000 - idx)) for idx in range(2000)]
+        for vm in vms:
+            fake._append_row(fake.get_row(conn).iter, _make_row(vm))
+
+        # Rows were sorted on insert, make sure lookups still match
+        for vm in vms[::100]:
+            self.assertTrue(fake.get_row(vm)[manager.ROW_HANDLE] is vm)
+
+        def _indexed():
+            for vm in vms:
+                fake.get_row(vm)
+
+        def _walk():
+            for vm in vms:
+                _walk_row(fake.model, vm)
+
+        _report("Looking up 2000 VM rows", [
+            ("tree walk", _timeit(_walk)),
+            ("row reference index", _timeit(_indexed)),
+        ])
+
+        for vm in vms[:1000]:
+            fake._remove_row(fake.get_row(vm).iter)
+        self.assertTrue(fake.get_row(vms[0]) is None)
+        self.assertTrue(fake.get_row(vms[-1]) is not None)
+
+
+class TestSparklinePerf(unittest.TestCase):
+    """
+    Cost of rendering the manager's sparkline cells for 500 visible rows
+    """
+    def testRenderRows(self):
+        _init_vmm_config()
+        import random
+        import cairo
+        from gi.repository import Gdk
+        from gi.repository import Gtk
+        from virtManager.graphwidgets import CellRendererSparkline
+
+        rowcount = 500
+        graphlen = 40
+        rows = [[random.random() for ignore in range(graphlen)]
+                for ignore in range(rowcount)]
+
+        widget = Gtk.TreeView()
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 200, 40 * rowcount)
+        cr = cairo.Context(surface)
+        cell = CellRendererSparkline()
+        cell.set_property("reversed", True)
+
+        def _render(use_cache):
+            for idx, data in enumerate(rows):
+                area = Gdk.Rectangle()
+                area.x, area.y, area.width, area.height = (
+                        0, idx * 40, 160, 40)
+                cell.set_property("cache_key", idx if use_cache else None)
+                cell.set_property("data_array", data)
+                cell.do_render(cr, widget, area, area, 0)
+
+        def _advance():
+            for data in rows:
+                data.insert(0, random.random())
+                data.pop()
+
+        def _uncached():
+            _render(False)
+
+        def _cached():
+            _render(True)
+
+        def _cached_advance():
+            _advance()
+            _render(True)
+
+        _render(True)
+        _report("Rendering %d sparkline rows" % rowcount, [
+            ("uncached", _timeit(_uncached, 5)),
+            ("cached, same data", _timeit(_cached, 5)),
+            ("cached, one new sample", _timeit(_cached_advance, 5)),
+        ])
+
+
+class TestVolumeUploadPerf(unittest.TestCase):
+    """
+    Cost of pushing a file through a volume upload stream. The test
+    driver doesn't implement volume upload, so the stream here just
+    counts what it's sent, accepting at most 256KiB per call like the
+    remote driver does
+    """
+    class _Stream(object):
+        def __init__(self):
+            self.calls = 0
+            self.total = 0
+
+        def send(self, data):
+            self.calls += 1
+            ret = min(len(data), 256 * 1024)
+            self.total += ret
+            return ret
+
+        def finish(self):
+            pass
+
+        def abort(self):
+            pass
+
+    class _Vol(object):
+        def __init__(self, stream):
+            self._stream = stream
+
+        def name(self):
+            return "perf.img"
+
+        def connect(self):
+            return self
+
+        def newStream(self, flags):
+            ignore = flags
+            return self._stream
+
+        def upload(self, stream, offset, length, flags):
+            ignore = stream
+            ignore = offset
+            ignore = length
+            ignore = flags
+
+    def testUpload(self):
+        import tempfile
+        from virtinst.storage import StorageVolume
+
+        size = 64 * 1024 * 1024
+        fd, path = tempfile.mkstemp(prefix="virtinst-perf-upload-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(1024 * 1024) * (size // (1024 * 1024)))
+        self.addCleanup(os.unlink, path)
+
+        results = []
+        for chunk_size in [1024, 64 * 1024, None]:
+            stream = self._Stream()
+            def _upload():
+                StorageVolume.upload_file(self._Vol(stream), path,
+                                          chunk_size=chunk_size)
+            secs = _timeit(_upload)
+            self.assertEqual(stream.total, size)
+            label = "chunk_size=%s calls=%d" % (chunk_size, stream.calls)
+            results.append((label, secs))
+        _report("Uploading %dMiB through a volume stream" %
+                (size // 1024 // 1024), results)
+
+
+class TestPathIndexPerf(unittest.TestCase):
+    """
+    Cost of DeviceDisk.path_in_use_by for every volume in a pool, like
+    the storage browser does
+    """
+    def _make_testdriver(self, vmcount, volcount):
+        voltmpl = """
+  <volume type='file'>
+    <name>vol%(idx)d.img</name>
+    <capacity>1000000</capacity>
+    <allocation>50000</allocation>
+    <target><path>/perf-pool/vol%(idx)d.img</path></target>
+    %(backing)s
+  </volume>"""
+
+        poolxml = ("<pool type='dir'>\n"
+                   "  <name>perf-pool</name>\n"
+                   "  <uuid>35bb2ad9-388a-cdfe-461a-b8907f6e5300</uuid>\n"
+                   "  <target><path>/perf-pool</path></target>\n")
+        for idx in range(volcount):
+            backing = ""
+            if idx % 10:
+                # Chains of 10 volumes backed by each other
+                backing = ("<backingStore><path>/perf-pool/vol%d.img"
+                           "</path></backingStore>" % (idx - 1))
+            poolxml += voltmpl % {"idx": idx, "backing": backing}
+        poolxml += "</pool>\n"
+
+        return _make_testdriver(self, [
+            ["/perf-pool/vol%d.img" % ((idx * 2) % volcount),
+             "/perf-pool/vol%d.img" % ((idx * 2 + 1) % volcount)]
+            for idx in range(vmcount)], poolxml)
+
+    def _scan_path_in_use_by(self, conn, path):
+        """
+        path_in_use_by as it was before DiskPathIndex: walk every
+        volume and every VM disk on each call
+        """
+        vols = []
+        volmap = dict((vol.backing_store, vol)
+                      for vol in conn.fetch_all_vols() if vol.backing_store)
+        backpath = path
+        while backpath in volmap:
+            vol = volmap[backpath]
+            if vol in vols:
+                break
+            backpath = vol.target_path
+            vols.append(backpath)
+
+        ret = []
+        for vm in conn.fetch_all_domains():
+            if path in [vm.os.kernel, vm.os.initrd, vm.os.dtb]:
+                ret.append(vm.name)
+                continue
+
+            for disk in vm.devices.disk:
+                if disk.path in vols or disk.path == path:
+                    ret.append(vm.name)
+                    break
+        return ret
+
+    def testPathInUse(self):
+        import virtinst
+        from virtinst import DeviceDisk
+
+        results = []
+        for vmcount, volcount in [(100, 500), (500, 2000)]:
+            conn = virtinst.VirtinstConnection(
+                    "test://%s" % self._make_testdriver(vmcount, volcount))
+            conn.open(None, None)
+            paths = [v.target_path for v in conn.fetch_all_vols()]
+
+            def _scan():
+                for path in paths[:100]:
+                    self._scan_path_in_use_by(conn, path)
+
+            def _indexed():
+                for path in paths:
+                    DeviceDisk.path_in_use_by(conn, path)
+
+            label = "%d VMs %d vols" % (vmcount, volcount)
+            results.append(("%s, scan, per vol" % label,
+                            _timeit(_scan) / 100))
+            results.append(("%s, indexed, per vol" % label,
+                            _timeit(_indexed) / len(paths)))
+            for path in paths[:100]:
+                self.assertEqual(DeviceDisk.path_in_use_by(conn, path),
+                                 self._scan_path_in_use_by(conn, path))
+            conn.close()
+
+        _report("DeviceDisk.path_in_use_by", results)
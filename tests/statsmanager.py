@@ -0,0 +1,233 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import random
+import unittest
+from unittest import mock
+
+import libvirt
+
+from tests import utils
+from virtcli import CLIConfig
+
+_gi_error = utils.init_virtmanager()
+if not _gi_error:
+    from virtManager.config import vmmConfig
+    from virtManager.statsmanager import (_DomainAllStats,
+            _HostStatsAggregate, _VMStatsList, vmmStatsManager)
+
+# pylint: disable=protected-access
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestHostStatsAggregate(unittest.TestCase):
+    """
+    Check the incremental host totals against a full rescan of every VM
+    """
+    def setUp(self):
+        vmmConfig.get_instance(CLIConfig, True)
+        self.rand = random.Random(1234)
+        self.aggregate = _HostStatsAggregate()
+        self.statslists = {}
+        self.active = {}
+        self.counters = {}
+
+    def _add_vm(self, idx):
+        self.statslists[idx] = _VMStatsList()
+        self.active[idx] = True
+        self.counters[idx] = [0, 0, 0, 0]
+
+    def _remove_vm(self, idx):
+        self.aggregate.remove(idx)
+        self.statslists.pop(idx)
+
+    def _sample(self, tick, idx, maxincrease=100000):
+        for i in range(4):
+            self.counters[idx][i] += self.rand.randint(
+                    maxincrease // 2, maxincrease)
+        self.statslists[idx].append_stats(
+            float(tick), self.rand.randint(0, 10 ** 9), tick * 10 ** 9,
+            self.rand.random() * 100, self.rand.random() * 100,
+            self.rand.randint(0, 1024 * 1024), self.rand.random() * 100,
+            *self.counters[idx])
+        self.aggregate.update(idx, self.statslists[idx], self.active[idx])
+
+    def _check(self):
+        expected = dict.fromkeys(_HostStatsAggregate.FIELDS, 0)
+        diskmax = 10.0
+        netmax = 10.0
+        for idx, statslist in self.statslists.items():
+            if not self.active[idx]:
+                continue
+            for name in expected:
+                expected[name] += statslist.get_record(name)
+            diskmax = max(diskmax, statslist.diskRdMaxRate,
+                          statslist.diskWrMaxRate)
+            netmax = max(netmax, statslist.netRxMaxRate,
+                         statslist.netTxMaxRate)
+
+        for name, value in expected.items():
+            self.assertAlmostEqual(self.aggregate.get_total(name), value,
+                                   places=3)
+        self.assertEqual(self.aggregate.diskMaxRate, diskmax)
+        self.assertEqual(self.aggregate.netMaxRate, netmax)
+
+    def testMatchesRescan(self):
+        for idx in range(200):
+            self._add_vm(idx)
+
+        for tick in range(1, 20):
+            for idx in list(self.statslists):
+                if self.rand.random() < .05:
+                    self.active[idx] = not self.active[idx]
+                if self.rand.random() < .01:
+                    self._remove_vm(idx)
+                    continue
+                self._sample(tick, idx)
+            self._check()
+
+    def testMaxRates(self):
+        for idx in range(3):
+            self._add_vm(idx)
+        for tick in range(1, 4):
+            for idx in self.statslists:
+                self._sample(tick, idx)
+        # VM 0 does much more IO than the others
+        self._sample(4, 0, maxincrease=10 ** 9)
+        self._check()
+        busymax = self.aggregate.diskMaxRate
+        self.assertTrue(busymax > 1000)
+
+        # Shutting off the busy VM drops its max rate
+        self.active[0] = False
+        self._sample(5, 0)
+        self._check()
+        self.assertTrue(self.aggregate.diskMaxRate < busymax)
+
+        # As does removing it, once it's running again
+        self.active[0] = True
+        self._sample(6, 0)
+        self.assertEqual(self.aggregate.diskMaxRate, busymax)
+        self._remove_vm(0)
+        self._check()
+        self.assertTrue(self.aggregate.diskMaxRate < busymax)
+
+        self.aggregate.clear()
+        self.assertEqual(len(self.aggregate), 0)
+        self.assertEqual(self.aggregate.diskMaxRate, 10.0)
+        self.assertEqual(self.aggregate.netMaxRate, 10.0)
+        for name in _HostStatsAggregate.FIELDS:
+            self.assertEqual(self.aggregate.get_total(name), 0)
+
+
+class _FakeConn(object):
+    SUPPORT_CONN_MEM_STATS_PERIOD = None
+
+    def host_active_processor_count(self):
+        return 4
+
+    def check_support(self, ignore):
+        return False
+
+
+class _FakeVM(object):
+    """
+    Just the bits of a vmmDomain that vmmStatsManager reads. cpurate is
+    in CPUs kept busy, diskrate in KiB/s
+    """
+    def __init__(self, name, conn, cpurate, diskrate):
+        self.name = name
+        self.conn = conn
+        self.cpurate = cpurate
+        self.diskrate = diskrate
+        self.active = True
+
+    def get_uuid(self):
+        return self.name
+
+    def get_connkey(self):
+        return self.name
+
+    def is_active(self):
+        return self.active
+
+    def get_all_stats(self, timestamp):
+        ret = _DomainAllStats(timestamp)
+        ret.state = libvirt.VIR_DOMAIN_RUNNING
+        ret.guestcpus = 1
+        ret.cpuTimeAbs = int(self.cpurate * timestamp * 10 ** 9)
+        ret.diskRdBytes = int(self.diskrate * timestamp * 1024)
+        return ret
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestPollingTiers(unittest.TestCase):
+    """
+    Host totals have to be right when VMs are sampled at different rates
+    """
+    def setUp(self):
+        self.config = vmmConfig.get_instance(CLIConfig, True)
+        stats = self.config.stats
+        for attr in ["update_interval", "background_update_interval",
+                     "enable_cpu_poll", "enable_disk_poll",
+                     "enable_net_poll", "enable_memory_poll"]:
+            self.addCleanup(setattr, stats, attr, getattr(stats, attr))
+        stats.update_interval = 1
+        stats.background_update_interval = 15
+        stats.enable_cpu_poll = True
+        stats.enable_disk_poll = True
+        stats.enable_net_poll = False
+        stats.enable_memory_poll = False
+
+        self.statsmanager = vmmStatsManager()
+        self.addCleanup(self.statsmanager.cleanup)
+
+        patcher = mock.patch("virtManager.statsmanager.time")
+        self.mocktime = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _tick(self, now, vms):
+        self.mocktime.time.return_value = now
+        self.statsmanager._latest_all_stats = dict(
+            (vm.get_uuid(), vm.get_all_stats(now))
+            for vm in vms if vm.is_active())
+        for vm in vms:
+            self.statsmanager.refresh_vm_stats(vm)
+
+    def testMixedTiers(self):
+        conn = _FakeConn()
+        fgvm = _FakeVM("fg", conn, 1, 1024)
+        bgvm = _FakeVM("bg", conn, .5, 2048)
+        vms = [fgvm, bgvm]
+        self.statsmanager.add_vm_watcher(fgvm, self)
+        aggregate = self.statsmanager.get_host_aggregate()
+
+        start = 1000
+        bgskipped = False
+        for now in range(start, start + 60):
+            self._tick(now, vms)
+            fgstats = self.statsmanager.get_vm_statslist(fgvm)
+            bgstats = self.statsmanager.get_vm_statslist(bgvm)
+            self.assertEqual(fgstats.get_record("timestamp"), now)
+            if bgstats.get_record("timestamp") != now:
+                bgskipped = True
+
+            if now < start + 20:
+                continue
+            # 1 + .5 of 4 host CPUs, whichever tick we're at
+            self.assertAlmostEqual(
+                    aggregate.get_total("cpuHostPercent"), 37.5, places=3)
+            self.assertAlmostEqual(
+                    aggregate.get_total("diskRdRate"), 3072, places=3)
+        self.assertTrue(bgskipped)
+
+        # A background VM that shuts off stops counting straight away,
+        # not at its next sample
+        bgvm.active = False
+        self._tick(start + 60, vms)
+        self.assertAlmostEqual(
+                aggregate.get_total("cpuHostPercent"), 25, places=3)
+        self.assertAlmostEqual(
+                aggregate.get_total("diskRdRate"), 1024, places=3)
@@ -217,3 +217,76 @@ class TestStorage(unittest.TestCase):
                                                  StoragePool.TYPE_ISCSI,
                                                  host=host)
         self.assertTrue(len(lst) == 0)
+
+
+class _FakeUploadStream(object):
+    """
+    Stream that accepts at most 'maxsend' bytes per send call, or
+    returns 'maxsend' as is when it's <= 0
+    """
+    def __init__(self, maxsend):
+        self.maxsend = maxsend
+        self.data = b""
+        self.finished = False
+        self.aborted = False
+
+    def send(self, data):
+        if self.maxsend <= 0:
+            return self.maxsend
+        ret = min(len(data), self.maxsend)
+        self.data += bytes(data[:ret])
+        return ret
+
+    def finish(self):
+        self.finished = True
+
+    def abort(self):
+        self.aborted = True
+
+
+class _FakeUploadVol(object):
+    def __init__(self, stream):
+        self._stream = stream
+
+    def name(self):
+        return "upload.img"
+
+    def connect(self):
+        return self
+
+    def newStream(self, flags):
+        ignore = flags
+        return self._stream
+
+    def upload(self, stream, offset, length, flags):
+        ignore = stream
+        ignore = offset
+        ignore = length
+        ignore = flags
+
+
+class TestVolumeUpload(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        fd, self.path = tempfile.mkstemp(prefix="virtinst-upload-")
+        self.content = os.urandom(100000)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.content)
+        self.addCleanup(os.unlink, self.path)
+
+    def testPartialSends(self):
+        stream = _FakeUploadStream(999)
+        ret = StorageVolume.upload_file(_FakeUploadVol(stream), self.path,
+                                        chunk_size=4096)
+        self.assertEqual(ret, len(self.content))
+        self.assertEqual(stream.data, self.content)
+        self.assertTrue(stream.finished)
+        self.assertFalse(stream.aborted)
+
+    def testSendNoProgress(self):
+        for maxsend in [0, -1]:
+            stream = _FakeUploadStream(maxsend)
+            self.assertRaises(RuntimeError, StorageVolume.upload_file,
+                              _FakeUploadVol(stream), self.path)
+            self.assertTrue(stream.aborted)
+            self.assertFalse(stream.finished)
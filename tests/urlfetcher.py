@@ -0,0 +1,486 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import http.server
+import os
+import shutil
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from virtinst import urldetect
+from virtinst import urlfetcher
+from virtinst import util
+
+
+# pylint: disable=protected-access
+
+
+class _TreeServer(object):
+    """
+    Serve a directory over HTTP from a background thread, counting
+    requests.
+
+    If 'etags' is set, files get an ETag and If-None-Match is answered
+    with 304. If 'last_modified' is unset, no Last-Modified header is
+    sent, so responses carry no cache validator at all.
+
+    Clearing 'gate' holds every request until it is set again, which
+    simulates a slow or stalled mirror. 'max_active' is the most
+    requests that were held at the same time.
+    """
+    # Upper bound on how long a request is held, so a broken test
+    # can't hang the suite
+    GATE_TIMEOUT = 30
+
+    def __init__(self, rootdir, etags=False, last_modified=True):
+        server = self
+
+        class _Handler(http.server.SimpleHTTPRequestHandler):
+            _etag = None
+
+            def translate_path(self, path):
+                return os.path.join(rootdir, path.lstrip("/"))
+
+            def send_head(self):
+                with server.cond:
+                    server.requests.append((self.command, self.path))
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    server.cond.notify_all()
+                server.gate.wait(server.GATE_TIMEOUT)
+                with server.cond:
+                    server.active -= 1
+
+                path = self.translate_path(self.path)
+                if etags and os.path.isfile(path):
+                    st = os.stat(path)
+                    self._etag = '"%d-%d"' % (st.st_mtime_ns, st.st_size)
+                    if self.headers.get("If-None-Match") == self._etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return None
+                return http.server.SimpleHTTPRequestHandler.send_head(self)
+
+            def send_header(self, keyword, value):
+                if keyword.lower() == "last-modified" and not last_modified:
+                    return
+                http.server.SimpleHTTPRequestHandler.send_header(
+                        self, keyword, value)
+
+            def end_headers(self):
+                if self._etag:
+                    self.send_header("ETag", self._etag)
+                    self._etag = None
+                http.server.SimpleHTTPRequestHandler.end_headers(self)
+
+            def log_request(self, code="-", size="-"):
+                ignore = size
+                with server.cond:
+                    server.responses.append((self.path, int(code)))
+
+            def log_message(self, *args):
+                ignore = args
+
+        class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            # server_close() waits for every handler thread
+            daemon_threads = False
+            block_on_close = True
+
+            def handle_error(self, request, client_address):
+                # Clients that timed out and hung up on a held request
+                # are expected, don't dump their tracebacks
+                if isinstance(sys.exc_info()[1], ConnectionError):
+                    return
+                http.server.HTTPServer.handle_error(
+                        self, request, client_address)
+
+        self.cond = threading.Condition()
+        self.requests = []
+        self.responses = []
+        self.active = 0
+        self.max_active = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+        self._httpd = _Server(("127.0.0.1", 0), _Handler)
+        self.url = "http://127.0.0.1:%d/" % self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait_for_active(self, count):
+        """
+        Wait until 'count' requests are held at the gate
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.active >= count,
+                                      self.GATE_TIMEOUT)
+
+    def stop(self):
+        self.gate.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+class TestHTTPProbing(unittest.TestCase):
+    """
+    Tests for the HTTP fetcher's concurrent probing and negative cache
+    """
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp(prefix="virtinst-urlfetcher-")
+        self.addCleanup(shutil.rmtree, self.rootdir)
+        with open(os.path.join(self.rootdir, ".treeinfo"), "w") as f:
+            f.write("[general]\nfamily = Fedora\nversion = 29\n")
+
+        self.server = _TreeServer(self.rootdir)
+        self.addCleanup(self.server.stop)
+        self.fetcher = urlfetcher.fetcherForURI(
+                self.server.url, self.rootdir, None)
+        self.probefiles = urldetect._get_probe_files(urldetect.ALLSTORES)
+
+    def testProbeFiles(self):
+        # Every file a store's is_valid reads has to be in its
+        # PROBE_FILES, or prefetching misses it
+        class _RecordingFetcher(object):
+            def __init__(self):
+                self.paths = []
+            def can_fetch_concurrently(self):
+                return False
+            def is_iso(self):
+                return False
+            def acquireFileContent(self, path):
+                self.paths.append(path)
+                raise ValueError("missing %s" % path)
+
+        for store in urldetect.ALLSTORES:
+            if store is urldetect._LibosinfoDistro:
+                # Goes through libosinfo, not the fetcher
+                continue
+            fetcher = _RecordingFetcher()
+            self.assertFalse(store.is_valid(urldetect._DistroCache(fetcher)))
+            self.assertEqual(sorted(set(fetcher.paths)),
+                             sorted(store.PROBE_FILES), store)
+
+        self.assertEqual(len(self.probefiles), len(set(self.probefiles)))
+        for store in urldetect.ALLSTORES:
+            for path in store.PROBE_FILES:
+                self.assertTrue(path in self.probefiles)
+
+    def testConcurrentFetch(self):
+        # Hold every request until all of them have arrived. If the
+        # fetcher issued them one after another, this would never
+        # happen and wait_for_active times out
+        self.server.gate.clear()
+        ret = {}
+        def _fetch():
+            ret.update(self.fetcher.acquireFileContents(self.probefiles))
+        thread = threading.Thread(target=_fetch)
+        thread.start()
+        self.assertTrue(self.server.wait_for_active(len(self.probefiles)))
+        self.server.gate.set()
+        thread.join()
+
+        self.assertEqual(self.server.max_active, len(self.probefiles))
+        self.assertTrue(ret[".treeinfo"].startswith("[general]"))
+        for path in self.probefiles:
+            if path != ".treeinfo":
+                self.assertEqual(ret[path], None)
+        self.assertEqual(len(self.server.requests), len(self.probefiles))
+
+    def testDistroCachePrefetch(self):
+        cache = urldetect._DistroCache(self.fetcher)
+        cache.prefetch(self.probefiles)
+        count = len(self.server.requests)
+
+        # Every probe is answered from the prefetched results,
+        # including the ones for missing files
+        self.assertTrue(cache.treeinfo_family_regex("Fedora"))
+        self.assertFalse(cache.content_regex("VERSION", ".*Mageia.*"))
+        self.assertEqual(cache.acquire_file_content("daily/MANIFEST"), None)
+        self.assertTrue(self.fetcher.hasFile(".treeinfo"))
+        self.assertFalse(self.fetcher.hasFile("content"))
+        self.assertEqual(len(self.server.requests), count)
+
+    def testStalledMirror(self):
+        # A mirror that never answers fails the probe instead of
+        # blocking detection
+        self.server.gate.clear()
+        self.fetcher._TIMEOUT = .5
+        ret = self.fetcher.acquireFileContents([".treeinfo"])
+        self.assertEqual(ret, {".treeinfo": None})
+        self.assertEqual(self.server.requests, [("GET", "/.treeinfo")])
+        self.assertEqual(self.server.responses, [])
+
+    def testHasFileNegativeCache(self):
+        self.assertFalse(self.fetcher.hasFile("missing"))
+        self.assertFalse(self.fetcher.hasFile("missing"))
+        self.assertTrue(self.fetcher.hasFile(".treeinfo"))
+        self.assertTrue(self.fetcher.hasFile(".treeinfo"))
+        self.assertEqual(self.server.requests, [
+            ("HEAD", "/missing"), ("HEAD", "/.treeinfo")])
+
+
+class TestFetchCache(unittest.TestCase):
+    """
+    Tests for the persistent HTTP fetch cache, which the test suite
+    otherwise runs without
+    """
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp(prefix="virtinst-fetchtree-")
+        self.addCleanup(shutil.rmtree, self.rootdir)
+        self.cachedir = tempfile.mkdtemp(prefix="virtinst-fetchcache-")
+        self.addCleanup(shutil.rmtree, self.cachedir)
+
+    def _write_file(self, name, content):
+        with open(os.path.join(self.rootdir, name), "wb") as f:
+            f.write(content)
+
+    def _get_fetcher(self, max_size=None, **kwargs):
+        server = _TreeServer(self.rootdir, **kwargs)
+        self.addCleanup(server.stop)
+        fetcher = urlfetcher.fetcherForURI(
+                server.url, self.rootdir, util.ensure_meter(None))
+        fetcher._cache = urlfetcher._FetchCache(
+                self.cachedir, max_size=max_size)
+        return server, fetcher
+
+    def _list_cache(self):
+        objects = [n for n in os.listdir(os.path.join(self.cachedir,
+                                                       "objects"))
+                   if not n.startswith(".tmp-")]
+        metas = [n for n in os.listdir(self.cachedir)
+                 if n.endswith(".json")]
+        return objects, metas
+
+    def testRevalidate(self):
+        self._write_file("vmlinuz", b"kernel 1")
+        server, fetcher = self._get_fetcher(etags=True, last_modified=False)
+
+        self.assertEqual(fetcher.acquireFileContent("vmlinuz"), "kernel 1")
+        self.assertEqual(fetcher.acquireFileContent("vmlinuz"), "kernel 1")
+        self.assertEqual(server.responses,
+                         [("/vmlinuz", 200), ("/vmlinuz", 304)])
+        self.assertEqual([len(l) for l in self._list_cache()], [1, 1])
+
+        # A changed file fails revalidation and replaces the entry
+        self._write_file("vmlinuz", b"kernel 22")
+        self.assertEqual(fetcher.acquireFileContent("vmlinuz"), "kernel 22")
+        self.assertEqual(server.responses[-1], ("/vmlinuz", 200))
+        self.assertEqual(fetcher.acquireFileContent("vmlinuz"), "kernel 22")
+        self.assertEqual(server.responses[-1], ("/vmlinuz", 304))
+
+    def testProbesUseCache(self):
+        self._write_file(".treeinfo", b"[general]\n")
+        server, fetcher = self._get_fetcher(etags=True, last_modified=False)
+
+        for ignore in range(2):
+            ret = fetcher.acquireFileContents([".treeinfo", "missing"])
+            self.assertEqual(ret, {".treeinfo": "[general]\n",
+                                   "missing": None})
+        self.assertEqual(
+            sorted(server.responses),
+            [("/.treeinfo", 200), ("/.treeinfo", 304),
+             ("/missing", 404), ("/missing", 404)])
+
+    def testNoValidator(self):
+        self._write_file("initrd.img", b"initrd")
+        server, fetcher = self._get_fetcher(etags=False, last_modified=False)
+
+        for ignore in range(2):
+            self.assertEqual(fetcher.acquireFileContent("initrd.img"),
+                             "initrd")
+        self.assertEqual(server.responses,
+                         [("/initrd.img", 200), ("/initrd.img", 200)])
+        self.assertEqual(self._list_cache(), ([], []))
+
+    def testEviction(self):
+        names = ["file%d" % idx for idx in range(6)]
+        for idx, name in enumerate(names):
+            self._write_file(name, bytes([idx]) * 1000)
+        ignore, fetcher = self._get_fetcher(
+                max_size=2500, etags=True, last_modified=False)
+
+        for name in names:
+            fetcher.acquireFileContent(name)
+            # Keep object mtimes distinct for LRU ordering
+            time.sleep(.01)
+
+        objects, metas = self._list_cache()
+        self.assertEqual(len(objects), 2)
+        self.assertEqual(len(metas), 2)
+        size = sum(os.path.getsize(os.path.join(self.cachedir, "objects", n))
+                   for n in objects)
+        self.assertTrue(size <= 2500)
+
+        # The most recently fetched files are the ones left
+        for name in names[-2:]:
+            url = fetcher._make_full_url(name)
+            entry = fetcher._cache.lookup(url)
+            self.assertTrue(entry)
+            entry.close()
+        self.assertEqual(
+            fetcher._cache.lookup(fetcher._make_full_url(names[0])), None)
+
+
+def _make_iso(path, files, joliet=True, rockridge=False):
+    """
+    Write a bare bones ISO9660 image containing 'files', a dict of
+    path->content. Only what _ISOReader needs is filled in
+    """
+    dirs = {"/": []}
+    for filepath in sorted(files):
+        parent = "/"
+        for part in filepath.strip("/").split("/")[:-1]:
+            child = os.path.join(parent, part)
+            if child not in dirs:
+                dirs[child] = []
+                dirs[parent].append(part)
+            parent = child
+        dirs[parent].append(os.path.basename(filepath))
+
+    nextlba = [16]
+    def _alloc(size):
+        ret = nextlba[0]
+        nextlba[0] += max(1, (size + 2047) // 2048)
+        return ret
+
+    pvdlba = _alloc(1)
+    svdlba = joliet and _alloc(1)
+    termlba = _alloc(1)
+    trees = [(False, {d: _alloc(2048) for d in sorted(dirs)})]
+    if joliet:
+        trees.append((True, {d: _alloc(2048) for d in sorted(dirs)}))
+    filelba = {f: _alloc(len(c)) for f, c in sorted(files.items())}
+
+    image = bytearray(nextlba[0] * 2048)
+    def _put(lba, data):
+        image[lba * 2048:lba * 2048 + len(data)] = data
+
+    def _record(extent, size, isdir, name, sysuse=b""):
+        body = (struct.pack("<I", extent) + struct.pack(">I", extent) +
+                struct.pack("<I", size) + struct.pack(">I", size) +
+                b"\0" * 7 + bytes([isdir and 2 or 0, 0, 0]) +
+                struct.pack("<H", 1) + struct.pack(">H", 1) +
+                bytes([len(name)]) + name)
+        if len(name) % 2 == 0:
+            body += b"\0"
+        body += sysuse
+        if len(body) % 2:
+            body += b"\0"
+        return bytes([len(body) + 2, 0]) + body
+
+    for is_joliet, dirlba in trees:
+        for dirpath, children in dirs.items():
+            sysuse = b""
+            if dirpath == "/" and rockridge and not is_joliet:
+                sysuse = b"SP\x07\x01\xbe\xef\x00"
+            data = _record(dirlba[dirpath], 2048, True, b"\0", sysuse)
+            data += _record(dirlba[os.path.dirname(dirpath)], 2048,
+                            True, b"\1")
+            for name in children:
+                childpath = os.path.join(dirpath, name)
+                isdir = childpath in dirs
+                if is_joliet:
+                    rawname = name.encode("utf-16-be")
+                else:
+                    rawname = name.upper().encode("ascii")
+                    if not isdir:
+                        rawname += b";1"
+                sysuse = b""
+                if rockridge and not is_joliet:
+                    sysuse = (b"NM" + bytes([5 + len(name), 1, 0]) +
+                              name.encode("utf-8"))
+                if isdir:
+                    data += _record(dirlba[childpath], 2048, True,
+                                    rawname, sysuse)
+                else:
+                    data += _record(filelba[childpath],
+                                    len(files[childpath]), False,
+                                    rawname, sysuse)
+            _put(dirlba[dirpath], data)
+
+        desc = bytearray(2048)
+        desc[0] = is_joliet and 2 or 1
+        desc[1:7] = b"CD001\x01"
+        desc[128:132] = struct.pack("<H", 2048) + struct.pack(">H", 2048)
+        if is_joliet:
+            desc[88:91] = b"%/E"
+        desc[156:190] = _record(dirlba["/"], 2048, True, b"\0")
+        _put(is_joliet and svdlba or pvdlba, desc)
+
+    _put(termlba, b"\xffCD001\x01")
+    for filepath, content in files.items():
+        _put(filelba[filepath], content)
+
+    with open(path, "wb") as f:
+        f.write(image)
+
+
+class TestISOFetcher(unittest.TestCase):
+    """
+    Tests for reading files out of generated ISO images
+    """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="virtinst-isofetcher-")
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.iso = os.path.join(self.tmpdir, "test.iso")
+        self.files = {
+            "/.treeinfo": b"[general]\nfamily = Fedora\n",
+            "/images/pxeboot/vmlinuz": os.urandom(4097),
+            "/images/pxeboot/initrd.img": os.urandom(3 * 1024 * 1024 + 5),
+            "/images/empty": b"",
+        }
+
+    def _get_fetcher(self):
+        fetcher = urlfetcher.fetcherForURI(
+                self.iso, self.tmpdir, util.ensure_meter(None))
+        self.assertTrue(fetcher.is_iso())
+        return fetcher
+
+    def _check_files(self, fetcher, names):
+        for isopath, filepath in names.items():
+            self.assertTrue(fetcher.hasFile(isopath))
+            fn = fetcher.acquireFile(isopath)
+            self.addCleanup(os.unlink, fn)
+            self.assertEqual(open(fn, "rb").read(), self.files[filepath])
+
+    def testJoliet(self):
+        _make_iso(self.iso, self.files, joliet=True)
+        fetcher = self._get_fetcher()
+        self._check_files(fetcher, {p: p for p in self.files})
+        self.assertTrue(fetcher.hasFile("images/pxeboot"))
+        self.assertFalse(fetcher.hasFile("images/pxeboot/missing"))
+        self.assertEqual(fetcher.acquireFileContent(".treeinfo"),
+                         "[general]\nfamily = Fedora\n")
+        self.assertRaises(ValueError, fetcher.acquireFile, "missing")
+
+    def testRockRidge(self):
+        _make_iso(self.iso, self.files, joliet=False, rockridge=True)
+        self._check_files(self._get_fetcher(), {p: p for p in self.files})
+
+    def testPlainISO9660(self):
+        _make_iso(self.iso, self.files, joliet=False, rockridge=False)
+        self._check_files(self._get_fetcher(), {
+            "/.TREEINFO": "/.treeinfo",
+            "/IMAGES/PXEBOOT/VMLINUZ": "/images/pxeboot/vmlinuz",
+            "/IMAGES/PXEBOOT/INITRD.IMG": "/images/pxeboot/initrd.img",
+        })
+
+    def testGenisoimageISO(self):
+        fetcher = urlfetcher.fetcherForURI(
+                "tests/cli-test-xml/fake-fedora17-tree.iso",
+                self.tmpdir, util.ensure_meter(None))
+        self.assertTrue(fetcher.hasFile("images/pxeboot/vmlinuz"))
+        self.assertTrue(fetcher.acquireFileContent(".treeinfo").startswith(
+            "[general]\nfamily = Fedora\n"))
+        self.assertEqual(
+            fetcher.acquireFileContent("images/pxeboot/initrd.img"),
+            "testinitrd\n")
@@ -4,6 +4,7 @@
 # See the COPYING file in the top-level directory.
 
 import difflib
+import importlib.util
 import os
 import sys
 import unittest
@@ -13,6 +14,7 @@ import libvirt
 import virtinst
 import virtinst.cli
 import virtinst.uri
+from virtcli import CLIConfig
 
 
 # pylint: disable=protected-access
@@ -45,6 +47,38 @@ def has_old_osinfo():
     return not virtinst.OSDB.lookup_os(osname).supports_chipset_q35()
 
 
+_virtmanager_error = False
+
+
+def init_virtmanager():
+    """
+    Set up the process so virtManager modules can be imported and
+    instantiated without a running app. Like the virt-manager entry
+    point, this has to happen before anything loads Gio. The memory
+    gsettings backend keeps tests away from the user's real settings.
+
+    Only the first call changes anything. Returns a reason string if
+    virtManager can't be used here, for unittest.skipIf, else None
+    """
+    global _virtmanager_error
+    if _virtmanager_error is not False:
+        return _virtmanager_error
+
+    _virtmanager_error = None
+    if not importlib.util.find_spec("gi"):
+        _virtmanager_error = "gi is not installed"
+        return _virtmanager_error
+
+    os.environ["GSETTINGS_SCHEMA_DIR"] = CLIConfig.gsettings_dir
+    os.environ["GSETTINGS_BACKEND"] = "memory"
+    try:
+        import gi
+        gi.require_version("Gtk", "3.0")
+    except (ImportError, ValueError) as e:
+        _virtmanager_error = str(e)
+    return _virtmanager_error
+
+
 class _URIs(object):
     def __init__(self):
         self._conn_cache = {}
@@ -0,0 +1,97 @@
+# Copyright (C) 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import unittest
+
+from tests import utils
+from virtcli import CLIConfig
+
+_gi_error = utils.init_virtmanager()
+if not _gi_error:
+    from gi.repository import Gio
+    from gi.repository import GLib
+    from virtManager.config import vmmConfig
+
+
+@unittest.skipIf(_gi_error, "virtManager unavailable: %s" % _gi_error)
+class TestStatsSettings(unittest.TestCase):
+    """
+    Check the in-process stats settings cache stays in sync with
+    gsettings
+    """
+    _BOOL_SETTINGS = ["cpu", "disk", "net", "memory"]
+
+    def setUp(self):
+        self.config = vmmConfig.get_instance(CLIConfig, True)
+
+        # The memory backend is shared by the whole process, so put
+        # back whatever we change
+        self.settings = Gio.Settings.new(
+                "org.virt-manager.virt-manager.stats")
+        self.addCleanup(self._flush_notifications)
+        for key in self.settings.list_keys():
+            self.addCleanup(self.settings.set_value, key,
+                            self.settings.get_value(key))
+
+    def _flush_notifications(self):
+        context = GLib.MainContext.default()
+        while context.iteration(False):
+            pass
+
+    def _check_coherent(self):
+        self._flush_notifications()
+        conf = self.config.conf
+        stats = self.config.stats
+        for name in self._BOOL_SETTINGS:
+            val = conf.get("/stats/enable-%s-poll" % name)
+            self.assertEqual(getattr(stats, "enable_%s_poll" % name), val)
+            self.assertEqual(
+                getattr(self.config, "get_stats_enable_%s_poll" % name)(),
+                val)
+
+        interval = max(conf.get("/stats/update-interval"), 1)
+        bginterval = max(conf.get("/stats/background-update-interval"),
+                         interval)
+        self.assertEqual(stats.update_interval, interval)
+        self.assertEqual(stats.background_update_interval, bginterval)
+        self.assertEqual(self.config.get_stats_update_interval(), interval)
+        self.assertEqual(self.config.get_stats_background_update_interval(),
+                         bginterval)
+
+    def testSetters(self):
+        self._check_coherent()
+        for name in self._BOOL_SETTINGS:
+            getter = getattr(self.config, "get_stats_enable_%s_poll" % name)
+            setter = getattr(self.config, "set_stats_enable_%s_poll" % name)
+            for val in [not getter(), not getter()]:
+                setter(val)
+                self.assertEqual(
+                    getattr(self.config.stats, "enable_%s_poll" % name), val)
+                self._check_coherent()
+
+        self.config.set_stats_update_interval(5)
+        self.config.set_stats_background_update_interval(30)
+        self.assertEqual(self.config.stats.update_interval, 5)
+        self.assertEqual(self.config.stats.background_update_interval, 30)
+        self._check_coherent()
+
+        # Out of range values are clamped like the getters always did
+        self.config.set_stats_update_interval(0)
+        self.config.set_stats_background_update_interval(0)
+        self.assertEqual(self.config.stats.update_interval, 1)
+        self.assertEqual(self.config.stats.background_update_interval, 1)
+        self._check_coherent()
+
+    def testExternalChange(self):
+        # Changes made through another GSettings instance, like
+        # dconf-editor would, arrive via 'changed' notifications
+        val = not self.config.stats.enable_disk_poll
+        self.settings.set_boolean("enable-disk-poll", val)
+        self.settings.set_int("update-interval", 7)
+        self._flush_notifications()
+
+        self.assertEqual(self.config.stats.enable_disk_poll, val)
+        self.assertEqual(self.config.stats.update_interval, 7)
+        self._check_coherent()
@@ -8,6 +8,7 @@ import traceback
 import unittest
 
 import virtinst
+from virtinst import util
 
 from tests import utils
 
@@ -1451,3 +1452,140 @@ class XMLParseTest(unittest.TestCase):
             raise AssertionError("Expected parse failure")
         except RuntimeError as e:
             self.assertTrue("'foo'" in str(e))
+
+    def testLazyChildParse(self):
+        # Child objects are only parsed on access, make sure adding and
+        # removing devices on an untouched guest behaves the same as
+        # when the device lists were already parsed
+        infile = "tests/xmlparse-xml/change-disk-in.xml"
+        xml = open(infile).read()
+        guest1 = virtinst.Guest(self.conn, parsexml=xml)
+        guest2 = virtinst.Guest(self.conn, parsexml=xml)
+        # pylint: disable=protected-access
+        self.assertTrue("disk" not in guest1.devices._propstore)
+        self.assertEqual(len(guest2.devices.disk), 11)
+        self.assertEqual(len(guest2.devices.controller), 0)
+        self.assertEqual(guest1.get_xml(), guest2.get_xml())
+
+        for guest in [guest1, guest2]:
+            guest.name = "newname"
+            dev = virtinst.DeviceDisk(self.conn)
+            dev.device = "cdrom"
+            dev.target = "hdz"
+            guest.add_device(dev)
+            guest.remove_device(guest.devices.disk[1])
+        self.assertEqual(guest1.get_xml(), guest2.get_xml())
+        self.assertEqual(guest1.devices.disk[-1].target, "hdz")
+
+    def testCopyAPIRoot(self):
+        # copy_api must pick the same context node as parsing, even
+        # when the root element isn't the first node of the document
+        from virtinst import xmlapi
+        for xml in ["<disk><target dev='hda'/></disk>",
+                    "<!-- comment --><disk><target dev='hda'/></disk>",
+                    "<?pi foo?><disk><target dev='hda'/></disk>"]:
+            api = xmlapi.XMLAPI(xml)
+            copy = api.copy_api()
+            for xpath in [".", "./target/@dev", "./target"]:
+                self.assertEqual(api.get_xml(xpath), copy.get_xml(xpath))
+                self.assertEqual(api.count(xpath), copy.count(xpath))
+                self.assertEqual(api.get_xpath_content(xpath, False),
+                                 copy.get_xpath_content(xpath, False))
+
+    _LAZY_DOMAIN_XML = """
+<domain type='test'>
+  <name>lazytest</name>
+  <memory>65536</memory>
+  <vcpu>1</vcpu>
+  <os><type>hvm</type></os>
+  <devices>
+    <disk type='file' device='disk'>
+      <source file='/dev/default-pool/test.img'/>
+      <target dev='hda'/>
+    </disk>
+    <disk type='network' device='disk'>
+      <source protocol='nbd' name='export'>
+        <host name='one.example.com' port='10809'/>
+        <host name='two.example.com' port='10810'/>
+      </source>
+      <target dev='hdb'/>
+    </disk>
+  </devices>
+</domain>
+"""
+
+    def _parse_all_children(self, obj):
+        # pylint: disable=protected-access
+        for propname in obj._all_child_props():
+            for child in util.listify(getattr(obj, propname)):
+                self._parse_all_children(child)
+
+    def testLazyChildNested(self):
+        # pylint: disable=protected-access
+        guest1 = virtinst.Guest(self.conn, parsexml=self._LAZY_DOMAIN_XML)
+        guest2 = virtinst.Guest(self.conn, parsexml=self._LAZY_DOMAIN_XML)
+        self._parse_all_children(guest2)
+
+        # Setting a property that can't touch a child list leaves
+        # the list unparsed
+        for guest in [guest1, guest2]:
+            guest.title = "newtitle"
+            guest.description = "newdesc"
+            guest.devices.disk[0].driver_name = "qemu"
+            guest.devices.disk[1].driver_name = "qemu"
+        self.assertEqual(guest1.get_xml(), guest2.get_xml())
+        self.assertTrue(
+                guest1.get_xml().index("<title>") <
+                guest1.get_xml().index("<description>"))
+        self.assertTrue("devices" in guest1._propstore)
+        self.assertTrue("hosts" not in guest1.devices.disk[0]._propstore)
+        self.assertTrue("hosts" not in guest1.devices.disk[1]._propstore)
+
+        # One that can add a <host> parses hosts first, so the list
+        # matches what an eagerly parsed disk would see
+        for guest in [guest1, guest2]:
+            guest.devices.disk[0].source_host_name = "three.example.com"
+        self.assertEqual(guest1.get_xml(), guest2.get_xml())
+        self.assertTrue("hosts" in guest1.devices.disk[0]._propstore)
+        self.assertEqual(len(guest1.devices.disk[0].hosts),
+                         len(guest2.devices.disk[0].hosts))
+
+        # Nested child list of a device that was never parsed
+        self.assertEqual(
+                [h.name for h in guest1.devices.disk[1].hosts],
+                ["one.example.com", "two.example.com"])
+        for guest in [guest1, guest2]:
+            disk = guest.devices.disk[1]
+            disk.remove_child(disk.hosts[0])
+            disk.hosts[0].port = 1234
+        self.assertEqual(guest1.get_xml(), guest2.get_xml())
+
+    def testLazyChildRemoveCopy(self):
+        guest1 = virtinst.Guest(self.conn, parsexml=self._LAZY_DOMAIN_XML)
+        guest2 = virtinst.Guest(self.conn, parsexml=self._LAZY_DOMAIN_XML)
+        self._parse_all_children(guest2)
+
+        # Removing a device whose own children were never parsed keeps
+        # its data, and it can be added to another guest
+        disk = guest1.devices.disk[1]
+        origxml = disk.get_xml()
+        guest1.remove_device(disk)
+        self.assertEqual(disk.get_xml(), origxml)
+        self.assertEqual([h.name for h in disk.hosts],
+                         ["one.example.com", "two.example.com"])
+
+        guest2.remove_device(guest2.devices.disk[0])
+        guest2.add_device(disk)
+        newdisk = guest2.devices.disk[-1]
+        self.assertEqual(newdisk.get_xml_id(), "./devices/disk[2]")
+        self.assertEqual([h.get_xml_id() for h in newdisk.hosts],
+                         ["./devices/disk[2]/source/host[1]",
+                          "./devices/disk[2]/source/host[2]"])
+        self.assertEqual(newdisk.hosts[1].port, 10810)
+
+        # A fresh parse of a guest with unparsed children, the way
+        # callers copy an object, gives the same XML
+        guest3 = virtinst.Guest(self.conn, parsexml=guest2.get_xml())
+        self.assertEqual(guest3.get_xml(), guest2.get_xml())
+        self.assertEqual(guest3.devices.disk[1].hosts[0].name,
+                         "one.example.com")
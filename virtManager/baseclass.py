@@ -4,6 +4,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import collections
 import logging
 import os
 import sys
@@ -19,6 +20,87 @@ from gi.repository import Gtk
 from . import config
 
 
+class _IdleEmitDispatcher(object):
+    """
+    Queue for vmmGObject.idle_emit. Rather than adding one GLib idle
+    source per emission, all emissions go in a single ordered queue that
+    is drained from one idle callback. Emitting the same signal with the
+    same args on an object that already has it pending is folded into
+    the pending emission, which keeps its place in the queue. A burst
+    of state updates for an object costs one callback per main loop
+    iteration.
+
+    At most 'budget' emissions are run per idle callback, anything left
+    over waits for the next main loop iteration so redraws and input
+    can get through in between.
+    """
+    DEFAULT_BUDGET = 200
+
+    def __init__(self):
+        self.budget = self.DEFAULT_BUDGET
+
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()
+        self._source_id = None
+
+        self._stats = {
+            # Total idle_emit calls
+            "queued": 0,
+            # Calls folded into an already pending emission
+            "merged": 0,
+            # Emissions actually run
+            "emitted": 0,
+            # Idle callbacks that hit the budget and had to reschedule
+            "deferred": 0,
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return self._stats.copy()
+
+    def queue(self, obj, signal, args):
+        key = (obj, signal, args)
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable signal args, nothing to fold this with
+            key = object()
+
+        with self._lock:
+            self._stats["queued"] += 1
+            if key in self._pending:
+                self._stats["merged"] += 1
+            else:
+                self._pending[key] = (obj, signal, args)
+
+            if self._source_id is None:
+                self._source_id = GLib.idle_add(self._dispatch)
+
+    def _dispatch(self):
+        with self._lock:
+            count = min(max(self.budget, 1), len(self._pending))
+            todo = [self._pending.popitem(last=False)[1]
+                    for ignore in range(count)]
+
+        for obj, signal, args in todo:
+            try:
+                obj.emit(signal, *args)
+            except Exception:
+                logging.exception("Error emitting %s on %s", signal, obj)
+            with self._lock:
+                self._stats["emitted"] += 1
+
+        with self._lock:
+            if self._pending:
+                self._stats["deferred"] += 1
+                return True
+            self._source_id = None
+            return False
+
+
+_idle_emitter = _IdleEmitDispatcher()
+
+
 class vmmGObject(GObject.GObject):
     # Objects can set this to false to disable leak tracking
     _leak_check = True
@@ -97,6 +179,9 @@ class vmmGObject(GObject.GObject):
 
         self.__cleaned_up = True
 
+    def is_cleaned_up(self):
+        return self.__cleaned_up
+
     def _cleanup_on_app_close(self):
         from .engine import vmmEngine
         vmmEngine.get_instance().connect(
@@ -248,13 +333,11 @@ class vmmGObject(GObject.GObject):
 
     def idle_emit(self, signal, *args):
         """
-        Safe wrapper for using 'self.emit' with GLib.idle_add
+        Safe wrapper for using 'self.emit' from the main loop. Repeated
+        emissions of the same signal+args that are still pending are
+        coalesced, see _IdleEmitDispatcher
         """
-        def emitwrap(_s, *_a):
-            self.emit(_s, *_a)
-            return False
-
-        self.idle_add(emitwrap, signal, *args)
+        _idle_emitter.queue(self, signal, args)
 
 
 class vmmGObjectUI(vmmGObject):
@@ -105,6 +105,52 @@ class _SettingsWrapper(object):
                                   *args, **kwargs)
 
 
+class _StatsSettings(object):
+    """
+    Typed in-process copy of the stats polling settings. The stats and
+    tick code check these on every tick or graph redraw, so they are
+    read from gsettings once, then refreshed only from gsettings
+    'changed' notifications, and callers read plain attributes.
+    """
+    # attribute name -> (gsettings key, type)
+    _KEYS = {
+        "update_interval": ("/stats/update-interval", int),
+        "_background_update_interval": (
+            "/stats/background-update-interval", int),
+        "enable_cpu_poll": ("/stats/enable-cpu-poll", bool),
+        "enable_disk_poll": ("/stats/enable-disk-poll", bool),
+        "enable_net_poll": ("/stats/enable-net-poll", bool),
+        "enable_memory_poll": ("/stats/enable-memory-poll", bool),
+    }
+
+    def __init__(self, conf):
+        self._conf = conf
+
+        self.update_interval = 1
+        self._background_update_interval = 1
+        self.background_update_interval = 1
+        self.enable_cpu_poll = True
+        self.enable_disk_poll = False
+        self.enable_net_poll = False
+        self.enable_memory_poll = False
+
+        for attr, (key, ignore) in self._KEYS.items():
+            self._conf.notify_add(key, self.refresh, attr)
+            self.refresh(attr)
+
+    def refresh(self, attr):
+        """
+        Re-read the gsettings value backing 'attr'
+        """
+        key, valtype = self._KEYS[attr]
+        setattr(self, attr, valtype(self._conf.get(key)))
+
+        self.update_interval = max(self.update_interval, 1)
+        # The background tier never polls faster than the foreground one
+        self.background_update_interval = max(
+            self._background_update_interval, self.update_interval)
+
+
 class vmmConfig(object):
     # key names for saving last used paths
     CONFIG_DIR_IMAGE = "image"
@@ -169,6 +215,7 @@ class vmmConfig(object):
         self.test_leak_debug = False
 
         self.conf = _SettingsWrapper("org.virt-manager.virt-manager")
+        self.stats = _StatsSettings(self.conf)
 
         # We don't create it straight away, since we don't want
         # to block the app pending user authorization to access
@@ -377,34 +424,43 @@ class vmmConfig(object):
     def get_stats_history_length(self):
         return 120
     def get_stats_update_interval(self):
-        interval = self.conf.get("/stats/update-interval")
-        if interval < 1:
-            return 1
-        return interval
+        return self.stats.update_interval
     def set_stats_update_interval(self, interval):
         self.conf.set("/stats/update-interval", interval)
+        self.stats.refresh("update_interval")
     def on_stats_update_interval_changed(self, cb):
         return self.conf.notify_add("/stats/update-interval", cb)
 
+    # Slower polling tier for VMs nobody is looking at
+    def get_stats_background_update_interval(self):
+        return self.stats.background_update_interval
+    def set_stats_background_update_interval(self, interval):
+        self.conf.set("/stats/background-update-interval", interval)
+        self.stats.refresh("_background_update_interval")
+
 
     # Disable/Enable different stats polling
     def get_stats_enable_cpu_poll(self):
-        return self.conf.get("/stats/enable-cpu-poll")
+        return self.stats.enable_cpu_poll
     def get_stats_enable_disk_poll(self):
-        return self.conf.get("/stats/enable-disk-poll")
+        return self.stats.enable_disk_poll
     def get_stats_enable_net_poll(self):
-        return self.conf.get("/stats/enable-net-poll")
+        return self.stats.enable_net_poll
     def get_stats_enable_memory_poll(self):
-        return self.conf.get("/stats/enable-memory-poll")
+        return self.stats.enable_memory_poll
 
     def set_stats_enable_cpu_poll(self, val):
         self.conf.set("/stats/enable-cpu-poll", val)
+        self.stats.refresh("enable_cpu_poll")
     def set_stats_enable_disk_poll(self, val):
         self.conf.set("/stats/enable-disk-poll", val)
+        self.stats.refresh("enable_disk_poll")
     def set_stats_enable_net_poll(self, val):
         self.conf.set("/stats/enable-net-poll", val)
+        self.stats.refresh("enable_net_poll")
     def set_stats_enable_memory_poll(self, val):
         self.conf.set("/stats/enable-memory-poll", val)
+        self.stats.refresh("enable_memory_poll")
 
     def on_stats_enable_cpu_poll_changed(self, cb, row=None):
         return self.conf.notify_add("/stats/enable-cpu-poll", cb, row)
@@ -6,6 +6,7 @@
 
 import logging
 import os
+import queue
 import threading
 import time
 import traceback
@@ -27,6 +28,41 @@ from .statsmanager import vmmStatsManager
 from .storagepool import vmmStoragePool
 
 
+# Max number of threads used to initialize new objects of a single type
+_INIT_THREAD_COUNT = 8
+
+
+def _run_parallel(func, items, maxthreads, name):
+    """
+    Call func(item) for every item, spread across at most maxthreads
+    daemon threads. libvirt's RPC client allows concurrent calls on a
+    single connection, so this hides round trip latency when there are
+    lots of objects on a remote host.
+
+    :returns: List of the started threads
+    """
+    workqueue = queue.Queue()
+    for item in items:
+        workqueue.put(item)
+
+    def _worker():
+        while True:
+            try:
+                item = workqueue.get_nowait()
+            except queue.Empty:
+                return
+            func(item)
+
+    threads = []
+    for idx in range(min(len(items), maxthreads)):
+        thread = threading.Thread(target=_worker,
+                                  name="%s %d" % (name, idx))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
 # debugging helper to turn off events
 # Can be enabled with virt-manager --test-no-events
 FORCE_DISABLE_EVENTS = False
@@ -199,11 +235,18 @@ class vmmConnection(vmmGObject):
         self._node_device_cb_ids = []
 
         self._xml_flags = {}
+        self._bulk_state_supported = True
+
+        # How many object XML refreshes reparsed vs. found the XML
+        # unchanged, see vmmLibvirtObject. Objects are refreshed from
+        # several tick threads at once
+        self._xml_refresh_stats = {"parsed": 0, "skipped": 0}
+        self._xml_refresh_stats_lock = threading.Lock()
 
         self._objects = _ObjectList()
         self.statsmanager = vmmStatsManager()
 
-        self._stats = []
+        self._stats = self.statsmanager.get_host_statslist()
         self._hostinfo = None
 
         self.add_gsettings_handle(
@@ -362,8 +405,7 @@ class vmmConnection(vmmGObject):
     def get_cache_dir(self):
         uri = self.get_uri().replace("/", "_")
         ret = os.path.join(util.get_cache_dir(), uri)
-        if not os.path.exists(ret):
-            os.makedirs(ret, 0o755)
+        os.makedirs(ret, 0o755, exist_ok=True)
         return ret
 
     def get_default_storage_format(self):
@@ -918,7 +960,8 @@ class vmmConnection(vmmGObject):
 
     def close(self):
         if not self.is_disconnected():
-            logging.debug("conn.close() uri=%s", self.get_uri())
+            logging.debug("conn.close() uri=%s xml_refresh_stats=%s",
+                          self.get_uri(), self.get_xml_refresh_stats())
         self._closing = True
 
         try:
@@ -940,7 +983,8 @@ class vmmConnection(vmmGObject):
             self._storage_pool_cb_ids = []
             self._node_device_cb_ids = []
 
-        self._stats = []
+        self._stats.clear()
+        self.statsmanager.get_host_aggregate().clear()
 
         if self._init_object_event:
             self._init_object_event.clear()
@@ -1085,6 +1129,8 @@ class vmmConnection(vmmGObject):
     #######################
 
     def _remove_object_signal(self, obj):
+        if obj.is_domain() or obj.is_pool():
+            self._backend.invalidate_path_index()
         if obj.is_domain():
             self.emit("vm-removed", obj.get_connkey())
         elif obj.is_network():
@@ -1148,6 +1194,8 @@ class vmmConnection(vmmGObject):
                 # Skip nodedev logging since it's noisy and not interesting
                 logging.debug("%s=%s status=%s added", class_name,
                     obj.get_name(), obj.run_status())
+            if obj.is_domain() or obj.is_pool():
+                self._backend.invalidate_path_index()
             if obj.is_domain():
                 self.emit("vm-added", obj.get_connkey())
             elif obj.is_network():
@@ -1161,6 +1209,10 @@ class vmmConnection(vmmGObject):
         finally:
             if self._init_object_event:
                 self._init_object_count -= 1
+                if self._init_object_count and not (
+                        self._init_object_count % 100):
+                    logging.debug("%s: %d objects left to initialize",
+                                  self.get_uri(), self._init_object_count)
                 if self._init_object_count <= 0:
                     self._init_object_event.set()
 
@@ -1238,22 +1290,51 @@ class vmmConnection(vmmGObject):
             # is never called and the event is never set, so let's do it here
             self._init_object_event.set()
 
+        if new_vms:
+            self._prime_new_vms(new_vms)
+
+        def cb(obj):
+            obj.connect_once("initialized", self._new_object_cb)
+            obj.init_libvirt_state()
+
         for newlist in [new_vms, new_nets, new_pools,
                 new_ifaces, new_nodedevs]:
             if not newlist:
                 continue
 
-            def cb(lst):
-                for obj in lst:
-                    obj.connect_once("initialized", self._new_object_cb)
-                    obj.init_libvirt_state()
-
-            self._start_thread(cb,
-                "refreshing xml for new %s" % newlist[0].class_name(),
-                args=(newlist,))
+            _run_parallel(cb, newlist, _INIT_THREAD_COUNT,
+                "refreshing xml for new %s" % newlist[0].class_name())
 
         return gone_objects, preexisting_objects
 
+    def _prime_new_vms(self, new_vms):
+        """
+        Fetch the run state of all new VMs with a single bulk call, so
+        each vmmDomain doesn't need its own info() round trip during
+        initialization
+        """
+        if not self._bulk_state_supported:
+            return
+
+        try:
+            rawstats = self._backend.domainListGetStats(
+                    [vm.get_backend() for vm in new_vms],
+                    libvirt.VIR_DOMAIN_STATS_STATE, 0)
+        except Exception as e:
+            if util.is_error_nosupport(e):
+                logging.debug("conn does not support domainListGetStats()")
+                self._bulk_state_supported = False
+            else:
+                logging.debug("Error fetching bulk state for new VMs: %s", e)
+            return
+
+        states = {}
+        for dom, domstats in rawstats:
+            if "state.state" in domstats:
+                states[dom.UUIDString()] = domstats["state.state"]
+        for vm in new_vms:
+            vm.prime_status(states.get(vm.get_uuid()))
+
     def _tick(self, stats_update=False,
              pollvm=False, pollnet=False,
              pollpool=False, polliface=False,
@@ -1292,6 +1373,9 @@ class vmmConnection(vmmGObject):
 
         gone_objects, preexisting_objects = self._poll(
             initial_poll, pollvm, pollnet, pollpool, polliface, pollnodedev)
+        for obj in gone_objects:
+            if obj.reports_stats():
+                self.statsmanager.remove_vm_stats(obj)
         self.idle_add(self._gone_object_signals, gone_objects)
 
         # Only tick() pre-existing objects, since new objects will be
@@ -1324,72 +1408,56 @@ class vmmConnection(vmmGObject):
                                   "Ignoring.")
 
         if stats_update:
-            self._recalculate_stats(
-                [o for o in preexisting_objects if o.reports_stats()])
+            self._recalculate_stats()
             self.idle_emit("resources-sampled")
 
-    def _recalculate_stats(self, vms):
+    def _recalculate_stats(self):
         if not self._backend.is_open():
             return
 
         now = time.time()
-        expected = self.config.get_stats_history_length()
-        current = len(self._stats)
-        if current > expected:
-            del self._stats[expected:current]
+        self._stats.resize(self.config.get_stats_history_length() + 1)
+
+        aggregate = self.statsmanager.get_host_aggregate()
+        mem = aggregate.get_total("curmem")
+        pcentHostCpu = aggregate.get_total("cpuHostPercent")
+        rdRate = aggregate.get_total("diskRdRate")
+        wrRate = aggregate.get_total("diskWrRate")
+        rxRate = aggregate.get_total("netRxRate")
+        txRate = aggregate.get_total("netTxRate")
+        diskMaxRate = max(self.disk_io_max_rate(), aggregate.diskMaxRate)
+        netMaxRate = max(self.network_traffic_max_rate(),
+                         aggregate.netMaxRate)
 
-        mem = 0
         cpuTime = 0
-        rdRate = 0
-        wrRate = 0
-        rxRate = 0
-        txRate = 0
-        diskMaxRate = self.disk_io_max_rate() or 10.0
-        netMaxRate = self.network_traffic_max_rate() or 10.0
-
-        for vm in vms:
-            if not vm.is_active():
-                continue
-
-            cpuTime += vm.cpu_time()
-            mem += vm.stats_memory()
-            rdRate += vm.disk_read_rate()
-            wrRate += vm.disk_write_rate()
-            rxRate += vm.network_rx_rate()
-            txRate += vm.network_tx_rate()
-
-            netMaxRate = max(netMaxRate, vm.network_traffic_max_rate())
-            diskMaxRate = max(diskMaxRate, vm.disk_io_max_rate())
-
-        pcentHostCpu = 0
         pcentMem = mem * 100.0 / self.host_memory_size()
+        pcentHostCpu = max(0.0, min(100.0, pcentHostCpu))
 
         if len(self._stats) > 0:
-            prevTimestamp = self._stats[0]["timestamp"]
+            # VMs are sampled at different rates, so the aggregate sums
+            # their CPU usage as percentages. Turn that back into the
+            # CPU time used since our previous sample
+            prevTimestamp = self._stats.get_record("timestamp")
             host_cpus = self.host_active_processor_count()
 
-            pcentHostCpu = ((cpuTime) * 100.0 /
-                            ((now - prevTimestamp) *
-                             1000.0 * 1000.0 * 1000.0 * host_cpus))
+            cpuTime = int(pcentHostCpu / 100.0 *
+                          (now - prevTimestamp) *
+                          1000.0 * 1000.0 * 1000.0 * host_cpus)
 
-        pcentHostCpu = max(0.0, min(100.0, pcentHostCpu))
         pcentMem = max(0.0, min(100.0, pcentMem))
 
-        newStats = {
-            "timestamp": now,
-            "memory": mem,
-            "memoryPercent": pcentMem,
-            "cpuTime": cpuTime,
-            "cpuHostPercent": pcentHostCpu,
-            "diskRdRate": rdRate,
-            "diskWrRate": wrRate,
-            "netRxRate": rxRate,
-            "netTxRate": txRate,
-            "diskMaxRate": diskMaxRate,
-            "netMaxRate": netMaxRate,
-        }
-
-        self._stats.insert(0, newStats)
+        self._stats.append(
+            timestamp=now,
+            memory=mem,
+            memoryPercent=pcentMem,
+            cpuTime=cpuTime,
+            cpuHostPercent=pcentHostCpu,
+            diskRdRate=rdRate,
+            diskWrRate=wrRate,
+            netRxRate=rxRate,
+            netTxRate=txRate,
+            diskMaxRate=diskMaxRate,
+            netMaxRate=netMaxRate)
 
 
     def schedule_priority_tick(self, **kwargs):
@@ -1437,23 +1505,10 @@ class vmmConnection(vmmGObject):
     ########################
 
     def _get_record_helper(self, record_name):
-        if len(self._stats) == 0:
-            return 0
-        return self._stats[0][record_name]
+        return self._stats.get_record(record_name)
 
     def _vector_helper(self, record_name, limit, ceil=100.0):
-        vector = []
-        statslen = self.config.get_stats_history_length() + 1
-        if limit is not None:
-            statslen = min(statslen, limit)
-
-        for i in range(statslen):
-            if i < len(self._stats):
-                vector.append(self._stats[i][record_name] / ceil)
-            else:
-                vector.append(0)
-
-        return vector
+        return self._stats.scaled_view(record_name, limit, ceil)
 
     def stats_memory_vector(self, limit=None):
         return self._vector_helper("memoryPercent", limit)
@@ -1478,6 +1533,18 @@ class vmmConnection(vmmGObject):
     def disk_io_max_rate(self):
         return self._get_record_helper("diskMaxRate")
 
+    def count_xml_refresh(self, parsed):
+        with self._xml_refresh_stats_lock:
+            self._xml_refresh_stats[parsed and "parsed" or "skipped"] += 1
+
+    def get_xml_refresh_stats(self):
+        """
+        Return a dict with the number of object XML refreshes that were
+        'parsed' and that were 'skipped' because the XML didn't change
+        """
+        with self._xml_refresh_stats_lock:
+            return self._xml_refresh_stats.copy()
+
 
     ###########################
     # Per-conn config helpers #
@@ -2049,10 +2049,10 @@ class vmmDetails(vmmGObjectUI):
         dsk_txt = _("Disabled")
         net_txt = _("Disabled")
 
-        if self.config.get_stats_enable_cpu_poll():
+        if self.config.stats.enable_cpu_poll:
             cpu_txt = "%d %%" % self.vm.guest_cpu_time_percentage()
 
-        if self.config.get_stats_enable_memory_poll():
+        if self.config.stats.enable_memory_poll:
             cur_vm_memory = self.vm.stats_memory()
             vm_memory = self.vm.maximum_memory()
             mem_txt = _("%(current-memory)s of %(total-memory)s") % {
@@ -2060,11 +2060,11 @@ class vmmDetails(vmmGObjectUI):
                 "total-memory": util.pretty_mem(vm_memory)
             }
 
-        if self.config.get_stats_enable_disk_poll():
+        if self.config.stats.enable_disk_poll:
             dsk_txt = _dsk_rx_tx_text(self.vm.disk_read_rate(),
                                       self.vm.disk_write_rate(), "KiB/s")
 
-        if self.config.get_stats_enable_net_poll():
+        if self.config.stats.enable_net_poll:
             net_txt = _net_rx_tx_text(self.vm.network_rx_rate(),
                                       self.vm.network_tx_rate(), "KiB/s")
 
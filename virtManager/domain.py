@@ -101,6 +101,9 @@ class vmmDomainSnapshot(vmmLibvirtObject):
         vmmLibvirtObject.__init__(self, conn, backend, backend.getName(),
                                   DomainSnapshot)
 
+        self._is_current = None
+        self._is_external = None
+
 
     ##########################
     # Required class methods #
@@ -122,7 +125,9 @@ class vmmDomainSnapshot(vmmLibvirtObject):
     def tick(self, stats_update=True):
         ignore = stats_update
     def _init_libvirt_state(self):
-        self.ensure_latest_xml()
+        # XML is fetched on first get_xmlobj() call. A VM can have
+        # hundreds of snapshots, and listing them only needs names
+        pass
 
 
     ###########
@@ -133,6 +138,26 @@ class vmmDomainSnapshot(vmmLibvirtObject):
         ignore = force
         self._backend.delete()
 
+    def set_current(self, is_current):
+        """
+        Cache current snapshot status, looked up in bulk by
+        vmmDomain.list_snapshots
+        """
+        self._is_current = bool(is_current)
+    def set_external(self, is_external):
+        """
+        Cache external snapshot status, looked up in bulk by
+        vmmDomain.list_snapshots
+        """
+        self._is_external = bool(is_external)
+    def is_external_known(self):
+        """
+        Whether is_external() can answer without fetching XML
+        """
+        return self._is_external is not None or self.is_xml_loaded()
+    def is_xml_loaded(self):
+        return self._xmlobj is not None
+
     def run_status(self):
         status = DomainSnapshot.state_str_to_int(self.get_xmlobj().state)
         return LibvirtEnumMap.pretty_run_status(status, False)
@@ -144,8 +169,12 @@ class vmmDomainSnapshot(vmmLibvirtObject):
         return LibvirtEnumMap.VM_STATUS_ICONS[status]
 
     def is_current(self):
-        return self._backend.isCurrent()
+        if self._is_current is None:
+            self._is_current = bool(self._backend.isCurrent())
+        return self._is_current
     def is_external(self):
+        if self._is_external is not None:
+            return self._is_external
         if self.get_xmlobj().memory_type == "external":
             return True
         for disk in self.get_xmlobj().disks:
@@ -175,10 +204,12 @@ class vmmDomain(vmmLibvirtObject):
         self._uuid = None
         self._has_managed_save = None
         self._snapshot_list = None
+        self._snapshot_list_stale = False
         self._autostart = None
         self._domain_caps = None
         self._status_reason = None
         self._ip_cache = None
+        self._primed_status = None
 
         self.managedsave_supported = False
         self._domain_state_supported = False
@@ -203,8 +234,11 @@ class vmmDomain(vmmLibvirtObject):
          self._active_xml_flags) = self.conn.get_dom_flags(self._backend)
 
         # Prime caches
-        info = self._backend.info()
-        self._refresh_status(newstatus=info[0])
+        status = self._primed_status
+        self._primed_status = None
+        if status is None:
+            status = self._backend.info()[0]
+        self._refresh_status(newstatus=status)
         self.has_managed_save()
         self.snapshots_supported()
 
@@ -217,6 +251,13 @@ class vmmDomain(vmmLibvirtObject):
 
         self.connect("pre-startup", self._prestartup_nodedev_check)
 
+    def prime_status(self, status):
+        """
+        Called by vmmConnection with the VM run state fetched in bulk,
+        so _init_libvirt_state can skip a separate info() call
+        """
+        self._primed_status = status
+
     def _prestartup_nodedev_check(self, src, ret):
         ignore = src
         error = _("There is more than one '%s' device attached to "
@@ -1039,14 +1080,48 @@ class vmmDomain(vmmLibvirtObject):
 
         return self._backend.openGraphicsFD(0, flags)
 
-    def list_snapshots(self):
-        if self._snapshot_list is None:
-            newlist = []
-            for rawsnap in self._backend.listAllSnapshots():
+    def _update_snapshot_list(self):
+        """
+        Sync the cached snapshot list with libvirt. Objects for snapshots
+        we already know about are reused so their parsed XML is kept.
+        Current and external status are looked up once for the whole
+        list, so the snapshot page can sort rows before any XML is
+        fetched.
+        """
+        oldsnaps = dict((s.get_name(), s) for s in self._snapshot_list or [])
+
+        current = None
+        if self._backend.hasCurrentSnapshot():
+            current = self._backend.snapshotCurrent().getName()
+
+        external = None
+        try:
+            external = set(s.getName() for s in self._backend.listAllSnapshots(
+                libvirt.VIR_DOMAIN_SNAPSHOT_LIST_EXTERNAL))
+        except Exception:
+            # Older libvirt, is_external falls back to parsing XML
+            logging.debug("Error listing external snapshots", exc_info=True)
+
+        newlist = []
+        for rawsnap in self._backend.listAllSnapshots():
+            name = rawsnap.getName()
+            obj = oldsnaps.pop(name, None)
+            if obj is None:
                 obj = vmmDomainSnapshot(self.conn, rawsnap)
                 obj.init_libvirt_state()
-                newlist.append(obj)
-            self._snapshot_list = newlist
+            obj.set_current(name == current)
+            if external is not None:
+                obj.set_external(name in external)
+            newlist.append(obj)
+
+        for obj in oldsnaps.values():
+            obj.cleanup()
+        self._snapshot_list = newlist
+        self._snapshot_list_stale = False
+
+    def list_snapshots(self):
+        if self._snapshot_list is None or self._snapshot_list_stale:
+            self._update_snapshot_list()
         return self._snapshot_list[:]
 
     @vmmLibvirtObject.lifecycle_action
@@ -1141,8 +1216,19 @@ class vmmDomain(vmmLibvirtObject):
                 return ipv4, ipv6
         return None, None
 
-    def refresh_snapshots(self):
-        self._snapshot_list = None
+    def refresh_snapshots(self, reload_xml=False):
+        """
+        Have the next list_snapshots call pick up added and removed
+        snapshots and the current snapshot.
+
+        :param reload_xml: Throw away the cached snapshot objects too,
+            for when snapshots may have been changed outside virt-manager
+        """
+        if reload_xml:
+            for snap in self._snapshot_list or []:
+                snap.cleanup()
+            self._snapshot_list = None
+        self._snapshot_list_stale = True
 
 
     ########################
@@ -1544,8 +1630,7 @@ class vmmDomain(vmmLibvirtObject):
 
     def get_cache_dir(self):
         ret = os.path.join(self.conn.get_cache_dir(), self.get_uuid())
-        if not os.path.exists(ret):
-            os.makedirs(ret, 0o755)
+        os.makedirs(ret, 0o755, exist_ok=True)
         return ret
 
 
@@ -23,6 +23,9 @@ from .systray import vmmSystray
 (PRIO_HIGH,
  PRIO_LOW) = range(1, 3)
 
+# Max number of connections we will tick in parallel
+TICK_THREAD_COUNT = 4
+
 
 def _show_startup_error(fn):
     """
@@ -40,6 +43,28 @@ def _show_startup_error(fn):
     return newfn
 
 
+class _TickLatency(object):
+    """
+    Tracks how long tick_from_engine takes for a single connection
+    """
+    def __init__(self):
+        self.count = 0
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+
+    def add(self, secs):
+        self.count += 1
+        self.last = secs
+        self.max = max(self.max, secs)
+        self.total += secs
+
+    def average(self):
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+
 class vmmEngine(vmmGObject):
     CLI_SHOW_MANAGER = "manager"
     CLI_SHOW_DOMAIN_CREATOR = "creator"
@@ -71,12 +96,24 @@ class vmmEngine(vmmGObject):
         self._timer = None
         self._tick_counter = 0
         self._tick_thread_slow = False
-        self._tick_thread = threading.Thread(name="Tick thread",
-                                            target=self._handle_tick_queue,
-                                            args=())
-        self._tick_thread.daemon = True
+        self._tick_threads = []
+        for idx in range(TICK_THREAD_COUNT):
+            thread = threading.Thread(name="Tick thread %d" % idx,
+                                      target=self._handle_tick_queue,
+                                      args=())
+            thread.daemon = True
+            self._tick_threads.append(thread)
         self._tick_queue = queue.PriorityQueue(100)
 
+        # Only one tick per connection may run at a time. Requests that
+        # arrive while one is in flight are merged into _pending_ticks,
+        # and run by the same thread once the current tick finishes
+        self._tick_lock = threading.Lock()
+        self._ticks_in_flight = set()
+        self._pending_ticks = {}
+        # uri -> _TickLatency, reported when a tick runs slow
+        self._tick_latency = {}
+
 
     @property
     def _connobjs(self):
@@ -104,7 +141,8 @@ class vmmEngine(vmmGObject):
                 self._timer_changed_cb))
 
         self._schedule_timer()
-        self._tick_thread.start()
+        for thread in self._tick_threads:
+            thread.start()
         self._tick()
 
         uris = list(self._connobjs.keys())
@@ -330,7 +368,7 @@ class vmmEngine(vmmGObject):
         self._schedule_timer()
 
     def _schedule_timer(self):
-        interval = self.config.get_stats_update_interval() * 1000
+        interval = self.config.stats.update_interval * 1000
 
         if self._timer is not None:
             self.remove_gobject_timeout(self._timer)
@@ -360,20 +398,54 @@ class vmmEngine(vmmGObject):
                                         stats_update=True, pollvm=True)
         return 1
 
+    def _tick_conn(self, conn, kwargs):
+        start = time.time()
+        try:
+            conn.tick_from_engine(**kwargs)
+        except Exception:
+            # Don't attempt to show any UI error here, since it
+            # can cause dialogs to appear from nowhere if say
+            # libvirtd is shut down
+            logging.debug("Error polling connection %s",
+                    conn.get_uri(), exc_info=True)
+
+        secs = time.time() - start
+        latency = self._tick_latency.setdefault(conn.get_uri(),
+                                                _TickLatency())
+        latency.add(secs)
+        if secs > self.config.stats.update_interval:
+            logging.debug("Tick for %s took %.2f seconds "
+                          "(average=%.2f max=%.2f)",
+                          conn.get_uri(), secs,
+                          latency.average(), latency.max)
+
+    def _merge_pending_tick(self, conn, kwargs):
+        # Tick kwargs are all boolean 'do this work' flags, so the union
+        # of two requests covers both
+        pending = self._pending_ticks.setdefault(conn, {})
+        for key, val in kwargs.items():
+            pending[key] = pending.get(key, False) or val
+
     def _handle_tick_queue(self):
         while True:
             ignore1, ignore2, conn, kwargs = self._tick_queue.get()
-            try:
-                conn.tick_from_engine(**kwargs)
-            except Exception:
-                # Don't attempt to show any UI error here, since it
-                # can cause dialogs to appear from nowhere if say
-                # libvirtd is shut down
-                logging.debug("Error polling connection %s",
-                        conn.get_uri(), exc_info=True)
-
-            # Need to clear reference to make leak check happy
-            conn = None
+
+            with self._tick_lock:
+                if conn in self._ticks_in_flight:
+                    self._merge_pending_tick(conn, kwargs)
+                    conn = None
+                else:
+                    self._ticks_in_flight.add(conn)
+
+            while conn:
+                self._tick_conn(conn, kwargs)
+                with self._tick_lock:
+                    kwargs = self._pending_ticks.pop(conn, None)
+                    if kwargs is None:
+                        self._ticks_in_flight.discard(conn)
+                        # Need to clear reference to make leak check happy
+                        conn = None
+
             self._tick_queue.task_done()
         return 1
 
@@ -3,6 +3,10 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import collections
+
+import cairo
+
 from gi.repository import GObject
 from gi.repository import Gtk
 
@@ -82,6 +86,17 @@ def draw_fill(cairo_ct, x, y, w, h, points, taper=False):
     cairo_ct.fill()
 
 
+class _SparklineCacheEntry(object):
+    """
+    A rendered sparkline graph surface, plus the parameters it was
+    rendered with
+    """
+    def __init__(self, surface, geometry, values):
+        self.surface = surface
+        self.geometry = geometry
+        self.values = values
+
+
 class CellRendererSparkline(Gtk.CellRenderer):
     __gproperties__ = {
         # 'name': (GObject.TYPE_*,
@@ -94,8 +109,17 @@ class CellRendererSparkline(Gtk.CellRenderer):
         'reversed': (GObject.TYPE_BOOLEAN, "Reverse data",
                      "Process data from back to front.",
                      0, GObject.PARAM_READWRITE),
+        'cache_key': (GObject.TYPE_PYOBJECT, "Cache key",
+                      "Hashable key for the row being rendered. If set, "
+                      "the rendered graph is cached per key",
+                      GObject.PARAM_READWRITE),
     }
 
+    # Space around the graph area in the cached surface, for line caps
+    # and the fill overhang
+    _SURFACE_PAD = 2
+    _CACHE_SIZE = 2000
+
     def __init__(self):
         Gtk.CellRenderer.__init__(self)
 
@@ -104,6 +128,121 @@ class CellRendererSparkline(Gtk.CellRenderer):
         self.filled = True
         self.reversed = False
         self.rgb = None
+        self.cache_key = None
+
+        self._cache = collections.OrderedDict()
+        self._style_widgets = []
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _watch_style(self, widget):
+        # Theme changes invalidate everything we have cached
+        if widget in self._style_widgets:
+            return
+        self._style_widgets.append(widget)
+        widget.connect("style-updated", lambda *args: self.clear_cache())
+        widget.connect("destroy", self._style_widget_destroyed)
+
+    def _style_widget_destroyed(self, widget):
+        self._style_widgets.remove(widget)
+        self.clear_cache()
+
+    def _render_graph(self, cr, values, geometry, start=0, end=None):
+        """
+        Render the line and fill for values[start:end], with the graph
+        area's top left corner at (_SURFACE_PAD, _SURFACE_PAD)
+        """
+        graph_width, graph_height, pixels_per_point = geometry
+        pad = self._SURFACE_PAD
+        baseline_y = pad + graph_height
+
+        points = []
+        for index, val in enumerate(values):
+            x = (index * pixels_per_point) + pad
+            y = baseline_y - (graph_height * val)
+            y = min(baseline_y, max(pad, y))
+            points.append((int(x), int(y)))
+        points = points[start:end]
+        cr.new_path()
+        if not points:
+            return
+
+        # Round joins keep everything a line draws within a pixel of
+        # its points, which lets us redraw just part of a cached graph
+        cr.set_line_cap(cairo.LINE_CAP_ROUND)
+        cr.set_line_join(cairo.LINE_JOIN_ROUND)
+
+        # Set color to dark blue for the actual sparkline
+        cr.set_line_width(2)
+        cr.set_source_rgb(0.421875, 0.640625, 0.73046875)
+        draw_line(cr, pad, graph_height, points)
+
+        # Set color to light blue for the fill
+        cr.set_source_rgba(0.71484375, 0.84765625, 0.89453125, .5)
+        draw_fill(cr, points[0][0], pad, graph_width, graph_height, points)
+
+    def _new_surface(self, target, geometry):
+        graph_width, graph_height, ignore = geometry
+        pad = self._SURFACE_PAD
+        return target.create_similar(cairo.CONTENT_COLOR_ALPHA,
+                                     graph_width + (pad * 2) + 1,
+                                     graph_height + (pad * 2) + 1)
+
+    def _redraw_region(self, cr, values, geometry, x, width, start, end):
+        cr.save()
+        cr.rectangle(x, 0, width, geometry[1] + (self._SURFACE_PAD * 2) + 1)
+        cr.clip()
+        cr.set_operator(cairo.OPERATOR_CLEAR)
+        cr.paint()
+        cr.set_operator(cairo.OPERATOR_OVER)
+        self._render_graph(cr, values, geometry, start, end)
+        cr.restore()
+
+    def _get_graph_surface(self, target, values, geometry):
+        """
+        Return a surface with the rendered graph for the current
+        cache_key. If the cached graph for the row is just the new
+        values advanced by one sample, shift the cached image and only
+        redraw the edges.
+        """
+        entry = self._cache.get(self.cache_key)
+        if entry and entry.geometry == geometry:
+            self._cache.move_to_end(self.cache_key)
+            if entry.values == values:
+                return entry.surface
+
+            count = len(values)
+            if (count >= 5 and len(entry.values) == count and
+                    entry.values[1:] == values[:-1]):
+                pixels_per_point = geometry[2]
+                pad = self._SURFACE_PAD
+                surface = self._new_surface(target, geometry)
+                cr = cairo.Context(surface)
+                cr.set_source_surface(entry.surface, -pixels_per_point, 0)
+                cr.paint()
+
+                # The old first point was shifted off the left side,
+                # the new first point needs its start cap
+                self._redraw_region(cr, values, geometry,
+                        0, pad + pixels_per_point, 0, 3)
+                # New point on the right
+                rightx = pad + ((count - 3) * pixels_per_point)
+                self._redraw_region(cr, values, geometry,
+                        rightx, surface.get_width() - rightx,
+                        count - 4, None)
+
+                entry.surface = surface
+                entry.values = values
+                return surface
+
+        surface = self._new_surface(target, geometry)
+        self._render_graph(cairo.Context(surface), values, geometry)
+        self._cache[self.cache_key] = _SparklineCacheEntry(
+                surface, geometry, values)
+        if len(self._cache) > self._CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return surface
 
     def do_render(self, cr, widget, background_area, cell_area,
                   flags):
@@ -114,7 +253,6 @@ class CellRendererSparkline(Gtk.CellRenderer):
         # flags             : flags that affect rendering
         # flags = Gtk.CELL_RENDERER_SELECTED, Gtk.CELL_RENDERER_PRELIT,
         #         Gtk.CELL_RENDERER_INSENSITIVE or Gtk.CELL_RENDERER_SORTED
-        ignore = widget
         ignore = background_area
         ignore = flags
 
@@ -170,46 +308,24 @@ class CellRendererSparkline(Gtk.CellRenderer):
                      cell_area.height - (BORDER_PADDING * 2))
         cr.fill()
 
-        def get_y(index):
-            baseline_y = graph_y + graph_height
-
-            if self.reversed:
-                n = (len(self.data_array) - index - 1)
-            else:
-                n = index
-
-            val = self.data_array[n]
-            y = baseline_y - (graph_height * val)
-
-            y = max(graph_y, y)
-            y = min(graph_y + graph_height, y)
-            return y
-
-        points = []
-        for index in range(0, len(self.data_array)):
-            x = int(((index * pixels_per_point) + graph_x))
-            y = int(get_y(index))
-
-            points.append((x, y))
-
-
-        cell_area.x = graph_x
-        cell_area.y = graph_y
-        cell_area.width = graph_width
-        cell_area.height = graph_height
-
-        # Set color to dark blue for the actual sparkline
-        cr.set_line_width(2)
-        cr.set_source_rgb(0.421875, 0.640625, 0.73046875)
-        draw_line(cr, cell_area.y, cell_area.height, points)
-
-        # Set color to light blue for the fill
-        cr.set_source_rgba(0.71484375, 0.84765625, 0.89453125, .5)
-        draw_fill(cr,
-                  cell_area.x, cell_area.y,
-                  cell_area.width, cell_area.height,
-                  points)
-        return
+        # Values in the order they are drawn, left to right
+        values = tuple(self.data_array)
+        if self.reversed:
+            values = values[::-1]
+        geometry = (graph_width, graph_height, pixels_per_point)
+        pad = self._SURFACE_PAD
+
+        if self.cache_key is None:
+            cr.save()
+            cr.translate(graph_x - pad, graph_y - pad)
+            self._render_graph(cr, values, geometry)
+            cr.restore()
+            return
+
+        self._watch_style(widget)
+        surface = self._get_graph_surface(cr.get_target(), values, geometry)
+        cr.set_source_surface(surface, graph_x - pad, graph_y - pad)
+        cr.paint()
 
     def do_get_size(self, widget, cell_area=None):
         ignore = widget
@@ -279,8 +395,45 @@ class Sparkline(Gtk.DrawingArea):
         self.reversed = False
         self.rgb = []
 
+        # Themed background, tick marks and frame, which only change
+        # on resize or theme change. (width, height, surface)
+        self._background = None
+
         ctxt = self.get_style_context()
         ctxt.add_class(Gtk.STYLE_CLASS_ENTRY)
+        self.connect("style-updated", self._invalidate_background)
+        self.connect("size-allocate", self._invalidate_background)
+
+    def _invalidate_background(self, *args):
+        ignore = args
+        self._background = None
+
+    def _get_background(self, w, h):
+        if self._background and self._background[:2] == (w, h):
+            return self._background[2]
+
+        surface = self.get_window().create_similar_surface(
+                cairo.CONTENT_COLOR_ALPHA, w, h)
+        cr = cairo.Context(surface)
+        ctx = self.get_style_context()
+
+        # This draws the light gray backing rectangle
+        Gtk.render_background(ctx, cr, 0, 0, w - 1, h - 1)
+
+        # This draws the marker ticks
+        max_ticks = 4
+        for index in range(1, max_ticks):
+            Gtk.render_line(ctx, cr, 1,
+                            (h // max_ticks) * index,
+                            w - 2,
+                            (h // max_ticks) * index)
+
+        # Foreground-color graphics context
+        # This draws the black border
+        Gtk.render_frame(ctx, cr, 0, 0, w - 1, h - 1)
+
+        self._background = (w, h, surface)
+        return surface
 
     def set_data_array(self, val):
         self._data_array = val
@@ -301,23 +454,8 @@ class Sparkline(Gtk.DrawingArea):
         pixels_per_point = (float(w) /
                             (float((points_per_set - 1) or 1)))
 
-        widget = self
-        ctx = widget.get_style_context()
-
-        # This draws the light gray backing rectangle
-        Gtk.render_background(ctx, cr, 0, 0, w - 1, h - 1)
-
-        # This draws the marker ticks
-        max_ticks = 4
-        for index in range(1, max_ticks):
-            Gtk.render_line(ctx, cr, 1,
-                            (h // max_ticks) * index,
-                            w - 2,
-                            (h // max_ticks) * index)
-
-        # Foreground-color graphics context
-        # This draws the black border
-        Gtk.render_frame(ctx, cr, 0, 0, w - 1, h - 1)
+        cr.set_source_surface(self._get_background(w, h), 0, 0)
+        cr.paint()
 
         # Draw the actual sparkline
         def get_y(dataset, index):
@@ -144,10 +144,12 @@ class vmmHost(vmmGObjectUI):
         self.widget("config-autoconnect").set_active(auto)
 
         self._cpu_usage_graph = Sparkline()
+        self._cpu_usage_graph.set_property("reversed", True)
         self._cpu_usage_graph.show()
         self.widget("performance-cpu-align").add(self._cpu_usage_graph)
 
         self._memory_usage_graph = Sparkline()
+        self._memory_usage_graph.set_property("reversed", True)
         self._memory_usage_graph.show()
         self.widget("performance-memory-align").add(self._memory_usage_graph)
 
@@ -162,8 +164,6 @@ class vmmHost(vmmGObjectUI):
 
         cpu_vector = self.conn.host_cpu_time_vector()
         memory_vector = self.conn.stats_memory_vector()
-        cpu_vector.reverse()
-        memory_vector.reverse()
 
         self.widget("performance-cpu").set_text("%d %%" %
                                         self.conn.host_cpu_time_percentage())
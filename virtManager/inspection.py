@@ -3,7 +3,10 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import base64
+import json
 import logging
+import os
 import queue
 import threading
 
@@ -11,6 +14,13 @@ from .baseclass import vmmGObject
 from .connmanager import vmmConnectionManager
 from .domain import vmmInspectionApplication, vmmInspectionData
 
+# Max number of libguestfs appliances we run at once
+_INSPECTION_THREAD_COUNT = 4
+
+# Name of the file in the VM's cache dir storing inspection results
+_CACHE_FILENAME = "inspection.json"
+_CACHE_VERSION = 1
+
 
 def _inspection_error(_errstr):
     data = vmmInspectionData()
@@ -18,6 +28,92 @@ def _inspection_error(_errstr):
     return data
 
 
+def _inspection_data_to_dict(data):
+    ret = data.__dict__.copy()
+    if data.icon:
+        ret["icon"] = base64.b64encode(data.icon).decode("ascii")
+    ret["applications"] = [app.__dict__.copy() for app in
+                           (data.applications or [])]
+    return ret
+
+
+def _inspection_data_from_dict(datadict):
+    data = vmmInspectionData()
+    for key in data.__dict__:
+        setattr(data, key, datadict.get(key))
+    if data.icon:
+        data.icon = base64.b64decode(data.icon)
+
+    data.applications = []
+    for appdict in datadict.get("applications") or []:
+        app = vmmInspectionApplication()
+        for key in app.__dict__:
+            setattr(app, key, appdict.get(key))
+        data.applications.append(app)
+    return data
+
+
+def _get_disk_signature(vm):
+    """
+    List of (path, mtime, size) for the VM's disks. If this is unchanged
+    since the last inspection, the cached results are still valid
+    """
+    ret = []
+    for disk in vm.get_disk_devices_norefresh():
+        path = disk.path
+        if not path:
+            continue
+        try:
+            st = os.stat(path)
+            ret.append([path, st.st_mtime_ns, st.st_size])
+        except OSError:
+            ret.append([path, None, None])
+    return ret
+
+
+def _load_disk_cache(vm, signature):
+    """
+    Return the vmmInspectionData cached in the VM's cache dir, or None
+    if there isn't any or it doesn't match the disk signature
+    """
+    path = None
+    try:
+        path = os.path.join(vm.get_cache_dir(), _CACHE_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            content = json.load(f)
+        if (content.get("version") != _CACHE_VERSION or
+            content.get("uuid") != vm.get_uuid() or
+            content.get("disks") != signature):
+            return None
+        return _inspection_data_from_dict(content["data"])
+    except Exception:
+        logging.debug("Error reading inspection cache %s",
+                      path, exc_info=True)
+        return None
+
+
+def _save_disk_cache(vm, signature, data):
+    content = {
+        "version": _CACHE_VERSION,
+        "uuid": vm.get_uuid(),
+        "disks": signature,
+        "data": _inspection_data_to_dict(data),
+    }
+
+    path = None
+    try:
+        path = os.path.join(vm.get_cache_dir(), _CACHE_FILENAME)
+        tmppath = path + ".tmp"
+        with open(tmppath, "w") as f:
+            json.dump(content, f)
+        os.replace(tmppath, path)
+    except Exception:
+        logging.debug("Error writing inspection cache %s",
+                      path, exc_info=True)
+
+
 class vmmInspection(vmmGObject):
     _libguestfs_installed = None
 
@@ -55,6 +151,16 @@ class vmmInspection(vmmGObject):
         self._conns = {}
         self._cached_data = {}
 
+        # Inspection of individual VMs is handed off from the main
+        # inspection thread to a pool of workers
+        self._workers = []
+        self._work_q = queue.Queue()
+        self._work_lock = threading.Lock()
+        self._in_progress = set()
+        # Refreshes requested while the VM was being inspected, run
+        # once that finishes: uuid -> (conn, vm)
+        self._pending_refresh = {}
+
         val = self.config.get_libguestfs_inspect_vms()
         logging.debug("libguestfs gsetting enabled=%s", str(val))
         if not val:
@@ -71,8 +177,14 @@ class vmmInspection(vmmGObject):
     def _cleanup(self):
         self._stop()
         self._q = queue.Queue()
+        self._work_q = queue.Queue()
         self._conns = {}
         self._cached_data = {}
+        with self._work_lock:
+            # Workers stopped mid-inspection never clear their VMs, which
+            # would then never be inspected again after a restart
+            self._in_progress = set()
+            self._pending_refresh = {}
 
     def _conn_added(self, _src, conn):
         obj = ("conn_added", conn)
@@ -103,12 +215,23 @@ class vmmInspection(vmmGObject):
         self._thread.daemon = True
         self._thread.start()
 
+        for idx in range(_INSPECTION_THREAD_COUNT):
+            worker = threading.Thread(
+                    name="inspection worker %d" % idx,
+                    target=self._run_worker, args=(self._work_q,))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
     def _stop(self):
         if self._thread is None:
             return
 
         self._q.put(None)
+        for ignore in self._workers:
+            self._work_q.put(None)
         self._thread = None
+        self._workers = []
 
     def _run(self):
         # Process everything on the queue.  If the queue is empty when
@@ -121,6 +244,25 @@ class vmmInspection(vmmGObject):
             self._process_queue_item(obj)
             self._q.task_done()
 
+    def _run_worker(self, work_q):
+        while True:
+            obj = work_q.get()
+            if obj is None:
+                return
+            conn, vm, force = obj
+            try:
+                self._process_vm(conn, vm, force)
+            except Exception:
+                logging.exception("Error processing inspection for %s",
+                                  vm.get_name())
+            finally:
+                with self._work_lock:
+                    requeue = self._pending_refresh.pop(vm.get_uuid(), None)
+                    if not requeue:
+                        self._in_progress.discard(vm.get_uuid())
+                if requeue:
+                    work_q.put(requeue + (True,))
+
     def _process_queue_item(self, obj):
         cmd = obj[0]
         if cmd == "conn_added":
@@ -150,6 +292,7 @@ class vmmInspection(vmmGObject):
                 # The VM was removed in the meanwhile.
                 return
 
+            force = False
             if cmd == "vm_refresh":
                 vmuuid = obj[3]
                 # When refreshing the inspection data of a VM,
@@ -157,10 +300,20 @@ class vmmInspection(vmmGObject):
                 # as the data itself will be replaced once the new
                 # results are available.
                 self._cached_data.pop(vmuuid, None)
-
-            self._process_vm(conn, vm)
-
-    def _process_vm(self, conn, vm):
+                force = True
+
+            with self._work_lock:
+                if vm.get_uuid() in self._in_progress:
+                    # Already being inspected. A refresh has to run
+                    # after that finishes, since the results in flight
+                    # may be stale
+                    if force:
+                        self._pending_refresh[vm.get_uuid()] = (conn, vm)
+                    return
+                self._in_progress.add(vm.get_uuid())
+            self._work_q.put((conn, vm, force))
+
+    def _process_vm(self, conn, vm, force=False):
         # Try processing a single VM, keeping into account whether it was
         # visited already, and whether there are cached data for it.
         def _set_vm_inspection_data(_data):
@@ -170,19 +323,35 @@ class vmmInspection(vmmGObject):
 
         prettyvm = conn.get_uri() + ":" + vm.get_name()
         vmuuid = vm.get_uuid()
-        if vmuuid in self._cached_data:
+        if not force and vmuuid in self._cached_data:
             data = self._cached_data.get(vmuuid)
             if vm.inspection != data:
                 logging.debug("Found cached data for %s", prettyvm)
                 _set_vm_inspection_data(data)
             return
 
+        # Only local VMs are inspected, so only they are cached on disk
+        use_disk_cache = not conn.is_remote() and not conn.is_test()
+        signature = None
+        if use_disk_cache:
+            signature = _get_disk_signature(vm)
+            data = not force and _load_disk_cache(vm, signature)
+            if data:
+                logging.debug("%s: using inspection results cached on disk",
+                              prettyvm)
+                _set_vm_inspection_data(data)
+                return
+
         try:
             data = self._inspect_vm(conn, vm)
         except Exception as e:
             data = _inspection_error(_("Error inspection VM: %s") % str(e))
             logging.exception("%s: exception while processing", prettyvm)
 
+        # Errors like a failed appliance launch may be transient,
+        # so only successful results are kept across restarts
+        if use_disk_cache and data and not data.errorstr:
+            _save_disk_cache(vm, signature, data)
         _set_vm_inspection_data(data)
 
     def _inspect_vm(self, conn, vm):
@@ -30,6 +30,7 @@ class vmmLibvirtObject(vmmGObject):
         self._support_isactive = None
 
         self._xmlobj = None
+        self._xmlobj_fetched_xml = None
         self._xmlobj_to_define = None
         self._is_xml_valid = False
 
@@ -107,6 +108,8 @@ class vmmLibvirtObject(vmmGObject):
         return self.class_name() == "nodedev"
     def is_interface(self):
         return self.class_name() == "interface"
+    def is_volume(self):
+        return self.class_name() == "volume"
 
     def change_name_backend(self, newbackend):
         # Used for changing the backing object after a rename
@@ -299,20 +302,30 @@ class vmmLibvirtObject(vmmGObject):
         Force an xml update. Signal 'state-changed' if domain xml has
         changed since last refresh
 
+        The XML string libvirt returned last time is kept around, and
+        if it is unchanged we keep using the existing parsed object.
+
         :param nosignal: If true, don't send state-changed. Used by
             callers that are going to send it anyways.
         """
-        origxml = None
-        if self._xmlobj:
-            origxml = self._xmlobj.get_xml()
-
         self._invalidate_xml()
         active_xml = self._XMLDesc(self._active_xml_flags)
-        self._xmlobj = self._parseclass(self.conn.get_backend(),
-            parsexml=active_xml)
+        changed = (self._xmlobj is None or
+                   active_xml != self._xmlobj_fetched_xml)
+        self.conn.count_xml_refresh(changed)
+
+        if changed:
+            self._xmlobj = self._parseclass(self.conn.get_backend(),
+                parsexml=active_xml)
+            self._xmlobj_fetched_xml = active_xml
         self._is_xml_valid = True
 
-        if not nosignal and origxml != active_xml:
+        if not changed:
+            return
+        if self.is_domain() or self.is_volume():
+            # Disk paths or volume backing stores may have changed
+            self.conn.get_backend().invalidate_path_index()
+        if not nosignal:
             self.idle_emit("state-changed")
 
     def get_xmlobj(self, inactive=False, refresh_if_nec=True):
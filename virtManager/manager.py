@@ -36,7 +36,12 @@ ROW_IS_CONN_CONNECTED,
 ROW_IS_VM,
 ROW_IS_VM_RUNNING,
 ROW_COLOR,
-ROW_INSPECTION_OS_ICON) = range(11)
+ROW_INSPECTION_OS_ICON,
+ROW_SORT_GUEST_CPU,
+ROW_SORT_HOST_CPU,
+ROW_SORT_MEM,
+ROW_SORT_DISK,
+ROW_SORT_NETWORK) = range(16)
 
 # Columns in the tree view
 (COL_NAME,
@@ -58,6 +63,20 @@ def _cmp(a, b):
     return ((a > b) - (a < b))
 
 
+def _get_stats_sort_keys(obj):
+    """
+    Numeric sort key values for the stats columns of a conn or vm row.
+    These are stored in the model so GTK can sort on them natively
+    """
+    return [
+        (ROW_SORT_GUEST_CPU, float(obj.guest_cpu_time_percentage())),
+        (ROW_SORT_HOST_CPU, float(obj.host_cpu_time_percentage())),
+        (ROW_SORT_MEM, float(obj.stats_memory())),
+        (ROW_SORT_DISK, float(obj.disk_io_rate())),
+        (ROW_SORT_NETWORK, float(obj.network_traffic_rate())),
+    ]
+
+
 def _get_inspection_icon_pixbuf(vm, w, h):
     # libguestfs gives us the PNG data as a string.
     png_data = vm.inspection.icon
@@ -160,6 +179,27 @@ class vmmManager(vmmGObjectUI):
         self.max_disk_rate = 10.0
         self.max_net_rate = 10.0
 
+        # conn/vm handle -> Gtk.TreeRowReference, which GTK keeps
+        # pointing at the right row through sorting
+        self._row_refs = {}
+
+        # vm handle -> {column name: stats vector} for the sparklines,
+        # dropped whenever the vm is sampled again
+        self._sparkline_data = {}
+
+        # VMs with a row on screen, which we ask to be polled at the
+        # fast stats rate
+        self._visible_vms = set()
+        self._visible_vms_pending = False
+        vmlist = self.widget("vm-list")
+        vmlist.get_vadjustment().connect("value-changed",
+                self._queue_visible_vms_refresh)
+        vmlist.get_vadjustment().connect("changed",
+                self._queue_visible_vms_refresh)
+        vmlist.connect("row-expanded", self._queue_visible_vms_refresh)
+        vmlist.connect("row-collapsed", self._queue_visible_vms_refresh)
+        self.model.connect("rows-reordered", self._queue_visible_vms_refresh)
+
         # Initialize stat polling columns based on global polling
         # preferences (we want signal handlers for this)
         self.enable_polling(COL_GUEST_CPU)
@@ -190,6 +230,7 @@ class vmmManager(vmmGObjectUI):
             self.prev_position = None
 
         vmmEngine.get_instance().increment_window_counter()
+        self._queue_visible_vms_refresh()
 
     def close(self, src_ignore=None, src2_ignore=None):
         if not self.is_visible():
@@ -199,6 +240,7 @@ class vmmManager(vmmGObjectUI):
         self.prev_position = self.topwin.get_position()
         self.topwin.hide()
         vmmEngine.get_instance().decrement_window_counter()
+        self._set_visible_vms(set())
 
         return 1
 
@@ -217,6 +259,9 @@ class vmmManager(vmmGObjectUI):
         self.connmenu.destroy()
         self.connmenu = None
         self.connmenu_items = None
+        self._set_visible_vms(set())
+        self._row_refs = {}
+        self._sparkline_data = {}
 
         if self._window_size:
             self.config.set_manager_window_size(*self._window_size)
@@ -322,6 +367,11 @@ class vmmManager(vmmGObjectUI):
         rowtypes.insert(ROW_IS_VM_RUNNING, bool)  # if VM is running
         rowtypes.insert(ROW_COLOR, str)  # row markup color string
         rowtypes.insert(ROW_INSPECTION_OS_ICON, GdkPixbuf.Pixbuf)  # OS icon
+        rowtypes.insert(ROW_SORT_GUEST_CPU, float)  # stats sort keys
+        rowtypes.insert(ROW_SORT_HOST_CPU, float)
+        rowtypes.insert(ROW_SORT_MEM, float)
+        rowtypes.insert(ROW_SORT_DISK, float)
+        rowtypes.insert(ROW_SORT_NETWORK, float)
 
         model = Gtk.TreeStore(*rowtypes)
         vmlist.set_model(model)
@@ -360,7 +410,7 @@ class vmmManager(vmmGObjectUI):
         self.spacer_txt.set_property("visible", False)
         nameCol.pack_end(self.spacer_txt, False)
 
-        def make_stats_column(title, colnum):
+        def make_stats_column(title, sortcol):
             col = Gtk.TreeViewColumn(title)
             col.set_min_width(140)
 
@@ -376,22 +426,21 @@ class vmmManager(vmmGObjectUI):
             col.pack_start(img, True)
             col.add_attribute(img, 'visible', ROW_IS_VM)
 
-            col.set_sort_column_id(colnum)
+            col.set_sort_column_id(sortcol)
             vmlist.append_column(col)
             return col
 
-        self.guestcpucol = make_stats_column(_("CPU usage"), COL_GUEST_CPU)
-        self.hostcpucol = make_stats_column(_("Host CPU usage"), COL_HOST_CPU)
-        self.memcol = make_stats_column(_("Memory usage"), COL_MEM)
-        self.diskcol = make_stats_column(_("Disk I/O"), COL_DISK)
-        self.netcol = make_stats_column(_("Network I/O"), COL_NETWORK)
+        # Stats columns sort natively on the numeric ROW_SORT_* values,
+        # which are refreshed once per stats sample
+        self.guestcpucol = make_stats_column(_("CPU usage"),
+                ROW_SORT_GUEST_CPU)
+        self.hostcpucol = make_stats_column(_("Host CPU usage"),
+                ROW_SORT_HOST_CPU)
+        self.memcol = make_stats_column(_("Memory usage"), ROW_SORT_MEM)
+        self.diskcol = make_stats_column(_("Disk I/O"), ROW_SORT_DISK)
+        self.netcol = make_stats_column(_("Network I/O"), ROW_SORT_NETWORK)
 
         model.set_sort_func(COL_NAME, self.vmlist_name_sorter)
-        model.set_sort_func(COL_GUEST_CPU, self.vmlist_guest_cpu_usage_sorter)
-        model.set_sort_func(COL_HOST_CPU, self.vmlist_host_cpu_usage_sorter)
-        model.set_sort_func(COL_MEM, self.vmlist_memory_usage_sorter)
-        model.set_sort_func(COL_DISK, self.vmlist_disk_io_sorter)
-        model.set_sort_func(COL_NETWORK, self.vmlist_network_usage_sorter)
         model.set_sort_column_id(COL_NAME, Gtk.SortType.ASCENDING)
 
 
@@ -423,20 +472,54 @@ class vmmManager(vmmGObjectUI):
         return handle.conn
 
     def get_row(self, conn_or_vm):
-        def _walk(model, rowiter, obj):
-            while rowiter:
-                row = model[rowiter]
-                if row[ROW_HANDLE] == obj:
-                    return row
-                if model.iter_has_child(rowiter):
-                    ret = _walk(model, model.iter_nth_child(rowiter, 0), obj)
-                    if ret:
-                        return ret
-                rowiter = model.iter_next(rowiter)
-
-        if not len(self.model):
+        rowref = self._row_refs.get(conn_or_vm)
+        if not rowref or not rowref.valid():
             return None
-        return _walk(self.model, self.model.get_iter_first(), conn_or_vm)
+        return self.model[rowref.get_path()]
+
+    def _append_row(self, parentiter, row):
+        model = self.model
+        rowiter = model.append(parentiter, row)
+        self._row_refs[row[ROW_HANDLE]] = Gtk.TreeRowReference.new(
+                model, model.get_path(rowiter))
+
+    def _remove_row(self, rowiter):
+        self._row_refs.pop(self.model[rowiter][ROW_HANDLE], None)
+        self._sparkline_data.pop(self.model[rowiter][ROW_HANDLE], None)
+        self.model.remove(rowiter)
+
+
+    def _set_visible_vms(self, newvms):
+        for vm in self._visible_vms - newvms:
+            vm.conn.statsmanager.remove_vm_watcher(vm, self)
+        for vm in newvms - self._visible_vms:
+            vm.conn.statsmanager.add_vm_watcher(vm, self)
+        self._visible_vms = newvms
+
+    def _refresh_visible_vms(self):
+        self._visible_vms_pending = False
+        newvms = set()
+
+        vmlist = self.widget("vm-list")
+        vrange = self.is_visible() and vmlist.get_visible_range() or None
+        if vrange:
+            start, end = vrange
+            for conn_row in self.model:
+                if not vmlist.row_expanded(conn_row.path):
+                    continue
+                for vm_row in conn_row.iterchildren():
+                    if (vm_row.path.compare(start) >= 0 and
+                        vm_row.path.compare(end) <= 0):
+                        newvms.add(vm_row[ROW_HANDLE])
+
+        self._set_visible_vms(newvms)
+
+    def _queue_visible_vms_refresh(self, *args):
+        ignore = args
+        if self._visible_vms_pending:
+            return
+        self._visible_vms_pending = True
+        self.idle_add(self._refresh_visible_vms)
 
 
     ####################
@@ -560,7 +643,7 @@ class vmmManager(vmmGObjectUI):
 
         vm_row = self._build_row(None, vm)
         conn_row = self.get_row(conn)
-        self.model.append(conn_row.iter, vm_row)
+        self._append_row(conn_row.iter, vm_row)
 
         vm.connect("state-changed", self.vm_changed)
         vm.connect("resources-sampled", self.vm_row_updated)
@@ -575,8 +658,9 @@ class vmmManager(vmmGObjectUI):
             rowiter = self.model.iter_nth_child(parent, rowidx)
             vm = self.model[rowiter][ROW_HANDLE]
             if vm.get_connkey() == connkey:
-                self.model.remove(rowiter)
+                self._remove_row(rowiter)
                 break
+        self._queue_visible_vms_refresh()
 
     def _build_conn_hint(self, conn):
         hint = conn.get_uri()
@@ -639,6 +723,8 @@ class vmmManager(vmmGObjectUI):
         row.insert(ROW_IS_VM_RUNNING, bool(vm) and vm.is_active())
         row.insert(ROW_COLOR, color)
         row.insert(ROW_INSPECTION_OS_ICON, os_icon)
+        for col, val in _get_stats_sort_keys(conn or vm):
+            row.insert(col, val)
 
         return row
 
@@ -649,7 +735,7 @@ class vmmManager(vmmGObjectUI):
             return
 
         conn_row = self._build_row(conn, None)
-        self.model.append(None, conn_row)
+        self._append_row(None, conn_row)
 
         conn.connect("vm-added", self.vm_added)
         conn.connect("vm-removed", self.vm_removed)
@@ -670,19 +756,36 @@ class vmmManager(vmmGObjectUI):
 
         child = self.model.iter_children(conn_row.iter)
         while child is not None:
-            self.model.remove(child)
+            self._remove_row(child)
             child = self.model.iter_children(conn_row.iter)
-        self.model.remove(conn_row.iter)
+        self._remove_row(conn_row.iter)
+        self._queue_visible_vms_refresh()
 
 
     #############################
     # State/UI updating methods #
     #############################
 
+    def _update_stats_sort_keys(self, row, obj):
+        """
+        Store new stats sort keys in the row. Only changed values are
+        set, since setting the active sort column re-sorts the row
+        """
+        cols = []
+        vals = []
+        for col, val in _get_stats_sort_keys(obj):
+            if row[col] != val:
+                cols.append(col)
+                vals.append(val)
+        if cols:
+            self.model.set(row.iter, cols, vals)
+
     def vm_row_updated(self, vm):
         row = self.get_row(vm)
         if row is None:
             return
+        self._sparkline_data.pop(vm, None)
+        self._update_stats_sort_keys(row, vm)
         self.model.row_changed(row.path, row.iter)
 
     def vm_changed(self, vm):
@@ -747,7 +850,7 @@ class vmmManager(vmmGObjectUI):
         if not conn.is_active():
             child = self.model.iter_children(row.iter)
             while child is not None:
-                self.model.remove(child)
+                self._remove_row(child)
                 child = self.model.iter_children(row.iter)
 
         self.conn_row_updated(conn)
@@ -760,6 +863,7 @@ class vmmManager(vmmGObjectUI):
         self.max_net_rate = max(self.max_net_rate,
                                 conn.network_traffic_max_rate())
 
+        self._update_stats_sort_keys(row, conn)
         self.model.row_changed(row.path, row.iter)
 
     def change_run_text(self, can_restore):
@@ -860,39 +964,6 @@ class vmmManager(vmmGObjectUI):
         key2 = str(model[iter2][ROW_SORT_KEY]).lower()
         return _cmp(key1, key2)
 
-    def vmlist_guest_cpu_usage_sorter(self, model, iter1, iter2, ignore):
-        obj1 = model[iter1][ROW_HANDLE]
-        obj2 = model[iter2][ROW_HANDLE]
-
-        return _cmp(obj1.guest_cpu_time_percentage(),
-                   obj2.guest_cpu_time_percentage())
-
-    def vmlist_host_cpu_usage_sorter(self, model, iter1, iter2, ignore):
-        obj1 = model[iter1][ROW_HANDLE]
-        obj2 = model[iter2][ROW_HANDLE]
-
-        return _cmp(obj1.host_cpu_time_percentage(),
-                   obj2.host_cpu_time_percentage())
-
-    def vmlist_memory_usage_sorter(self, model, iter1, iter2, ignore):
-        obj1 = model[iter1][ROW_HANDLE]
-        obj2 = model[iter2][ROW_HANDLE]
-
-        return _cmp(obj1.stats_memory(),
-                   obj2.stats_memory())
-
-    def vmlist_disk_io_sorter(self, model, iter1, iter2, ignore):
-        obj1 = model[iter1][ROW_HANDLE]
-        obj2 = model[iter2][ROW_HANDLE]
-
-        return _cmp(obj1.disk_io_rate(), obj2.disk_io_rate())
-
-    def vmlist_network_usage_sorter(self, model, iter1, iter2, ignore):
-        obj1 = model[iter1][ROW_HANDLE]
-        obj2 = model[iter2][ROW_HANDLE]
-
-        return _cmp(obj1.network_traffic_rate(), obj2.network_traffic_rate())
-
     def enable_polling(self, column):
         # pylint: disable=redefined-variable-type
         if column == COL_GUEST_CPU:
@@ -980,44 +1051,64 @@ class vmmManager(vmmGObjectUI):
     def toggle_stats_visible_network(self, src):
         self.toggle_stats_visible(src, COL_NETWORK)
 
+    def _set_sparkline_data(self, cell, obj, name, fetch_cb):
+        """
+        Hand the stats vector for obj to the sparkline cell. Vectors are
+        cached until the object's next stats sample, since cell data
+        funcs run for every row on every redraw
+        """
+        objdata = self._sparkline_data.setdefault(obj, {})
+        if name not in objdata:
+            objdata[name] = fetch_cb()
+
+        # Renderers cache the drawn graph per key, and only reuse it
+        # if the data matches, so a recycled id() is harmless
+        cell.set_property('cache_key', (id(obj), name))
+        cell.set_property('data_array', objdata[name])
+
     def guest_cpu_usage_img(self, column_ignore, cell, model, _iter, data):
         obj = model[_iter][ROW_HANDLE]
         if obj is None or not hasattr(obj, "conn"):
             return
 
-        data = obj.guest_cpu_time_vector(GRAPH_LEN)
-        cell.set_property('data_array', data)
+        self._set_sparkline_data(cell, obj, "guestcpu",
+                lambda: obj.guest_cpu_time_vector(GRAPH_LEN))
 
     def host_cpu_usage_img(self, column_ignore, cell, model, _iter, data):
         obj = model[_iter][ROW_HANDLE]
         if obj is None or not hasattr(obj, "conn"):
             return
 
-        data = obj.host_cpu_time_vector(GRAPH_LEN)
-        cell.set_property('data_array', data)
+        self._set_sparkline_data(cell, obj, "hostcpu",
+                lambda: obj.host_cpu_time_vector(GRAPH_LEN))
 
     def memory_usage_img(self, column_ignore, cell, model, _iter, data):
         obj = model[_iter][ROW_HANDLE]
         if obj is None or not hasattr(obj, "conn"):
             return
 
-        data = obj.stats_memory_vector(GRAPH_LEN)
-        cell.set_property('data_array', data)
+        self._set_sparkline_data(cell, obj, "memory",
+                lambda: obj.stats_memory_vector(GRAPH_LEN))
 
     def disk_io_img(self, column_ignore, cell, model, _iter, data):
         obj = model[_iter][ROW_HANDLE]
         if obj is None or not hasattr(obj, "conn"):
             return
 
-        d1, d2 = obj.disk_io_vectors(GRAPH_LEN, self.max_disk_rate)
-        data = [(x + y) / 2 for x, y in zip(d1, d2)]
-        cell.set_property('data_array', data)
+        def _fetch():
+            d1, d2 = obj.disk_io_vectors(GRAPH_LEN, self.max_disk_rate)
+            return [(x + y) / 2 for x, y in zip(d1, d2)]
+        self._set_sparkline_data(cell, obj,
+                ("disk", self.max_disk_rate), _fetch)
 
     def network_traffic_img(self, column_ignore, cell, model, _iter, data):
         obj = model[_iter][ROW_HANDLE]
         if obj is None or not hasattr(obj, "conn"):
             return
 
-        d1, d2 = obj.network_traffic_vectors(GRAPH_LEN, self.max_net_rate)
-        data = [(x + y) / 2 for x, y in zip(d1, d2)]
-        cell.set_property('data_array', data)
+        def _fetch():
+            d1, d2 = obj.network_traffic_vectors(GRAPH_LEN,
+                    self.max_net_rate)
+            return [(x + y) / 2 for x, y in zip(d1, d2)]
+        self._set_sparkline_data(cell, obj,
+                ("network", self.max_net_rate), _fetch)
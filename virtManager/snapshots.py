@@ -50,6 +50,17 @@ class vmmSnapshotPage(vmmGObjectUI):
         self._initial_populate = False
         self._unapplied_changes = False
 
+        # snapshot name -> Gtk.TreeRowReference, which GTK keeps
+        # pointing at the right row through sorting
+        self._snapshot_rows = {}
+        # snapshot name -> vmmDomainSnapshot for the listed rows
+        self._snapshot_map = {}
+        # Snapshots we've started fetching XML for. Only rows that are
+        # scrolled into view are fetched
+        self._details_requested = set()
+        self._details_generation = 0
+        self._details_pending = False
+
         self._snapmenu = None
         self._init_ui()
 
@@ -141,6 +152,11 @@ class vmmSnapshotPage(vmmGObjectUI):
         slist.set_tooltip_column(2)
         slist.append_column(col)
         slist.set_row_separator_func(_sep_cb, None)
+        slist.get_vadjustment().connect("value-changed",
+                self._queue_visible_details)
+        slist.get_vadjustment().connect("changed",
+                self._queue_visible_details)
+        model.connect("rows-reordered", self._queue_visible_details)
 
         # Snapshot popup menu
         menu = Gtk.Menu()
@@ -176,18 +192,22 @@ class vmmSnapshotPage(vmmGObjectUI):
             ignore = path
             try:
                 name = treemodel[it][0]
-                for snap in self.vm.list_snapshots():
-                    if name == snap.get_name():
-                        snaps.append(snap)
+                if name in snapmap:
+                    snaps.append(snapmap[name])
             except Exception:
                 pass
 
+        try:
+            snapmap = dict((s.get_name(), s) for s in self.vm.list_snapshots())
+        except Exception:
+            snapmap = {}
+
         snaps = []
         selection.selected_foreach(add_snap, snaps)
         return snaps
 
-    def _refresh_snapshots(self, select_name=None):
-        self.vm.refresh_snapshots()
+    def _refresh_snapshots(self, select_name=None, reload_xml=False):
+        self.vm.refresh_snapshots(reload_xml=reload_xml)
         self._populate_snapshot_list(select_name)
 
     def show_page(self):
@@ -199,59 +219,182 @@ class vmmSnapshotPage(vmmGObjectUI):
         self.widget("snapshot-notebook").set_current_page(1)
         self.widget("snapshot-error-label").set_text(msg)
 
-    def _populate_snapshot_list(self, select_name=None):
-        cursnaps = []
-        for i in self._get_selected_snapshots():
-            cursnaps.append(i.get_name())
+    def _build_snapshot_row(self, snap, failed=False):
+        """
+        Return the list model row for 'snap'. If its XML isn't loaded
+        yet, only the name, current and external status are filled in.
+        Those come from the bulk listing, so the row already sorts into
+        the right group. Parents aren't shown or sorted on, so they
+        aren't looked up at all.
+
+        If 'failed' is set, fetching the XML didn't work, and the row
+        says so instead of 'Loading...'
+        """
+        name = snap.get_name()
+        is_external = snap.is_external_known() and snap.is_external()
+        if is_external:
+            sortname = "3%s" % name
+            external = " (%s)" % _("External")
+        else:
+            external = ""
+            sortname = "1%s" % name
+
+        if not snap.is_xml_loaded():
+            status = failed and _("Error loading details") or _("Loading...")
+            label = "%s\n<span size='small'>%s%s</span>" % (
+                util.xml_escape(name), status, external)
+            return [name, label, None, None, sortname, snap.is_current()]
+
+        desc = snap.get_xmlobj().description
+        state = snap.run_status()
+        label = "%s\n<span size='small'>%s: %s%s</span>" % (
+            (util.xml_escape(name), _("VM State"),
+             util.xml_escape(state), external))
+        return [name, label, desc, snap.run_status_icon_name(),
+                sortname, snap.is_current()]
+
+    def _update_separator_row(self):
+        model = self.widget("snapshot-list").get_model()
+        sortnames = [row[4] for row in model if row[0]]
+        has_internal = any(n.startswith("1") for n in sortnames)
+        has_external = any(n.startswith("3") for n in sortnames)
+
+        for row in model:
+            if not row[0]:
+                if not (has_internal and has_external):
+                    model.remove(row.iter)
+                return
+        if has_internal and has_external:
+            model.append([None, None, None, None, "2", False])
+
+    def _update_snapshot_rows(self, snaps, failed=False):
+        model = self.widget("snapshot-list").get_model()
+        for snap in snaps:
+            rowref = self._snapshot_rows.get(snap.get_name())
+            if not rowref or not rowref.valid():
+                continue
+            model[rowref.get_path()] = self._build_snapshot_row(snap, failed)
+        self._update_separator_row()
+
+    def _load_visible_details(self):
+        """
+        Fetch and parse XML in a thread for the snapshots scrolled into
+        view, and fill in their list rows once they are all loaded
+        """
+        self._details_pending = False
+        if self.is_cleaned_up():
+            return
+
+        slist = self.widget("snapshot-list")
+        vrange = slist.get_visible_range()
+        if not vrange:
+            return
+
+        start, end = vrange
+        model = slist.get_model()
+        snaps = []
+        for idx in range(start.get_indices()[0], end.get_indices()[0] + 1):
+            snap = self._snapshot_map.get(model[idx][0])
+            if (not snap or snap.is_xml_loaded() or
+                snap.get_name() in self._details_requested):
+                continue
+            self._details_requested.add(snap.get_name())
+            snaps.append(snap)
+        if not snaps:
+            return
+
+        generation = self._details_generation
+        def _apply(loaded, failed):
+            if (self.is_cleaned_up() or
+                generation != self._details_generation):
+                return
+            # Retried the next time they are scrolled into view
+            for snap in failed:
+                self._details_requested.discard(snap.get_name())
+            self._update_snapshot_rows(loaded)
+            self._update_snapshot_rows(failed, failed=True)
+
+        def _load():
+            loaded = []
+            failed = []
+            for snap in snaps:
+                if generation != self._details_generation:
+                    return
+                try:
+                    snap.get_xmlobj()
+                except Exception:
+                    logging.debug("Error fetching XML for snapshot %s",
+                                  snap.get_name(), exc_info=True)
+                    failed.append(snap)
+                    continue
+                loaded.append(snap)
+            self.idle_add(_apply, loaded, failed)
+
+        self._start_thread(_load, "Snapshot XML lookup")
+
+    def _queue_visible_details(self, *args):
+        ignore = args
+        if self._details_pending:
+            return
+        self._details_pending = True
+        self.idle_add(self._load_visible_details)
 
+    def _populate_snapshot_list(self, select_name=None):
+        """
+        Sync the list with the VM's snapshots. Like _update_snapshot_rows,
+        rows are updated in place by name, so the selection and scroll
+        position survive a refresh. Only added and removed snapshots
+        add or remove rows.
+        """
         model = self.widget("snapshot-list").get_model()
-        model.clear()
+        selection = self.widget("snapshot-list").get_selection()
 
         try:
             snapshots = self.vm.list_snapshots()
         except Exception as e:
             logging.exception(e)
+            model.clear()
+            self._snapshot_map = {}
+            self._snapshot_rows = {}
             self._set_error_page(_("Error refreshing snapshot list: %s") %
                                 str(e))
             return
 
-        has_external = False
-        has_internal = False
-        for snap in snapshots:
-            desc = snap.get_xmlobj().description
-            name = snap.get_name()
-            state = snap.run_status()
-            if snap.is_external():
-                has_external = True
-                sortname = "3%s" % name
-                external = " (%s)" % _("External")
-            else:
-                has_internal = True
-                external = ""
-                sortname = "1%s" % name
-
-            label = "%s\n<span size='small'>%s: %s%s</span>" % (
-                (util.xml_escape(name), _("VM State"),
-                 util.xml_escape(state), external))
-            model.append([name, label, desc, snap.run_status_icon_name(),
-                          sortname, snap.is_current()])
-
-        if has_internal and has_external:
-            model.append([None, None, None, None, "2", False])
-
+        self._details_generation += 1
+        self._details_requested = set()
+        self._snapshot_map = dict((s.get_name(), s) for s in snapshots)
 
-        def check_selection(treemodel, path, it, snaps):
-            if select_name:
-                if treemodel[it][0] == select_name:
-                    selection.select_path(path)
-            elif treemodel[it][0] in snaps:
-                selection.select_path(path)
+        for name in list(self._snapshot_rows):
+            if name in self._snapshot_map:
+                continue
+            rowref = self._snapshot_rows.pop(name)
+            if rowref.valid():
+                model.remove(model.get_iter(rowref.get_path()))
 
-        selection = self.widget("snapshot-list").get_selection()
-        model = self.widget("snapshot-list").get_model()
-        selection.unselect_all()
-        model.foreach(check_selection, cursnaps)
+        for snap in snapshots:
+            row = self._build_snapshot_row(snap)
+            rowref = self._snapshot_rows.get(snap.get_name())
+            if rowref and rowref.valid():
+                treeiter = model.get_iter(rowref.get_path())
+                for col, value in enumerate(row):
+                    if model[treeiter][col] != value:
+                        model.set_value(treeiter, col, value)
+                continue
+            rowiter = model.append(row)
+            self._snapshot_rows[snap.get_name()] = Gtk.TreeRowReference.new(
+                    model, model.get_path(rowiter))
+        self._update_separator_row()
+
+        rowref = select_name and self._snapshot_rows.get(select_name)
+        if rowref:
+            selection.unselect_all()
+            selection.select_path(rowref.get_path())
+        else:
+            # The selection is untouched, but the selected snapshot's
+            # details may have changed
+            self._snapshot_selected(selection)
 
+        self._queue_visible_details()
         self._initial_populate = True
 
     def _make_screenshot_pixbuf(self, mime, sdata):
@@ -419,7 +562,7 @@ class vmmSnapshotPage(vmmGObjectUI):
         return newpix
 
     def _reset_new_state(self):
-        collidelist = [s.get_xmlobj().name for s in self.vm.list_snapshots()]
+        collidelist = [s.get_name() for s in self.vm.list_snapshots()]
         default_name = DomainSnapshot.find_free_name(
             self.vm.get_backend(), collidelist)
 
@@ -530,8 +673,10 @@ class vmmSnapshotPage(vmmGObjectUI):
         desc_widget = self.widget("snapshot-description")
         desc = desc_widget.get_buffer().get_property("text") or ""
 
-        xmlobj = snap.get_xmlobj()
-        origxml = xmlobj.get_xml()
+        # Edit a copy, the cached object is reused until libvirt
+        # reports different XML
+        origxml = snap.get_xmlobj().get_xml()
+        xmlobj = DomainSnapshot(self.vm.conn.get_backend(), parsexml=origxml)
         xmlobj.description = desc
         newxml = xmlobj.get_xml()
 
@@ -585,7 +730,7 @@ class vmmSnapshotPage(vmmGObjectUI):
         self.widget("snapshot-new-name").grab_focus()
 
     def _on_refresh_clicked(self, ignore):
-        self._refresh_snapshots()
+        self._refresh_snapshots(reload_xml=True)
 
     def _on_start_clicked(self, ignore, ignore2=None, ignore3=None):
         snaps = self._get_selected_snapshots()
@@ -647,7 +792,10 @@ class vmmSnapshotPage(vmmGObjectUI):
             return
 
         try:
+            was_loaded = snap[0].is_xml_loaded()
             self._set_snapshot_state(snap[0])
+            if not was_loaded:
+                self._update_snapshot_rows(snap)
         except Exception as e:
             logging.exception(e)
             self._set_error_page(_("Error selecting snapshot: %s") % str(e))
@@ -3,8 +3,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import array
 import logging
-import re
 import time
 
 import libvirt
@@ -14,42 +14,179 @@ from virtinst import util
 from .baseclass import vmmGObject
 
 
-class _VMStatsRecord(object):
+class _StatsRing(object):
     """
-    Tracks a set of VM stats for a single timestamp
+    Fixed capacity history of stats samples, newest first.
+
+    Each record name gets its own typed array. Every sample is written
+    twice, at index and index+capacity, so any window of the history
+    starting at the newest sample is a contiguous slice of the array,
+    and can be handed out as a memoryview without copying.
     """
-    def __init__(self, timestamp,
-                 cpuTime, cpuTimeAbs,
-                 cpuHostPercent, cpuGuestPercent,
-                 curmem, currMemPercent,
-                 diskRdBytes, diskWrBytes,
-                 netRxBytes, netTxBytes):
-        self.timestamp = timestamp
-        self.cpuTime = cpuTime
-        self.cpuTimeAbs = cpuTimeAbs
-        self.cpuHostPercent = cpuHostPercent
-        self.cpuGuestPercent = cpuGuestPercent
-        self.curmem = curmem
-        self.currMemPercent = currMemPercent
-        self.diskRdKiB = diskRdBytes // 1024
-        self.diskWrKiB = diskWrBytes // 1024
-        self.netRxKiB = netRxBytes // 1024
-        self.netTxKiB = netTxBytes // 1024
-
-        # These are set in _VMStatsList.append_stats
-        self.diskRdRate = None
-        self.diskWrRate = None
-        self.netRxRate = None
-        self.netTxRate = None
+    def __init__(self, fields, capacity):
+        self._fields = fields
+        self._capacity = 0
+        self._head = 0
+        self._count = 0
+        self._columns = {}
+        self.resize(capacity)
+
+    def __len__(self):
+        return self._count
+
+    def _new_column(self, typecode):
+        return array.array(typecode, [0]) * (self._capacity * 2)
+
+    def resize(self, capacity):
+        """
+        Change the amount of samples we keep, preserving the newest ones
+        """
+        capacity = max(int(capacity), 1)
+        if capacity == self._capacity:
+            return
+
+        keep = min(self._count, capacity)
+        oldvalues = {}
+        for name in self._fields:
+            oldvalues[name] = keep and self.view(name, keep).tolist() or []
+
+        self._capacity = capacity
+        self._head = 0
+        self._count = keep
+        for name, typecode in self._fields.items():
+            column = self._new_column(typecode)
+            values = oldvalues[name]
+            column[0:keep] = array.array(typecode, values)
+            column[capacity:capacity + keep] = array.array(typecode, values)
+            self._columns[name] = column
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        for name, typecode in self._fields.items():
+            self._columns[name] = self._new_column(typecode)
+
+    def append(self, **values):
+        """
+        Add a new sample. Record names not passed are stored as 0
+        """
+        capacity = self._capacity
+        head = (self._head - 1) % capacity
+        mirror = head + capacity
+        for name, column in self._columns.items():
+            value = values.get(name, 0)
+            column[head] = value
+            column[mirror] = value
+        self._head = head
+        self._count = min(self._count + 1, capacity)
+
+    def get_record(self, name, default=0):
+        """
+        Return the newest value for the passed record name
+        """
+        if not self._count:
+            return default
+        return self._columns[name][self._head]
+
+    def view(self, name, limit=None):
+        """
+        Return a zero-copy, newest first memoryview over the history
+        of the passed record name, padded with zeros up to the ring capacity.
+        The view tracks later append() calls, so copy it if the values
+        need to outlive the current sample
+        """
+        length = self._capacity
+        if limit is not None:
+            length = min(length, limit)
+        return memoryview(self._columns[name])[
+                self._head:self._head + length]
+
+    def scaled_view(self, name, limit=None, scale=100.0):
+        """
+        Like view(), but values are divided by 'scale' as they are read
+        """
+        return _ScaledStatsView([(self.view(name, limit), scale)])
+
+
+class _ScaledStatsView(object):
+    """
+    Read-only sequence over one or more _StatsRing views placed end to
+    end, with each value divided by its view's scale when it is read.
+    Graph code reads normalized values from this directly, so fetching
+    a vector for a redraw doesn't build a list.
+
+    Adding two of these chains their views, which is how graphs that
+    draw an in/out pair get both sets in one data array.
+    """
+    def __init__(self, parts):
+        # List of (memoryview, scale)
+        self._parts = parts
+        self._len = sum(len(view) for view, ignore in parts)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for view, scale in self._parts:
+            for val in view:
+                yield val / scale
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._len
+        if idx < 0 or idx >= self._len:
+            raise IndexError("stats view index out of range")
+        for view, scale in self._parts:
+            if idx < len(view):
+                return view[idx] / scale
+            idx -= len(view)
+
+    def __add__(self, other):
+        return _ScaledStatsView(self._parts + other._parts)
+
+
+_VM_STATS_FIELDS = {
+    "timestamp": "d",
+    "cpuTime": "q",
+    "cpuTimeAbs": "q",
+    "cpuHostPercent": "d",
+    "cpuGuestPercent": "d",
+    "curmem": "q",
+    "currMemPercent": "d",
+    "diskRdKiB": "q",
+    "diskWrKiB": "q",
+    "netRxKiB": "q",
+    "netTxKiB": "q",
+    "diskRdRate": "d",
+    "diskWrRate": "d",
+    "netRxRate": "d",
+    "netTxRate": "d",
+}
+
+
+_HOST_STATS_FIELDS = {
+    "timestamp": "d",
+    "memory": "q",
+    "memoryPercent": "d",
+    "cpuTime": "q",
+    "cpuHostPercent": "d",
+    "diskRdRate": "d",
+    "diskWrRate": "d",
+    "netRxRate": "d",
+    "netTxRate": "d",
+    "diskMaxRate": "d",
+    "netMaxRate": "d",
+}
 
 
 class _VMStatsList(vmmGObject):
     """
-    Tracks a list of VMStatsRecords for a single VM
+    Tracks the stats history for a single VM
     """
     def __init__(self):
         vmmGObject.__init__(self)
-        self._stats = []
+        self._stats = _StatsRing(_VM_STATS_FIELDS,
+                self.config.get_stats_history_length() + 1)
 
         self.diskRdMaxRate = 10.0
         self.diskWrMaxRate = 10.0
@@ -63,51 +200,54 @@ class _VMStatsList(vmmGObject):
     def _cleanup(self):
         pass
 
-    def append_stats(self, newstats):
-        expected = self.config.get_stats_history_length()
-        current = len(self._stats)
-        if current > expected:
-            del(self._stats[expected:current])
+    def append_stats(self, timestamp,
+                     cpuTime, cpuTimeAbs,
+                     cpuHostPercent, cpuGuestPercent,
+                     curmem, currMemPercent,
+                     diskRdBytes, diskWrBytes,
+                     netRxBytes, netTxBytes):
+        self._stats.resize(self.config.get_stats_history_length() + 1)
+
+        newstats = {
+            "timestamp": timestamp,
+            "cpuTime": int(cpuTime),
+            "cpuTimeAbs": int(cpuTimeAbs),
+            "cpuHostPercent": cpuHostPercent,
+            "cpuGuestPercent": cpuGuestPercent,
+            "curmem": int(curmem),
+            "currMemPercent": currMemPercent,
+            "diskRdKiB": int(diskRdBytes // 1024),
+            "diskWrKiB": int(diskWrBytes // 1024),
+            "netRxKiB": int(netRxBytes // 1024),
+            "netTxKiB": int(netTxBytes // 1024),
+        }
 
         def _calculate_rate(record_name):
             ret = 0.0
-            if self._stats:
-                oldstats = self._stats[0]
-                ratediff = (getattr(newstats, record_name) -
-                            getattr(oldstats, record_name))
-                timediff = newstats.timestamp - oldstats.timestamp
+            if len(self._stats):
+                ratediff = (newstats[record_name] -
+                            self._stats.get_record(record_name))
+                timediff = timestamp - self._stats.get_record("timestamp")
                 ret = float(ratediff) / float(timediff)
             return max(ret, 0.0)
 
-        newstats.diskRdRate = _calculate_rate("diskRdKiB")
-        newstats.diskWrRate = _calculate_rate("diskWrKiB")
-        newstats.netRxRate = _calculate_rate("netRxKiB")
-        newstats.netTxRate = _calculate_rate("netTxKiB")
+        newstats["diskRdRate"] = _calculate_rate("diskRdKiB")
+        newstats["diskWrRate"] = _calculate_rate("diskWrKiB")
+        newstats["netRxRate"] = _calculate_rate("netRxKiB")
+        newstats["netTxRate"] = _calculate_rate("netTxKiB")
 
-        self.diskRdMaxRate = max(newstats.diskRdRate, self.diskRdMaxRate)
-        self.diskWrMaxRate = max(newstats.diskWrRate, self.diskWrMaxRate)
-        self.netRxMaxRate = max(newstats.netRxRate, self.netRxMaxRate)
-        self.netTxMaxRate = max(newstats.netTxRate, self.netTxMaxRate)
+        self.diskRdMaxRate = max(newstats["diskRdRate"], self.diskRdMaxRate)
+        self.diskWrMaxRate = max(newstats["diskWrRate"], self.diskWrMaxRate)
+        self.netRxMaxRate = max(newstats["netRxRate"], self.netRxMaxRate)
+        self.netTxMaxRate = max(newstats["netTxRate"], self.netTxMaxRate)
 
-        self._stats.insert(0, newstats)
+        self._stats.append(**newstats)
 
     def get_record(self, record_name):
-        if not self._stats:
-            return 0
-        return getattr(self._stats[0], record_name)
+        return self._stats.get_record(record_name)
 
     def get_vector(self, record_name, limit, ceil=100.0):
-        vector = []
-        statslen = self.config.get_stats_history_length() + 1
-        if limit is not None:
-            statslen = min(statslen, limit)
-
-        for i in range(statslen):
-            if i < len(self._stats):
-                vector.append(getattr(self._stats[i], record_name) / ceil)
-            else:
-                vector.append(0)
-        return vector
+        return self._stats.scaled_view(record_name, limit, ceil)
 
     def get_in_out_vector(self, name1, name2, limit, ceil):
         if ceil is None:
@@ -116,6 +256,142 @@ class _VMStatsList(vmmGObject):
                 self.get_vector(name2, limit, ceil=ceil))
 
 
+class _HostStatsAggregate(object):
+    """
+    Running totals of the newest stats sample of every VM on a connection.
+
+    Each refresh_vm_stats call swaps the VM's previous contribution for
+    its new one, so host totals cost O(sampled VMs) per tick rather than
+    a rescan of every VM. The max rates only need a rescan when a VM
+    stops contributing.
+
+    Background VMs are sampled less often than the host stats are
+    recorded, so every contribution is a rate over that VM's own sample
+    interval: CPU is summed as cpuHostPercent rather than raw cpuTime.
+    """
+    FIELDS = ["cpuHostPercent", "curmem",
+              "diskRdRate", "diskWrRate",
+              "netRxRate", "netTxRate"]
+
+    def __init__(self):
+        self._contributions = {}
+        self._maxrates = {}
+        self._totals = dict.fromkeys(self.FIELDS, 0)
+        self.diskMaxRate = 10.0
+        self.netMaxRate = 10.0
+
+    def __len__(self):
+        return len(self._contributions)
+
+    def update(self, key, statslist, is_active):
+        """
+        Replace the contribution of VM key with the newest values
+        from statslist. Inactive VMs contribute nothing.
+        """
+        if not is_active:
+            self.remove(key)
+            return
+
+        newvalues = dict((name, statslist.get_record(name))
+                         for name in self.FIELDS)
+        self._swap_contribution(key, newvalues)
+
+        diskmax = max(statslist.diskRdMaxRate, statslist.diskWrMaxRate)
+        netmax = max(statslist.netRxMaxRate, statslist.netTxMaxRate)
+        self._maxrates[key] = (diskmax, netmax)
+        self.diskMaxRate = max(self.diskMaxRate, diskmax)
+        self.netMaxRate = max(self.netMaxRate, netmax)
+
+    def remove(self, key):
+        self._swap_contribution(key, None)
+        if self._maxrates.pop(key, None):
+            self._recalculate_max_rates()
+
+    def clear(self):
+        self._contributions = {}
+        self._maxrates = {}
+        self._totals = dict.fromkeys(self.FIELDS, 0)
+        self._recalculate_max_rates()
+
+    def _recalculate_max_rates(self):
+        self.diskMaxRate = 10.0
+        self.netMaxRate = 10.0
+        for diskmax, netmax in self._maxrates.values():
+            self.diskMaxRate = max(self.diskMaxRate, diskmax)
+            self.netMaxRate = max(self.netMaxRate, netmax)
+
+    def _swap_contribution(self, key, newvalues):
+        oldvalues = self._contributions.pop(key, None)
+        if oldvalues:
+            for name in self.FIELDS:
+                self._totals[name] -= oldvalues[name]
+        if newvalues:
+            for name in self.FIELDS:
+                self._totals[name] += newvalues[name]
+            self._contributions[key] = newvalues
+
+        if not self._contributions:
+            # Drop any float rounding leftovers
+            self._totals = dict.fromkeys(self.FIELDS, 0)
+
+    def get_total(self, name):
+        return max(self._totals[name], 0)
+
+
+class _DomainAllStats(object):
+    """
+    Compact numeric summary of one domain's getAllDomainStats reply
+    """
+    __slots__ = ["timestamp", "state", "guestcpus", "cpuTimeAbs",
+                 "balloonCurrent", "balloonUnused",
+                 "diskRdBytes", "diskWrBytes",
+                 "netRxBytes", "netTxBytes"]
+
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.state = 0
+        self.guestcpus = 0
+        self.cpuTimeAbs = 0
+        self.balloonCurrent = 1
+        self.balloonUnused = None
+        self.diskRdBytes = 0
+        self.diskWrBytes = 0
+        self.netRxBytes = 0
+        self.netTxBytes = 0
+
+
+def _parse_domain_all_stats(domallstats, timestamp):
+    """
+    Convert a getAllDomainStats dict of typed params into a
+    _DomainAllStats, summing the per-index block.N.* and net.N.* values,
+    in a single pass over the keys
+    """
+    ret = _DomainAllStats(timestamp)
+    for key, value in domallstats.items():
+        group, ignore, rest = key.partition(".")
+        if group == "block":
+            if rest.endswith(".rd.bytes"):
+                ret.diskRdBytes += value
+            elif rest.endswith(".wr.bytes"):
+                ret.diskWrBytes += value
+        elif group == "net":
+            if rest.endswith(".rx.bytes"):
+                ret.netRxBytes += value
+            elif rest.endswith(".tx.bytes"):
+                ret.netTxBytes += value
+        elif key == "state.state":
+            ret.state = value
+        elif key == "vcpu.current":
+            ret.guestcpus = value
+        elif key == "cpu.time":
+            ret.cpuTimeAbs = value
+        elif key == "balloon.current":
+            ret.balloonCurrent = value
+        elif key == "balloon.unused":
+            ret.balloonUnused = value
+    return ret
+
+
 class vmmStatsManager(vmmGObject):
     """
     Class for polling statistics
@@ -124,6 +400,10 @@ class vmmStatsManager(vmmGObject):
         vmmGObject.__init__(self)
         self._vm_stats = {}
         self._latest_all_stats = {}
+        self._host_stats = _StatsRing(_HOST_STATS_FIELDS,
+                self.config.get_stats_history_length() + 1)
+        self._host_aggregate = _HostStatsAggregate()
+        self._vm_watchers = {}
 
         self._all_stats_supported = True
         self._net_stats_supported = True
@@ -134,6 +414,7 @@ class vmmStatsManager(vmmGObject):
 
     def _cleanup(self):
         self._latest_all_stats = None
+        self._vm_watchers = {}
 
 
     ######################
@@ -150,7 +431,7 @@ class vmmStatsManager(vmmGObject):
     def _sample_cpu_stats(self, vm, allstats):
         timestamp = time.time()
         if (not vm.is_active() or
-            not self.config.get_stats_enable_cpu_poll()):
+            not self.config.stats.enable_cpu_poll):
             return 0, 0, 0, 0, timestamp
 
         cpuTime = 0
@@ -160,10 +441,10 @@ class vmmStatsManager(vmmGObject):
         prevCpuTime = self.get_vm_statslist(vm).get_record("cpuTimeAbs")
 
         if allstats:
-            state = allstats.get("state.state", 0)
-            guestcpus = allstats.get("vcpu.current", 0)
-            cpuTimeAbs = allstats.get("cpu.time", 0)
-            timestamp = allstats.get("virt-manager.timestamp")
+            state = allstats.state
+            guestcpus = allstats.guestcpus
+            cpuTimeAbs = allstats.cpuTimeAbs
+            timestamp = allstats.timestamp
         else:
             state, guestcpus, cpuTimeAbs = self._old_cpu_stats_helper(vm)
 
@@ -225,17 +506,12 @@ class vmmStatsManager(vmmGObject):
         statslist = self.get_vm_statslist(vm)
         if (not self._net_stats_supported or
             not vm.is_active() or
-            not self.config.get_stats_enable_net_poll()):
+            not self.config.stats.enable_net_poll):
             statslist.stats_net_skip = []
             return rx, tx
 
         if allstats:
-            for key in allstats.keys():
-                if re.match(r"net.[0-9]+.rx.bytes", key):
-                    rx += allstats[key]
-                if re.match(r"net.[0-9]+.tx.bytes", key):
-                    tx += allstats[key]
-            return rx, tx
+            return allstats.netRxBytes, allstats.netTxBytes
 
         for iface in vm.get_interface_devices_norefresh():
             dev = iface.target_dev
@@ -285,17 +561,12 @@ class vmmStatsManager(vmmGObject):
         statslist = self.get_vm_statslist(vm)
         if (not self._disk_stats_supported or
             not vm.is_active() or
-            not self.config.get_stats_enable_disk_poll()):
+            not self.config.stats.enable_disk_poll):
             statslist.stats_disk_skip = []
             return rd, wr
 
         if allstats:
-            for key in allstats.keys():
-                if re.match(r"block.[0-9]+.rd.bytes", key):
-                    rd += allstats[key]
-                if re.match(r"block.[0-9]+.wr.bytes", key):
-                    wr += allstats[key]
-            return rd, wr
+            return allstats.diskRdBytes, allstats.diskWrBytes
 
         # LXC has a special blockStats method
         if vm.conn.is_lxc() and self._disk_stats_lxc_supported:
@@ -366,7 +637,7 @@ class vmmStatsManager(vmmGObject):
         statslist = self.get_vm_statslist(vm)
         if (not self._mem_stats_supported or
             not vm.is_active() or
-            not self.config.get_stats_enable_memory_poll()):
+            not self.config.stats.enable_memory_poll):
             statslist.mem_stats_period_is_set = False
             return 0, 0
 
@@ -375,9 +646,11 @@ class vmmStatsManager(vmmGObject):
             statslist.mem_stats_period_is_set = True
 
         if allstats:
-            totalmem = allstats.get("balloon.current", 1)
-            curmem = max(0,
-                    totalmem - allstats.get("balloon.unused", totalmem))
+            totalmem = allstats.balloonCurrent
+            unused = allstats.balloonUnused
+            if unused is None:
+                unused = totalmem
+            curmem = max(0, totalmem - unused)
         else:
             totalmem, curmem = self._old_mem_stats_helper(vm)
 
@@ -396,15 +669,15 @@ class vmmStatsManager(vmmGObject):
             return {}
 
         statflags = 0
-        if self.config.get_stats_enable_cpu_poll():
+        if self.config.stats.enable_cpu_poll:
             statflags |= libvirt.VIR_DOMAIN_STATS_STATE
             statflags |= libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
             statflags |= libvirt.VIR_DOMAIN_STATS_VCPU
-        if self.config.get_stats_enable_memory_poll():
+        if self.config.stats.enable_memory_poll:
             statflags |= libvirt.VIR_DOMAIN_STATS_BALLOON
-        if self.config.get_stats_enable_disk_poll():
+        if self.config.stats.enable_disk_poll:
             statflags |= libvirt.VIR_DOMAIN_STATS_BLOCK
-        if self.config.get_stats_enable_net_poll():
+        if self.config.stats.enable_net_poll:
             statflags |= libvirt.VIR_DOMAIN_STATS_INTERFACE
         if statflags == 0:
             return {}
@@ -414,10 +687,12 @@ class vmmStatsManager(vmmGObject):
             timestamp = time.time()
             rawallstats = conn.get_backend().getAllDomainStats(statflags, 0)
 
-            # Reformat the output to be a bit more friendly
+            # Boil each reply down to the few numbers we sample, so the
+            # raw dicts can be freed straight away
             for dom, domallstats in rawallstats:
-                domallstats["virt-manager.timestamp"] = timestamp
-                ret[dom.UUIDString()] = domallstats
+                ret[dom.UUIDString()] = _parse_domain_all_stats(
+                        domallstats, timestamp)
+            del rawallstats
         except libvirt.libvirtError as err:
             if util.is_error_nosupport(err):
                 logging.debug("conn does not support getAllDomainStats()")
@@ -427,11 +702,61 @@ class vmmStatsManager(vmmGObject):
         return ret
 
 
+    #################
+    # Polling tiers #
+    #################
+
+    def _vm_sample_due(self, vm):
+        """
+        VMs shown in a details window or on screen in the manager list
+        are sampled every stats tick. Everything else is only sampled
+        every stats background-update-interval seconds, which saves the
+        per-device RPCs of the fallback stats path for every VM nobody
+        is looking at.
+        """
+        if self._vm_watchers.get(vm):
+            return True
+
+        statslist = self.get_vm_statslist(vm)
+        if not len(statslist):
+            return True
+
+        interval = self.config.stats.update_interval
+        bginterval = self.config.stats.background_update_interval
+        elapsed = time.time() - statslist.get_record("timestamp")
+        # Allow for tick jitter, otherwise we'd regularly slip a full tick
+        return elapsed >= (bginterval - interval / 2.0)
+
+    def add_vm_watcher(self, vm, watcher):
+        """
+        Register watcher as displaying stats for vm, moving it to the
+        fast polling tier
+        """
+        watchers = set(self._vm_watchers.get(vm, []))
+        watchers.add(watcher)
+        self._vm_watchers[vm] = watchers
+
+    def remove_vm_watcher(self, vm, watcher):
+        watchers = set(self._vm_watchers.get(vm, []))
+        watchers.discard(watcher)
+        if watchers:
+            self._vm_watchers[vm] = watchers
+        else:
+            self._vm_watchers.pop(vm, None)
+
+
     ##############
     # Public API #
     ##############
 
     def refresh_vm_stats(self, vm):
+        if not self._vm_sample_due(vm):
+            if not vm.is_active():
+                # Don't keep counting a VM that shut off since its
+                # last sample towards the host totals
+                self._host_aggregate.remove(vm)
+            return
+
         domallstats = self._latest_all_stats.get(vm.get_uuid(), None)
 
         (cpuTime, cpuTimeAbs, cpuHostPercent, cpuGuestPercent, timestamp) = \
@@ -440,17 +765,42 @@ class vmmStatsManager(vmmGObject):
         diskRdBytes, diskWrBytes = self._sample_disk_stats(vm, domallstats)
         netRxBytes, netTxBytes = self._sample_net_stats(vm, domallstats)
 
-        newstats = _VMStatsRecord(
+        statslist = self.get_vm_statslist(vm)
+        statslist.append_stats(
                 timestamp, cpuTime, cpuTimeAbs,
                 cpuHostPercent, cpuGuestPercent,
                 curmem, currMemPercent,
                 diskRdBytes, diskWrBytes,
                 netRxBytes, netTxBytes)
-        self.get_vm_statslist(vm).append_stats(newstats)
+        self._host_aggregate.update(vm, statslist, vm.is_active())
+
+    def remove_vm_stats(self, vm):
+        """
+        Drop all stats for a VM that disappeared from the connection
+        """
+        self._host_aggregate.remove(vm)
+        self._vm_watchers.pop(vm, None)
+        statslist = self._vm_stats.pop(vm.get_connkey(), None)
+        if statslist:
+            statslist.cleanup()
 
     def cache_all_stats(self, conn):
         self._latest_all_stats = self._get_all_stats(conn)
 
+    def get_host_aggregate(self):
+        """
+        Return the _HostStatsAggregate tracking the connection wide
+        totals of the latest VM samples
+        """
+        return self._host_aggregate
+
+    def get_host_statslist(self):
+        """
+        Return the _StatsRing holding the connection wide stats history,
+        filled in by vmmConnection
+        """
+        return self._host_stats
+
     def get_vm_statslist(self, vm):
         if vm.get_connkey() not in self._vm_stats:
             self._vm_stats[vm.get_connkey()] = _VMStatsList()
@@ -3,6 +3,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import collections
 import logging
 
 from gi.repository import Gdk
@@ -73,6 +74,13 @@ class vmmStorageList(vmmGObjectUI):
         self._name_hint = None
 
         self._active_edits = set()
+
+        # Pool connkey the vol list model was filled from, and
+        # vol connkey -> (xmlobj, path, row) for the rows in it
+        self._vol_list_pool = None
+        self._vol_row_cache = {}
+        self._vol_inuse_generation = 0
+
         self._addpool = None
         self._addvol = None
         self._volmenu = None
@@ -383,20 +391,21 @@ class vmmStorageList(vmmGObjectUI):
         uiutil.set_list_selection(pool_list,
             curpool and curpool.get_connkey() or None)
 
-    def _populate_vols(self):
-        list_widget = self.widget("vol-list")
-        pool = self._current_pool()
-        vols = pool and pool.get_volumes() or []
-        model = list_widget.get_model()
-        list_widget.get_selection().unselect_all()
-        model.clear()
-
-        vadj = self.widget("vol-scroll").get_vadjustment()
-        vscroll_percent = vadj.get_value() // max(vadj.get_upper(), 1)
-
-        for vol in vols:
-            key = vol.get_connkey()
-
+    def _build_vol_row(self, pool, vol):
+        """
+        Return (path, row) for the passed volume, or None if its info
+        can't be read. The XML derived values are cached against the
+        vol's XML object, which is replaced whenever the XML changes, so
+        unchanged volumes cost a dict lookup. The sensitive column
+        depends on the caller's callback rather than the XML, so it is
+        recomputed every time.
+        """
+        key = vol.get_connkey()
+        xmlobj = vol.get_xmlobj()
+        cached = self._vol_row_cache.get(key)
+        if cached and cached[0] is xmlobj:
+            path, row = cached[1:]
+        else:
             try:
                 path = vol.get_target_path()
                 name = vol.get_pretty_name(pool.get_type())
@@ -406,23 +415,7 @@ class vmmStorageList(vmmGObjectUI):
             except Exception:
                 logging.debug("Error getting volume info for '%s', "
                               "hiding it", key, exc_info=True)
-                continue
-
-            namestr = None
-            try:
-                if path:
-                    names = DeviceDisk.path_in_use_by(vol.conn.get_backend(),
-                                                       path)
-                    namestr = ", ".join(names)
-                    if not namestr:
-                        namestr = None
-            except Exception:
-                logging.exception("Failed to determine if storage volume in "
-                                  "use.")
-
-            sensitive = True
-            if self._vol_sensitive_cb:
-                sensitive = self._vol_sensitive_cb(fmt)
+                return None
 
             row = [None] * VOL_NUM_COLUMNS
             row[VOL_COLUMN_KEY] = key
@@ -430,13 +423,106 @@ class vmmStorageList(vmmGObjectUI):
             row[VOL_COLUMN_SIZESTR] = sizestr
             row[VOL_COLUMN_CAPACITY] = cap
             row[VOL_COLUMN_FORMAT] = fmt
-            row[VOL_COLUMN_INUSEBY] = namestr
-            row[VOL_COLUMN_SENSITIVE] = sensitive
-            model.append(row)
+            self._vol_row_cache[key] = (xmlobj, path, row)
+
+        row = row[:]
+        row[VOL_COLUMN_SENSITIVE] = True
+        if self._vol_sensitive_cb:
+            row[VOL_COLUMN_SENSITIVE] = self._vol_sensitive_cb(
+                    row[VOL_COLUMN_FORMAT])
+        return path, row
+
+    def _populate_vols(self):
+        """
+        Sync the vol list with the pool's volumes. Only rows for added,
+        removed or changed volumes are touched, so the selection and
+        scroll position survive a pool refresh.
+        """
+        list_widget = self.widget("vol-list")
+        pool = self._current_pool()
+        vols = pool and pool.get_volumes() or []
+        model = list_widget.get_model()
+
+        poolkey = pool and pool.get_connkey() or None
+        if poolkey != self._vol_list_pool:
+            list_widget.get_selection().unselect_all()
+            model.clear()
+            self._vol_row_cache = {}
+            self._vol_list_pool = poolkey
 
-        def _reset_vscroll_position():
-            vadj.set_value(vadj.get_upper() * vscroll_percent)
-        self.idle_add(_reset_vscroll_position)
+        newrows = collections.OrderedDict()
+        paths = []
+        for vol in vols:
+            ret = self._build_vol_row(pool, vol)
+            if not ret:
+                continue
+            path, row = ret
+            newrows[row[VOL_COLUMN_KEY]] = row
+            # Pathless vols are passed too, so a stale 'Used By' from
+            # when they had a path gets cleared
+            paths.append((row[VOL_COLUMN_KEY], path))
+
+        rowiters = {}
+        for row in model:
+            if row[VOL_COLUMN_KEY] in newrows:
+                rowiters[row[VOL_COLUMN_KEY]] = row.iter
+        for key in list(self._vol_row_cache):
+            if key not in newrows:
+                self._vol_row_cache.pop(key)
+
+        # ListStore iters stay valid across removal of other rows
+        for row in [r for r in model if r[VOL_COLUMN_KEY] not in rowiters]:
+            model.remove(row.iter)
+
+        for key, row in newrows.items():
+            treeiter = rowiters.get(key)
+            if treeiter is None:
+                model.append(row)
+                continue
+            for col, value in enumerate(row):
+                if col == VOL_COLUMN_INUSEBY:
+                    continue
+                if model[treeiter][col] != value:
+                    model.set_value(treeiter, col, value)
+
+        self._refresh_vols_inuse(paths)
+
+    def _refresh_vols_inuse(self, paths):
+        """
+        Fill in the 'Used By' column from a thread, since it needs to
+        consult every VM on the connection
+        """
+        self._vol_inuse_generation += 1
+        generation = self._vol_inuse_generation
+        backend = self.conn.get_backend()
+
+        def _apply(results):
+            if (self.is_cleaned_up() or
+                generation != self._vol_inuse_generation):
+                return
+            for row in self.widget("vol-list").get_model():
+                key = row[VOL_COLUMN_KEY]
+                if key in results and row[VOL_COLUMN_INUSEBY] != results[key]:
+                    row[VOL_COLUMN_INUSEBY] = results[key]
+
+        def _lookup():
+            results = {}
+            for key, path in paths:
+                if generation != self._vol_inuse_generation:
+                    return
+                if not path:
+                    results[key] = None
+                    continue
+                try:
+                    names = DeviceDisk.path_in_use_by(backend, path)
+                    results[key] = ", ".join(names) or None
+                except Exception:
+                    logging.exception("Failed to determine if storage "
+                                      "volume in use.")
+            self.idle_add(_apply, results)
+
+        if paths:
+            self._start_thread(_lookup, "Storage volume in-use lookup")
 
 
     ##########################
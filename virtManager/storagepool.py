@@ -214,6 +214,8 @@ class vmmStoragePool(vmmLibvirtObject):
 
     def _update_volumes(self, force):
         if not self.is_active():
+            if self._volumes:
+                self.conn.get_backend().invalidate_path_index()
             self._volumes = []
             return
         if not force and self._volumes is not None:
@@ -223,6 +225,8 @@ class vmmStoragePool(vmmLibvirtObject):
         (ignore, ignore, allvols) = pollhelpers.fetch_volumes(
             self.conn.get_backend(), self.get_backend(), keymap,
             lambda obj, key: vmmStorageVolume(self.conn, obj, key))
+        if allvols != self._volumes:
+            self.conn.get_backend().invalidate_path_index()
         self._volumes = allvols
 
 
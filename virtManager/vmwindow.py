@@ -172,6 +172,7 @@ class vmmVMWindow(vmmGObjectUI):
         if self._window_size:
             self.vm.set_details_window_size(*self._window_size)
 
+        self.conn.statsmanager.remove_vm_watcher(self.vm, self)
         self.conn.disconnect_by_obj(self)
         self.vm = None
 
@@ -183,6 +184,7 @@ class vmmVMWindow(vmmGObjectUI):
             return
 
         vmmEngine.get_instance().increment_window_counter()
+        self.conn.statsmanager.add_vm_watcher(self.vm, self)
         self.refresh_vm_state()
 
     def customize_finish(self, src):
@@ -228,6 +230,7 @@ class vmmVMWindow(vmmGObjectUI):
             return
 
         self.topwin.hide()
+        self.conn.statsmanager.remove_vm_watcher(self.vm, self)
         if self.console.details_viewer_is_visible():
             try:
                 self.console.details_close_viewer()
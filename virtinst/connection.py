@@ -15,6 +15,7 @@ from . import util
 from . import Capabilities
 from .guest import Guest
 from .nodedev import NodeDevice
+from .pathindex import DiskPathIndex
 from .storage import StoragePool, StorageVolume
 from .uri import URI, MagicURI
 
@@ -59,6 +60,8 @@ class VirtinstConnection(object):
 
         self._support_cache = {}
         self._fetch_cache = {}
+        self._path_index = None
+        self._path_index_valid = False
 
         # These let virt-manager register a callback which provides its
         # own cached object lists, rather than doing fresh calls
@@ -110,6 +113,7 @@ class VirtinstConnection(object):
         self._libvirtconn = None
         self._uri = None
         self._fetch_cache = {}
+        self._path_index = None
         return ret
 
     def fake_conn_predictable(self):
@@ -258,6 +262,30 @@ class VirtinstConnection(object):
             return self.cb_cache_new_pool(poolobj)
         return self._cache_new_pool_raw(poolobj)
 
+    def invalidate_path_index(self):
+        """
+        Tell us that the lists returned by the cb_fetch_all_* callbacks
+        have changed, so get_path_index needs to resync
+        """
+        self._path_index_valid = False
+
+    def get_path_index(self):
+        """
+        Returns a DiskPathIndex of all domains and volumes
+        """
+        if not self._path_index:
+            self._path_index = DiskPathIndex()
+
+        if not self._path_index_valid:
+            # Our own cached lists can be changed underneath us, so only
+            # trust the valid flag when virt-manager's callbacks provide
+            # the lists and call invalidate_path_index for us. Resyncing
+            # only costs an identity check for unchanged objects.
+            self._path_index_valid = bool(self.cb_fetch_all_domains)
+            self._path_index.sync(self.fetch_all_domains(),
+                                  self.fetch_all_vols())
+        return self._path_index
+
     def _fetch_all_nodedevs_raw(self):
         ignore, ignore, ret = pollhelpers.fetch_nodedevs(
             self, {}, lambda obj, ignore: obj)
@@ -208,43 +208,33 @@ class DeviceDisk(Device):
         if not path:
             return []
 
-        # Find all volumes that have 'path' somewhere in their backing chain
-        vols = []
-        volmap = dict((vol.backing_store, vol)
-                      for vol in conn.fetch_all_vols() if vol.backing_store)
-        backpath = path
-        while backpath in volmap:
-            vol = volmap[backpath]
-            if vol in vols:
-                break
-            backpath = vol.target_path
-            vols.append(backpath)
+        index = conn.get_path_index()
 
-        ret = []
-        vms = conn.fetch_all_domains()
-        for vm in vms:
-            if not read_only:
-                if path in [vm.os.kernel, vm.os.initrd, vm.os.dtb]:
-                    ret.append(vm.name)
+        # Find all volumes that have 'path' somewhere in their backing chain
+        vols = index.get_backed_paths(path)
+
+        def _uses_path(entries):
+            for (diskpath, is_boot, disk_shareable,
+                 disk_read_only) in entries:
+                if is_boot:
+                    if diskpath == path and not read_only:
+                        return True
                     continue
 
-            for disk in vm.devices.disk:
-                if disk.path in vols and vm.name not in ret:
+                if diskpath in vols:
                     # VM uses the path indirectly via backing store
-                    ret.append(vm.name)
-                    break
-
-                if disk.path != path:
+                    return True
+                if shareable and disk_shareable:
                     continue
-
-                if shareable and disk.shareable:
-                    continue
-                if read_only and disk.read_only:
+                if read_only and disk_read_only:
                     continue
+                return True
+            return False
 
+        ret = []
+        for vm, entries in index.get_users([path] + vols):
+            if _uses_path(entries):
                 ret.append(vm.name)
-                break
-
         return ret
 
     @staticmethod
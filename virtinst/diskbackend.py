@@ -6,6 +6,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import errno
 import logging
 import os
 import re
@@ -554,7 +555,6 @@ class CloneStorageCreator(_StorageCreator):
         # this priority takes an existing file.
 
         if (not os.path.exists(self._output_path) and self._sparse):
-            clone_block_size = 4096
             sparse = True
             fd = None
             try:
@@ -565,14 +565,10 @@ class CloneStorageCreator(_StorageCreator):
                 if fd:
                     os.close(fd)
         else:
-            clone_block_size = 1024 * 1024 * 10
             sparse = False
 
-        logging.debug("Local Cloning %s to %s, sparse=%s, block_size=%s",
-                      self._input_path, self._output_path,
-                      sparse, clone_block_size)
-
-        zeros = '\0' * 4096
+        logging.debug("Local Cloning %s to %s, sparse=%s",
+                      self._input_path, self._output_path, sparse)
 
         src_fd, dst_fd = None, None
         try:
@@ -580,25 +576,8 @@ class CloneStorageCreator(_StorageCreator):
                 src_fd = os.open(self._input_path, os.O_RDONLY)
                 dst_fd = os.open(self._output_path,
                                  os.O_WRONLY | os.O_CREAT, 0o640)
-
-                i = 0
-                while 1:
-                    l = os.read(src_fd, clone_block_size)
-                    s = len(l)
-                    if s == 0:
-                        meter.end(size_bytes)
-                        break
-                    # check sequence of zeros
-                    if sparse and zeros == l:
-                        os.lseek(dst_fd, s, 1)
-                    else:
-                        b = os.write(dst_fd, l)
-                        if s != b:
-                            meter.end(i)
-                            break
-                    i += s
-                    if i < size_bytes:
-                        meter.update(i)
+                _LocalCloner(src_fd, dst_fd, sparse, meter).clone()
+                meter.end(size_bytes)
             except OSError as e:
                 raise RuntimeError(_("Error cloning diskimage %s to %s: %s") %
                                 (self._input_path, self._output_path, str(e)))
@@ -609,6 +588,153 @@ class CloneStorageCreator(_StorageCreator):
                 os.close(dst_fd)
 
 
+class _LocalCloner(object):
+    """
+    Copy the contents of src_fd to dst_fd.
+
+    If sparse=True, dst_fd is a freshly truncated file, and we only copy
+    the regions of src_fd that contain data, leaving holes everywhere
+    else. Data regions are found with SEEK_DATA/SEEK_HOLE. If the source
+    filesystem can't tell us about holes, we fall back to reading the
+    source and skipping all zero blocks.
+
+    The actual copying is done with copy_file_range or sendfile where
+    the kernel supports it for the passed fds, otherwise with plain
+    read/write.
+    """
+    CHUNK_SIZE = 1024 * 1024 * 10
+    ZERO_BLOCK_SIZE = 1024 * 64
+
+    def __init__(self, src_fd, dst_fd, sparse, meter):
+        self._src_fd = src_fd
+        self._dst_fd = dst_fd
+        self._sparse = sparse
+        self._meter = meter
+
+        self._use_copy_file_range = hasattr(os, "copy_file_range")
+        self._use_sendfile = hasattr(os, "sendfile")
+        self._zeros = bytes(self.ZERO_BLOCK_SIZE)
+
+    def _data_extents(self, size):
+        """
+        Return a list of (offset, length) regions of the source that
+        may contain data. Returns None if the OS or filesystem doesn't
+        support SEEK_DATA/SEEK_HOLE
+        """
+        if not hasattr(os, "SEEK_DATA"):
+            return None
+
+        ret = []
+        offset = 0
+        while offset < size:
+            try:
+                start = os.lseek(self._src_fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # No more data after offset
+                    break
+                logging.debug("SEEK_DATA not supported: %s", e)
+                return None
+            end = min(os.lseek(self._src_fd, start, os.SEEK_HOLE), size)
+            ret.append((start, end - start))
+            offset = end
+        return ret
+
+    def _kernel_copy(self, offset, length):
+        """
+        Copy the region with copy_file_range or sendfile. Return the
+        number of bytes copied, or None if neither works for these fds
+        """
+        if self._use_copy_file_range:
+            try:
+                return os.copy_file_range(self._src_fd, self._dst_fd, length,
+                                          offset, offset)
+            except OSError as e:
+                if e.errno not in [errno.EXDEV, errno.EINVAL, errno.ENOSYS,
+                                   errno.EOPNOTSUPP, errno.EBADF]:
+                    raise
+                logging.debug("copy_file_range not usable: %s", e)
+                self._use_copy_file_range = False
+
+        if self._use_sendfile:
+            try:
+                os.lseek(self._dst_fd, offset, os.SEEK_SET)
+                return os.sendfile(self._dst_fd, self._src_fd, offset, length)
+            except OSError as e:
+                if e.errno not in [errno.EINVAL, errno.ENOSYS]:
+                    raise
+                logging.debug("sendfile not usable: %s", e)
+                self._use_sendfile = False
+
+        return None
+
+    def _write(self, offset, buf):
+        while buf:
+            ret = os.pwrite(self._dst_fd, buf, offset)
+            offset += ret
+            buf = buf[ret:]
+
+    def _write_nonzero(self, offset, buf):
+        """
+        Write buf at offset, skipping any all zero blocks so they
+        stay holes in the destination
+        """
+        # Comparing bytes slices is a memcmp, much faster than
+        # comparing memoryview slices
+        view = memoryview(buf)
+        blocksize = self.ZERO_BLOCK_SIZE
+        datastart = None
+        for blockstart in range(0, len(buf), blocksize):
+            block = buf[blockstart:blockstart + blocksize]
+            if block == self._zeros[:len(block)]:
+                if datastart is not None:
+                    self._write(offset + datastart,
+                                view[datastart:blockstart])
+                    datastart = None
+            elif datastart is None:
+                datastart = blockstart
+        if datastart is not None:
+            self._write(offset + datastart, view[datastart:])
+
+    def _copy_region(self, offset, length, skip_zeros):
+        end = offset + length
+        while offset < end:
+            count = min(self.CHUNK_SIZE, end - offset)
+            copied = None
+            if not skip_zeros:
+                copied = self._kernel_copy(offset, count)
+
+            if copied is None:
+                buf = os.pread(self._src_fd, count, offset)
+                copied = len(buf)
+                if skip_zeros:
+                    self._write_nonzero(offset, buf)
+                else:
+                    self._write(offset, buf)
+
+            if copied == 0:
+                # Source is shorter than we expected
+                break
+            offset += copied
+            self._meter.update(offset)
+
+    def clone(self):
+        size = os.lseek(self._src_fd, 0, os.SEEK_END)
+        if not self._sparse:
+            self._copy_region(0, size, False)
+            return
+
+        extents = self._data_extents(size)
+        if extents is None or extents == [(0, size)]:
+            # No hole info from the filesystem, or the file is fully
+            # allocated. Read it all and skip runs of zeros
+            self._copy_region(0, size, True)
+            return
+
+        for offset, length in extents:
+            self._copy_region(offset, length, False)
+
+
 class ManagedStorageCreator(_StorageCreator):
     """
     Handles storage creation via libvirt APIs. All the actual creation
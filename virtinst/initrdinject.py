@@ -4,53 +4,142 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import gzip
 import logging
 import os
-import shutil
-import subprocess
-import tempfile
+import stat
+import time
 
 
-def perform_initrd_injections(initrd, injections, scratchdir):
+class _CpioNewcWriter(object):
     """
-    Insert files into the root directory of the initial ram disk
+    Minimal writer for the 'newc' cpio format, the format the kernel
+    expects for initramfs archives. Equivalent to what we used to get
+    from `cpio --create --format=newc --owner=+0:+0`: every entry is
+    owned by root.
+    """
+    MAGIC = b"070701"
+    TRAILER = "TRAILER!!!"
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._offset = 0
+        self._ino = 0
+
+    def _write(self, data):
+        self._fileobj.write(data)
+        self._offset += len(data)
+
+    def _pad(self):
+        padlen = (4 - (self._offset % 4)) % 4
+        if padlen:
+            self._write(b"\0" * padlen)
+
+    def _write_header(self, name, mode, nlink, mtime, filesize):
+        self._ino += 1
+        namebytes = name.encode("utf-8") + b"\0"
+        fields = [self._ino, mode, 0, 0, nlink, int(mtime), filesize,
+                  0, 0, 0, 0, len(namebytes), 0]
+        self._write(self.MAGIC +
+                    b"".join(b"%08X" % field for field in fields))
+        self._write(namebytes)
+        self._pad()
+
+    def add_dir(self, name, mode, mtime):
+        self._write_header(name, stat.S_IFDIR | mode, 2, mtime, 0)
+
+    def add_file(self, name, path):
+        """
+        Stream the contents of 'path' into the archive as 'name'
+        """
+        with open(path, "rb") as src:
+            st = os.fstat(src.fileno())
+            self._write_header(name, stat.S_IFREG | stat.S_IMODE(st.st_mode),
+                               1, st.st_mtime, st.st_size)
+
+            remaining = st.st_size
+            while remaining:
+                data = src.read(min(remaining, self.CHUNK_SIZE))
+                if not data:
+                    raise RuntimeError(
+                        "%s changed size while adding it to the initrd" %
+                        path)
+                self._write(data)
+                remaining -= len(data)
+        self._pad()
+
+    def close(self):
+        self._write_header(self.TRAILER, 0, 1, 0, 0)
+
+
+def _open_compressor(fileobj, compression):
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", mtime=0)
+
+    if compression == "xz":
+        import lzma
+        # The kernel's xz decompressor only supports CRC32 checks
+        return lzma.LZMAFile(fileobj, "wb",
+                             format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC32)
+
+    if compression == "zstd":
+        try:
+            import zstandard  # pylint: disable=import-error
+        except ImportError:
+            raise RuntimeError(_("zstd initrd compression requires the "
+                                 "python zstandard module"))
+        return zstandard.ZstdCompressor().stream_writer(fileobj)
+
+    raise ValueError("Unknown initrd compression '%s'" % compression)
+
+
+def get_initrd_compressions():
+    """
+    Return the list of compression formats perform_initrd_injections
+    supports on this host
+    """
+    ret = ["gzip"]
+    try:
+        import lzma
+        ignore = lzma
+        ret.append("xz")
+    except ImportError:
+        pass
+    try:
+        import zstandard  # pylint: disable=import-error
+        ignore = zstandard
+        ret.append("zstd")
+    except ImportError:
+        pass
+    return ret
+
+
+def perform_initrd_injections(initrd, injections, compression="gzip"):
+    """
+    Insert files into the root directory of the initial ram disk.
+
+    The files are written to a compressed newc cpio archive appended
+    to the end of the initrd, which the kernel unpacks on top of the
+    original contents.
+
+    :param compression: One of get_initrd_compressions(). gzip works
+        with every kernel, xz and zstd need the matching decompressor
+        built into the guest kernel
     """
     if not injections:
         return
 
-    tempdir = tempfile.mkdtemp(dir=scratchdir)
-    os.chmod(tempdir, 0o775)
-
-    for filename in injections:
-        logging.debug("Copying %s to the initrd.", filename)
-        shutil.copy(filename, tempdir)
-
-    logging.debug("Appending to the initrd.")
-    find_proc = subprocess.Popen(['find', '.', '-print0'],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE,
-                                 cwd=tempdir)
-    cpio_proc = subprocess.Popen(['cpio', '--create', '--null', '--quiet',
-                                  '--format=newc', '--owner=+0:+0'],
-                                 stdin=find_proc.stdout,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE,
-                                 cwd=tempdir)
-    f = open(initrd, 'ab')
-    gzip_proc = subprocess.Popen(['gzip'], stdin=cpio_proc.stdout,
-                                 stdout=f, stderr=subprocess.PIPE)
-    cpio_proc.wait()
-    find_proc.wait()
-    gzip_proc.wait()
-    f.close()
-    shutil.rmtree(tempdir)
-
-    finderr = find_proc.stderr.read()
-    cpioerr = cpio_proc.stderr.read()
-    gziperr = gzip_proc.stderr.read()
-    if finderr:
-        logging.debug("find stderr=%s", finderr)
-    if cpioerr:
-        logging.debug("cpio stderr=%s", cpioerr)
-    if gziperr:
-        logging.debug("gzip stderr=%s", gziperr)
+    logging.debug("Appending %s to the initrd, compression=%s",
+                  injections, compression)
+    with open(initrd, "ab") as f:
+        compressor = _open_compressor(f, compression)
+        try:
+            writer = _CpioNewcWriter(compressor)
+            writer.add_dir(".", 0o775, time.time())
+            for filename in injections:
+                logging.debug("Adding %s to the initrd.", filename)
+                writer.add_file(os.path.basename(filename), filename)
+            writer.close()
+        finally:
+            compressor.close()
@@ -47,7 +47,7 @@ class InstallerTreeMedia(object):
 
       - A network URL: http://dl.fedoraproject.org/...
       - A local directory
-      - A local .iso file, which will be accessed with isoinfo
+      - A local .iso file
     """
 
     @staticmethod
@@ -157,9 +157,7 @@ class InstallerTreeMedia(object):
         if not self.location.startswith("/") and cache.kernel_url_arg:
             args += "%s=%s" % (cache.kernel_url_arg, self.location)
 
-        perform_initrd_injections(initrd,
-                                  self.initrd_injections,
-                                  fetcher.scratchdir)
+        perform_initrd_injections(initrd, self.initrd_injections)
 
         kernel, initrd, tmpvols = upload_kernel_initrd(
                 guest.conn, fetcher.scratchdir,
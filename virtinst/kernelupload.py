@@ -42,15 +42,6 @@ def _upload_file(conn, meter, destpool, src):
     Helper for uploading a file to a pool, via libvirt. Used for
     kernel/initrd upload when we can't access the system scratchdir
     """
-    # Build stream object
-    stream = conn.newStream(0)
-    def safe_send(data):
-        while True:
-            ret = stream.send(data)
-            if ret == 0 or ret == len(data):
-                break
-            data = data[ret:]
-
     meter = util.ensure_meter(meter)
 
     # Build placeholder volume
@@ -73,33 +64,7 @@ def _upload_file(conn, meter, destpool, src):
         raise RuntimeError("Failed to lookup scratch media volume")
 
     try:
-        # Register upload
-        offset = 0
-        length = size
-        flags = 0
-        vol.upload(stream, offset, length, flags)
-
-        # Open source file
-        fileobj = open(src, "rb")
-
-        # Start transfer
-        total = 0
-        meter.start(size=size,
-                    text=_("Transferring %s") % os.path.basename(src))
-        while True:
-            # blocksize = (1024 ** 2)
-            blocksize = 1024
-            data = fileobj.read(blocksize)
-            if not data:
-                break
-
-            safe_send(data)
-            total += len(data)
-            meter.update(total)
-
-        # Cleanup
-        stream.finish()
-        meter.end(size)
+        StorageVolume.upload_file(vol, src, meter=meter)
     except Exception:
         vol.delete(0)
         raise
@@ -0,0 +1,149 @@
+#
+# Copyright 2019 Red Hat, Inc.
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import threading
+
+
+class _GuestPaths(object):
+    """
+    Every storage path referenced by a single domain XML object
+    """
+    def __init__(self, guest):
+        self.guest = guest
+
+        # List of (path, is_boot, shareable, read_only)
+        self.entries = []
+        for path in [guest.os.kernel, guest.os.initrd, guest.os.dtb]:
+            if path:
+                self.entries.append((path, True, False, False))
+        for disk in guest.devices.disk:
+            if disk.path:
+                self.entries.append(
+                    (disk.path, False, disk.shareable, disk.read_only))
+
+
+class DiskPathIndex(object):
+    """
+    Map of storage paths to the domains using them, plus the reverse of
+    every volume's backing store, built from the connection's domain and
+    volume XML objects.
+
+    sync() is incremental. XML objects are immutable snapshots, and a
+    changed domain or volume shows up as a new object, so only objects
+    the index hasn't seen before are parsed, and entries for objects
+    that went away are dropped.
+
+    virt-manager looks up paths from worker threads, so all access is
+    serialized with a lock.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+
+        # id(guest) -> _GuestPaths. Holding a reference keeps ids unique
+        self._guests = {}
+        # id(guest) -> position in the last domain list, for stable output
+        self._order = {}
+        # path -> set of id(guest)
+        self._users = {}
+
+        # id(vol) -> (vol, backing_store, target_path)
+        self._vols = {}
+        # backing_store path -> {target_path: refcount}
+        self._backed = {}
+
+    def _add_guest(self, guest):
+        guestpaths = _GuestPaths(guest)
+        self._guests[id(guest)] = guestpaths
+        for entry in guestpaths.entries:
+            self._users.setdefault(entry[0], set()).add(id(guest))
+
+    def _remove_guest(self, key):
+        guestpaths = self._guests.pop(key)
+        for entry in guestpaths.entries:
+            users = self._users.get(entry[0])
+            if users is None:
+                continue
+            users.discard(key)
+            if not users:
+                self._users.pop(entry[0])
+
+    def _add_vol(self, vol):
+        backing = vol.backing_store
+        target = vol.target_path
+        self._vols[id(vol)] = (vol, backing, target)
+        if backing:
+            targets = self._backed.setdefault(backing, {})
+            targets[target] = targets.get(target, 0) + 1
+
+    def _remove_vol(self, key):
+        ignore, backing, target = self._vols.pop(key)
+        if not backing:
+            return
+        targets = self._backed[backing]
+        targets[target] -= 1
+        if not targets[target]:
+            targets.pop(target)
+        if not targets:
+            self._backed.pop(backing)
+
+    def sync(self, guests, vols):
+        """
+        Update the index to match the passed lists of Guest and
+        StorageVolume objects
+        """
+        with self._lock:
+            self._sync(guests, vols)
+
+    def _sync(self, guests, vols):
+        self._order = {}
+        for idx, guest in enumerate(guests):
+            self._order[id(guest)] = idx
+            if id(guest) not in self._guests:
+                self._add_guest(guest)
+        for key in [k for k in self._guests if k not in self._order]:
+            self._remove_guest(key)
+
+        volkeys = set()
+        for vol in vols:
+            volkeys.add(id(vol))
+            if id(vol) not in self._vols:
+                self._add_vol(vol)
+        for key in [k for k in self._vols if k not in volkeys]:
+            self._remove_vol(key)
+
+    def get_backed_paths(self, path):
+        """
+        Return the paths of all volumes that have 'path' somewhere
+        in their backing chain
+        """
+        ret = []
+        todo = [path]
+        with self._lock:
+            while todo:
+                for target in self._backed.get(todo.pop(0), {}):
+                    if target in ret or target == path:
+                        continue
+                    ret.append(target)
+                    todo.append(target)
+        return ret
+
+    def get_users(self, paths):
+        """
+        Return a list of (guest, entries) for every domain referencing
+        one of 'paths', in domain list order. 'entries' is the list of
+        (path, is_boot, shareable, read_only) for just those paths
+        """
+        ret = []
+        with self._lock:
+            keys = set()
+            for path in paths:
+                keys.update(self._users.get(path, []))
+
+            for key in sorted(keys, key=lambda k: self._order[k]):
+                guestpaths = self._guests[key]
+                entries = [e for e in guestpaths.entries if e[0] in paths]
+                ret.append((guestpaths.guest, entries))
+        return ret
@@ -4,6 +4,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import errno
 import os
 import logging
 import threading
@@ -532,10 +533,134 @@ class StoragePool(_StorageObject):
 
 
 
+class _StreamUploader(object):
+    """
+    Helper for pushing the contents of a local file into a volume
+    over a libvirt stream. Data is read in large chunks and partial
+    sends are resumed from a memoryview, so the amount of stream calls
+    scales with the file size over chunk_size, not with a tiny fixed
+    block size. With sparse=True, holes in the source file are
+    transferred as stream holes rather than as runs of zeroes.
+    """
+    DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, vol, src, meter, sparse=False, chunk_size=None):
+        self._vol = vol
+        self._src = src
+        self._meter = util.ensure_meter(meter)
+        self._chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        self._sparse = bool(sparse and
+            hasattr(libvirt, "VIR_STORAGE_VOL_UPLOAD_SPARSE_STREAM") and
+            hasattr(libvirt.virStream, "sparseSendAll"))
+        self._total = 0
+
+    def _progress(self, count):
+        self._total += count
+        self._meter.update(self._total)
+
+    @staticmethod
+    def _send(stream, data):
+        view = memoryview(data)
+        while view:
+            ret = stream.send(view)
+            if ret <= 0:
+                # A send that makes no progress would loop forever
+                raise RuntimeError("Error sending data to volume stream, "
+                                   "send returned %s" % ret)
+            view = view[ret:]
+
+    def _send_chunks(self, stream, fileobj):
+        while True:
+            data = fileobj.read(self._chunk_size)
+            if not data:
+                break
+            self._send(stream, data)
+            self._progress(len(data))
+
+    def _send_sparse(self, stream, fileobj):
+        fd = fileobj.fileno()
+
+        def _data_cb(_stream, nbytes, _opaque):
+            data = os.read(fd, nbytes)
+            self._progress(len(data))
+            return data
+
+        def _hole_cb(_stream, _opaque):
+            cur = os.lseek(fd, 0, os.SEEK_CUR)
+            try:
+                data = os.lseek(fd, cur, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                data = -1
+
+            if data < 0:
+                # Trailing hole, or EOF
+                ret = (False, os.lseek(fd, 0, os.SEEK_END) - cur)
+            elif data > cur:
+                ret = (False, data - cur)
+            else:
+                ret = (True, os.lseek(fd, data, os.SEEK_HOLE) - data)
+            os.lseek(fd, cur, os.SEEK_SET)
+            return ret
+
+        def _skip_cb(_stream, length, _opaque):
+            os.lseek(fd, length, os.SEEK_CUR)
+            self._progress(length)
+            return 0
+
+        stream.sparseSendAll(_data_cb, _hole_cb, _skip_cb, None)
+
+    def upload(self):
+        size = os.path.getsize(self._src)
+        flags = 0
+        if self._sparse:
+            flags |= libvirt.VIR_STORAGE_VOL_UPLOAD_SPARSE_STREAM
+        logging.debug("Uploading %s to volume %s, sparse=%s chunk_size=%s",
+                      self._src, self._vol.name(), self._sparse,
+                      self._chunk_size)
+
+        stream = self._vol.connect().newStream(0)
+        self._vol.upload(stream, 0, size, flags)
+        try:
+            self._meter.start(size=size,
+                text=_("Transferring %s") % os.path.basename(self._src))
+            with open(self._src, "rb") as fileobj:
+                if self._sparse:
+                    self._send_sparse(stream, fileobj)
+                else:
+                    self._send_chunks(stream, fileobj)
+            stream.finish()
+            self._meter.end(size)
+        except Exception:
+            try:
+                stream.abort()
+            except Exception:
+                logging.debug("Error aborting upload stream", exc_info=True)
+            raise
+        return self._total
+
+
 class StorageVolume(_StorageObject):
     """
     Base class for building and installing libvirt storage volume xml
     """
+    @staticmethod
+    def upload_file(vol, src, meter=None, sparse=False, chunk_size=None):
+        """
+        Upload the contents of local file 'src' into the existing
+        libvirt volume object 'vol'
+
+        :param sparse: Transfer holes in src as holes, if libvirt
+            supports sparse streams
+        :param chunk_size: Max number of bytes passed to a single
+            stream send call
+        :returns: Number of bytes transferred
+        """
+        uploader = _StreamUploader(vol, src, meter,
+                                   sparse=sparse, chunk_size=chunk_size)
+        return uploader.upload()
+
     @staticmethod
     def get_file_extension_for_format(fmt):
         if not fmt:
@@ -16,6 +16,9 @@ from .osdict import OSDB, OsMedia
 ###############################################
 
 class _DistroCache(object):
+    # Locations checked for the treeinfo file, in order
+    TREEINFO_FILES = [".treeinfo", "treeinfo"]
+
     def __init__(self, fetcher):
         self._fetcher = fetcher
         self._filecache = {}
@@ -33,6 +36,18 @@ class _DistroCache(object):
         self.libosinfo_os_variant = None
         self.libosinfo_mediaobj = None
 
+    def prefetch(self, paths):
+        """
+        Fetch all the passed paths in one go if the fetcher can do so
+        in parallel. Failures are cached too, so later probes for the
+        same missing file don't hit the network again
+        """
+        if not self._fetcher.can_fetch_concurrently():
+            return
+        paths = [p for p in paths if p not in self._filecache]
+        logging.debug("Prefetching %s", paths)
+        self._filecache.update(self._fetcher.acquireFileContents(paths))
+
     def acquire_file_content(self, path):
         if path not in self._filecache:
             try:
@@ -56,8 +71,11 @@ class _DistroCache(object):
         #
         # Anaconda is the canonical treeinfo consumer and they check for both
         # locations, so we need to do the same
-        treeinfostr = (self.acquire_file_content(".treeinfo") or
-            self.acquire_file_content("treeinfo"))
+        treeinfostr = None
+        for path in self.TREEINFO_FILES:
+            treeinfostr = self.acquire_file_content(path)
+            if treeinfostr:
+                break
         if treeinfostr is None:
             return None
 
@@ -285,6 +303,7 @@ def getDistroStore(guest, fetcher, skip_error):
     osobj = guest.osinfo
     stores = _build_distro_list(osobj)
     cache = _DistroCache(fetcher)
+    cache.prefetch(_get_probe_files(stores))
 
     for sclass in stores:
         if not sclass.is_valid(cache):
@@ -326,6 +345,10 @@ class _DistroTree(object):
     PRETTY_NAME = None
     matching_distros = []
 
+    # Files is_valid may fetch through the cache. They are all
+    # prefetched in parallel before detection starts
+    PROBE_FILES = []
+
     def __init__(self, location, arch, vmtype, cache):
         self.type = vmtype
         self.arch = arch
@@ -392,6 +415,7 @@ class _DistroTree(object):
 class _FedoraDistro(_DistroTree):
     PRETTY_NAME = "Fedora"
     matching_distros = ["fedora"]
+    PROBE_FILES = _DistroCache.TREEINFO_FILES
 
     @classmethod
     def is_valid(cls, cache):
@@ -426,6 +450,7 @@ class _FedoraDistro(_DistroTree):
 class _RHELDistro(_DistroTree):
     PRETTY_NAME = "Red Hat Enterprise Linux"
     matching_distros = ["rhel"]
+    PROBE_FILES = _DistroCache.TREEINFO_FILES
     _variant_prefix = "rhel"
 
     @classmethod
@@ -472,6 +497,7 @@ class _SuseDistro(_RHELDistro):
     matching_distros = []
     _variant_prefix = NotImplementedError
     famregex = NotImplementedError
+    PROBE_FILES = _DistroCache.TREEINFO_FILES + ["content"]
 
     @classmethod
     def is_valid(cls, cache):
@@ -624,6 +650,8 @@ class _DebianDistro(_DistroTree):
     # daily builds: https://d-i.debian.org/daily-images/amd64/
     PRETTY_NAME = "Debian"
     matching_distros = ["debian"]
+    PROBE_FILES = ["current/images/MANIFEST", "daily/MANIFEST",
+                   ".disk/info"]
     _debname = "debian"
 
     @classmethod
@@ -770,6 +798,7 @@ class _UbuntuDistro(_DebianDistro):
 class _ALTLinuxDistro(_DistroTree):
     PRETTY_NAME = "ALT Linux"
     matching_distros = ["altlinux"]
+    PROBE_FILES = [".disk/info"]
 
     def _set_manual_kernel_paths(self):
         self._kernel_paths = [
@@ -785,6 +814,7 @@ class _MandrivaDistro(_DistroTree):
     # ftp://ftp.uwsg.indiana.edu/linux/mandrake/official/2007.1/x86_64/
     PRETTY_NAME = "Mandriva/Mageia"
     matching_distros = ["mandriva", "mes"]
+    PROBE_FILES = ["VERSION"]
 
     @classmethod
     def is_valid(cls, cache):
@@ -807,6 +837,7 @@ class _GenericTreeinfoDistro(_DistroTree):
     """
     PRETTY_NAME = "Generic Treeinfo"
     matching_distros = []
+    PROBE_FILES = _DistroCache.TREEINFO_FILES
 
     @classmethod
     def is_valid(cls, cache):
@@ -847,6 +878,16 @@ def _make_all_stores():
     return allstores
 
 
+def _get_probe_files(stores):
+    """
+    Every file the passed stores' is_valid may fetch, in store order
+    """
+    ret = []
+    for store in stores:
+        ret += [p for p in store.PROBE_FILES if p not in ret]
+    return ret
+
+
 def _build_distro_list(osobj):
     allstores = ALLSTORES[:]
 
@@ -4,16 +4,235 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import concurrent.futures
+import errno
+import fcntl
 import ftplib
+import hashlib
 import io
+import json
 import logging
 import os
-import subprocess
+import struct
 import tempfile
+import threading
+import time
 import urllib
 
 import requests
 
+from . import util
+
+
+#############################################
+# Persistent cache of files fetched by HTTP #
+#############################################
+
+class _FetchCacheEntry(object):
+    """
+    A cached copy of a URL. 'fileobj' is opened at lookup time, so the
+    data stays readable even if another process evicts it meanwhile
+    """
+    def __init__(self, meta, fileobj):
+        self.meta = meta
+        self.fileobj = fileobj
+
+    def get_conditional_headers(self):
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+    def close(self):
+        self.fileobj.close()
+
+
+class _FetchCacheWriter(object):
+    """
+    Tee data written to the caller's fileobj into a temporary file in
+    the cache, hashing as we go so it can be stored by content
+    """
+    def __init__(self, cache, fileobj):
+        self._cache = cache
+        self._fileobj = fileobj
+        self._hash = hashlib.sha256()
+        self.size = 0
+        fd, self.tmppath = tempfile.mkstemp(
+                dir=cache.objdir, prefix=".tmp-")
+        self._tmpfile = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        self._fileobj.write(data)
+        self._tmpfile.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def finish(self):
+        self._tmpfile.close()
+        return self._hash.hexdigest()
+
+    def abort(self):
+        self._tmpfile.close()
+        try:
+            os.unlink(self.tmppath)
+        except OSError:
+            pass
+
+
+class _FetchCache(object):
+    """
+    Persistent cache of fetched install media files, shared by every
+    virt-install process for the user.
+
+    For each URL we store a small JSON file with the ETag, Last-Modified
+    and size the server reported, pointing at an object file named by
+    the sha256 of its content. Reusing an entry costs a conditional GET.
+    Every file is created under a temporary name and renamed into place,
+    so concurrent processes never see partial data. Objects are evicted
+    least recently used first once the cache exceeds MAX_SIZE.
+    """
+    MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+    def __init__(self, cachedir, max_size=None):
+        self.cachedir = cachedir
+        self.objdir = os.path.join(cachedir, "objects")
+        self.max_size = max_size or self.MAX_SIZE
+        os.makedirs(self.objdir, 0o755, exist_ok=True)
+
+    def _metapath(self, url):
+        return os.path.join(self.cachedir,
+                hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _objpath(self, digest):
+        return os.path.join(self.objdir, digest)
+
+    def lookup(self, url):
+        """
+        Return a _FetchCacheEntry for the URL, or None
+        """
+        try:
+            with open(self._metapath(url)) as f:
+                meta = json.load(f)
+            if meta.get("url") != url:
+                return None
+            objpath = self._objpath(meta["object"])
+            fileobj = open(objpath, "rb")
+        except (OSError, ValueError, KeyError):
+            return None
+
+        if os.fstat(fileobj.fileno()).st_size != meta.get("size"):
+            fileobj.close()
+            return None
+        return _FetchCacheEntry(meta, fileobj)
+
+    def touch(self, entry):
+        # Mark as recently used, for LRU eviction
+        try:
+            os.utime(self._objpath(entry.meta["object"]))
+        except OSError:
+            pass
+
+    def new_writer(self, fileobj):
+        return _FetchCacheWriter(self, fileobj)
+
+    def commit(self, writer, url, headers):
+        """
+        Store the data collected by writer as the content of URL
+        """
+        digest = writer.finish()
+        os.replace(writer.tmppath, self._objpath(digest))
+
+        meta = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "size": writer.size,
+            "object": digest,
+        }
+        fd, tmppath = tempfile.mkstemp(dir=self.cachedir, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmppath, self._metapath(url))
+        logging.debug("Stored %s in fetch cache as %s", url, digest)
+
+        self.evict()
+
+    def _remove_stale_entries(self):
+        """
+        Drop metadata pointing at objects that were evicted, and
+        temporary files left behind by killed processes
+        """
+        for name in os.listdir(self.cachedir):
+            path = os.path.join(self.cachedir, name)
+            try:
+                if name.startswith(".tmp-"):
+                    if os.stat(path).st_mtime < time.time() - (24 * 60 * 60):
+                        os.unlink(path)
+                    continue
+                if not name.endswith(".json"):
+                    continue
+
+                with open(path) as f:
+                    digest = json.load(f).get("object")
+                if digest and os.path.exists(self._objpath(digest)):
+                    continue
+                os.unlink(path)
+            except (OSError, ValueError, AttributeError):
+                continue
+
+    def evict(self):
+        """
+        Remove least recently used objects until we are under max_size,
+        along with any metadata that no longer has an object.
+        If another process is already evicting, leave it to them.
+        """
+        lockpath = os.path.join(self.cachedir, "lock")
+        with open(lockpath, "w") as lockfile:
+            try:
+                fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno in [errno.EAGAIN, errno.EACCES]:
+                    return
+                raise
+
+            objects = []
+            for name in os.listdir(self.objdir):
+                try:
+                    st = os.stat(os.path.join(self.objdir, name))
+                except OSError:
+                    continue
+                if name.startswith(".tmp-"):
+                    # Leftover from a killed process
+                    if st.st_mtime < time.time() - (24 * 60 * 60):
+                        objects.append((0, st.st_size, name))
+                    continue
+                objects.append((st.st_mtime, st.st_size, name))
+
+            total = sum(o[1] for o in objects)
+            for ignore, size, name in sorted(objects):
+                if total <= self.max_size:
+                    break
+                logging.debug("Evicting %s from fetch cache", name)
+                try:
+                    os.unlink(os.path.join(self.objdir, name))
+                except OSError:
+                    continue
+                total -= size
+
+            self._remove_stale_entries()
+
+
+def _get_fetch_cache():
+    if "VIRTINST_TEST_SUITE" in os.environ:
+        return None
+    try:
+        return _FetchCache(os.path.join(util.get_cache_dir(), "fetch"))
+    except Exception:
+        logging.debug("Error initializing fetch cache", exc_info=True)
+        return None
+
 
 ###########################################################################
 # Backends for the various URL types we support (http, https, ftp, local) #
@@ -163,12 +382,49 @@ class _URLFetcher(object):
         self._grabURL(filename, fileobj)
         return fileobj.getvalue().decode("utf-8")
 
+    def can_fetch_concurrently(self):
+        """
+        If acquireFileContents fetches the files in parallel, rather
+        than one after another
+        """
+        return False
+
+    def acquireFileContents(self, filenames):
+        """
+        Grab several small files from self.location, returning a dict
+        of filename->content string. Files that can't be fetched map
+        to None
+        """
+        ret = {}
+        for filename in filenames:
+            try:
+                ret[filename] = self.acquireFileContent(filename)
+            except ValueError:
+                logging.debug("Failed to acquire file=%s", filename)
+                ret[filename] = None
+        return ret
+
 
 class _HTTPURLFetcher(_URLFetcher):
     _session = None
+    _cache = None
+    _hasfile_cache = None
+
+    # Max number of requests acquireFileContents has in flight
+    _MAX_CONCURRENT = 8
+    # Seconds to wait for a connection or for data, so a stalled mirror
+    # fails the request instead of hanging it
+    _TIMEOUT = 30
 
     def _prepare(self):
         self._session = requests.Session()
+        # Let every concurrent probe keep its connection alive
+        adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=self._MAX_CONCURRENT)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._cache = _get_fetch_cache()
+        self._hasfile_cache = {}
 
     def _cleanup(self):
         if self._session:
@@ -183,40 +439,141 @@ class _HTTPURLFetcher(_URLFetcher):
 
     def _hasFile(self, url):
         """
-        We just do a HEAD request to see if the file exists
+        We just do a HEAD request to see if the file exists. The result
+        is remembered, so repeated probes of missing files are free
         """
+        if url in self._hasfile_cache:
+            return self._hasfile_cache[url]
+
+        ret = True
         try:
-            response = self._session.head(url, allow_redirects=True)
+            response = self._session.head(url, allow_redirects=True,
+                                          timeout=self._TIMEOUT)
             response.raise_for_status()
         except Exception as e:
             logging.debug("HTTP hasFile request failed: %s", str(e))
-            return False
+            ret = False
+        self._hasfile_cache[url] = ret
+        return ret
+
+    def can_fetch_concurrently(self):
         return True
 
-    def _grabber(self, url):
+    def acquireFileContents(self, filenames):
         """
-        Use requests for this
+        Issue all the requests at once over the pooled session, so
+        probing a high latency mirror takes about one round trip.
+        Each probe goes through the fetch cache like any other file,
+        and the meter shows the combined progress
         """
-        response = self._session.get(url, stream=True)
-        response.raise_for_status()
-        try:
-            size = int(response.headers.get('content-length'))
-        except Exception:
-            size = None
-        return response, size
+        if not filenames:
+            return {}
 
-    def _write(self, urlobj, fileobj):
-        """
-        The requests object doesn't have a file-like read() option, so
-        we need to implement it ourselves
-        """
+        lock = threading.Lock()
+        progress = {"total": 0}
+        meter = util.ensure_meter(self.meter)
+        meter.start(text=_("Probing install tree..."), size=None)
+
+        def _fetch(filename):
+            fileobj = io.BytesIO()
+            try:
+                self._grabURL(filename, fileobj,
+                              meter=util.ensure_meter(None))
+                content = fileobj.getvalue().decode("utf-8")
+            except Exception as e:
+                logging.debug("Failed to acquire file=%s: %s",
+                              filename, str(e))
+                content = None
+
+            url = self._make_full_url(filename)
+            with lock:
+                self._hasfile_cache[url] = content is not None
+                progress["total"] += len(fileobj.getvalue())
+                meter.update(progress["total"])
+            return content
+
+        workers = min(len(filenames), self._MAX_CONCURRENT)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            ret = dict(zip(filenames, executor.map(_fetch, filenames)))
+        meter.end(progress["total"])
+        return ret
+
+    def _copy(self, chunks, fileobj, meter):
         total = 0
-        for data in urlobj.iter_content(chunk_size=self._block_size):
+        for data in chunks:
             fileobj.write(data)
             total += len(data)
-            self.meter.update(total)
+            meter.update(total)
         return total
 
+    def _grabURL(self, filename, fileobj, meter=None):
+        """
+        Check the fetch cache with a conditional GET, and only download
+        the file if the server says our copy is out of date
+
+        :param meter: Meter to report progress with, instead of
+            self.meter. Used by concurrent probes
+        """
+        meter = meter or self.meter
+        url = self._make_full_url(filename)
+        text = _("Retrieving file %s...") % os.path.basename(filename)
+
+        entry = self._cache and self._cache.lookup(url)
+        try:
+            headers = entry and entry.get_conditional_headers() or {}
+            try:
+                response = self._session.get(url, stream=True,
+                                             headers=headers,
+                                             timeout=self._TIMEOUT)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            except Exception as e:
+                raise ValueError(_("Couldn't acquire file %s: %s") %
+                                   (url, str(e)))
+
+            if entry and response.status_code == 304:
+                logging.debug("Using cached copy of URI: %s", url)
+                response.close()
+                meter.start(text=text, size=entry.meta["size"])
+                self._cache.touch(entry)
+                chunks = iter(
+                    lambda: entry.fileobj.read(self._block_size), b"")
+                meter.end(self._copy(chunks, fileobj, meter))
+                return
+        finally:
+            if entry:
+                entry.close()
+
+        logging.debug("Fetching URI: %s", url)
+        try:
+            size = int(response.headers.get('content-length'))
+        except Exception:
+            size = None
+        meter.start(text=text, size=size)
+        chunks = response.iter_content(chunk_size=self._block_size)
+
+        # Without a validator we could never reuse the cached copy
+        if (not self._cache or
+            (not response.headers.get("etag") and
+             not response.headers.get("last-modified"))):
+            meter.end(self._copy(chunks, fileobj, meter))
+            return
+
+        writer = self._cache.new_writer(fileobj)
+        try:
+            total = self._copy(chunks, writer, meter)
+        except Exception:
+            writer.abort()
+            raise
+
+        try:
+            self._cache.commit(writer, url, response.headers)
+        except Exception:
+            logging.debug("Error storing %s in fetch cache",
+                          url, exc_info=True)
+            writer.abort()
+        meter.end(total)
+
 
 class _FTPURLFetcher(_URLFetcher):
     _ftp = None
@@ -290,37 +647,235 @@ class _LocalURLFetcher(_URLFetcher):
         return urlobj, size
 
 
+class _ISOFile(object):
+    """
+    File like object returned by _ISOReader.open, reading a file's
+    extents straight from the image
+    """
+    def __init__(self, fd, extents):
+        self._fd = fd
+        self._extents = list(extents)
+
+    def read(self, size):
+        while self._extents:
+            offset, remaining = self._extents[0]
+            if not remaining:
+                self._extents.pop(0)
+                continue
+
+            data = os.pread(self._fd, min(size, remaining), offset)
+            if not data:
+                raise RuntimeError("Unexpected end of ISO image")
+            self._extents[0] = (offset + len(data), remaining - len(data))
+            return data
+        return b""
+
+    def close(self):
+        self._extents = []
+
+
+class _ISOReader(object):
+    """
+    Minimal ISO9660 reader. The directory tree is walked once to build
+    an index of every path, and file data is read with pread directly
+    from the image, so nothing is buffered in memory.
+
+    Names come from the Joliet tree if there is one, which matches what
+    'isoinfo -J' used to report, otherwise from Rock Ridge NM entries,
+    falling back to plain ISO9660 names without the ';1' version suffix.
+    """
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDONLY)
+        self._block_size = 2048
+        self._joliet = False
+        self._rockridge = False
+        self._susp_skip = 0
+
+        # path -> list of (offset, length) extents
+        self._files = {}
+        self._dirs = set(["/"])
+
+        try:
+            self._build_index()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+
+    def _read(self, offset, length):
+        ret = b""
+        while len(ret) < length:
+            data = os.pread(self._fd, length - len(ret), offset + len(ret))
+            if not data:
+                raise RuntimeError("Unexpected end of ISO image")
+            ret += data
+        return ret
+
+    def _find_root_record(self):
+        primary = None
+        joliet = None
+
+        # Volume descriptors start at sector 16, the list ends with type 255
+        sector = 16
+        while True:
+            desc = self._read(sector * 2048, 2048)
+            if desc[1:6] != b"CD001":
+                raise RuntimeError("Not an ISO9660 image")
+            if desc[0] == 255:
+                break
+            if desc[0] == 1 and not primary:
+                primary = desc
+            elif desc[0] == 2 and desc[88:91] in [b"%/@", b"%/C", b"%/E"]:
+                joliet = desc
+            sector += 1
+
+        if not primary:
+            raise RuntimeError("No primary volume descriptor in ISO image")
+        self._block_size = struct.unpack_from("<H", primary, 128)[0]
+        if joliet:
+            self._joliet = True
+            return joliet[156:190]
+        return primary[156:190]
+
+    def _parse_susp(self, sysuse):
+        """
+        Return the Rock Ridge name from the passed System Use area
+        """
+        name = b""
+        areas = [sysuse[self._susp_skip:]]
+        while areas:
+            area = areas.pop(0)
+            pos = 0
+            while pos + 4 <= len(area):
+                sig = area[pos:pos + 2]
+                entrylen = area[pos + 2]
+                if entrylen < 4:
+                    break
+                if sig == b"NM":
+                    name += area[pos + 5:pos + entrylen]
+                elif sig == b"CE":
+                    block, offset, length = struct.unpack_from(
+                            "<I4xI4xI", area, pos + 4)
+                    areas.append(self._read(
+                        block * self._block_size + offset, length))
+                elif sig == b"ST":
+                    break
+                pos += entrylen
+        return name.decode("utf-8", "replace")
+
+    def _parse_record(self, record):
+        extent, length = struct.unpack_from("<I4xI", record, 2)
+        flags = record[25]
+        namelen = record[32]
+        rawname = record[33:33 + namelen]
+        sysuse = record[33 + namelen + ((namelen + 1) % 2):]
+        return extent, length, flags, rawname, sysuse
+
+    def _decode_name(self, rawname, sysuse):
+        name = None
+        if self._joliet:
+            name = rawname.decode("utf-16-be", "replace")
+        elif self._rockridge:
+            name = self._parse_susp(sysuse)
+
+        if not name:
+            name = rawname.decode("latin-1")
+            if not self._joliet:
+                name = name.split(";")[0]
+                if name.endswith("."):
+                    name = name[:-1]
+        elif self._joliet:
+            name = name.split(";")[0]
+        return name
+
+    def _build_index(self):
+        rootrecord = self._find_root_record()
+        rootextent, rootlength = self._parse_record(rootrecord)[:2]
+
+        todo = [("/", rootextent, rootlength)]
+        seen = set()
+        while todo:
+            dirpath, extent, length = todo.pop(0)
+            if extent in seen:
+                continue
+            seen.add(extent)
+
+            data = self._read(extent * self._block_size, length)
+            pos = 0
+            while pos < len(data):
+                reclen = data[pos]
+                if not reclen:
+                    # Records don't cross sectors, skip the padding
+                    pos = ((pos // self._block_size) + 1) * self._block_size
+                    continue
+
+                (childextent, childlength, flags,
+                 rawname, sysuse) = self._parse_record(data[pos:pos + reclen])
+                pos += reclen
+
+                if rawname == b"\0":
+                    # The root '.' entry says whether Rock Ridge is in use
+                    if (dirpath == "/" and not self._joliet and
+                        sysuse[0:2] == b"SP" and
+                        sysuse[4:6] == b"\xbe\xef"):
+                        self._rockridge = True
+                        self._susp_skip = sysuse[6]
+                    continue
+                if rawname == b"\1":
+                    continue
+
+                name = self._decode_name(rawname, sysuse)
+                path = os.path.join(dirpath, name)
+                if flags & 0x02:
+                    self._dirs.add(path)
+                    todo.append((path, childextent, childlength))
+                else:
+                    # Files over 4GiB are split into several records
+                    self._files.setdefault(path, []).append(
+                        (childextent * self._block_size, childlength))
+
+    def has_path(self, path):
+        return path in self._files or path in self._dirs
+
+    def get_size(self, path):
+        return sum(length for ignore, length in self._files[path])
+
+    def open(self, path):
+        return _ISOFile(self._fd, self._files[path])
+
+
 class _ISOURLFetcher(_URLFetcher):
-    _cache_file_list = None
+    _reader = None
     _is_iso = True
+    _block_size = 1024 * 1024
+
+    def _get_reader(self):
+        if not self._reader:
+            logging.debug("Indexing ISO %s", self.location)
+            self._reader = _ISOReader(self.location)
+        return self._reader
+
+    def _cleanup(self):
+        if self._reader:
+            self._reader.close()
+        self._reader = None
 
     def _grabber(self, url):
         """
-        Use isoinfo to grab the file
+        Stream the file's extents out of the ISO
         """
         if not self._hasFile(url):
-            raise RuntimeError("isoinfo didn't find file=%s" % url)
+            raise RuntimeError("didn't find file=%s in ISO" % url)
 
-        cmd = ["isoinfo", "-J", "-i", self.location, "-x", url]
-
-        logging.debug("Running isoinfo: %s", cmd)
-        output = subprocess.check_output(cmd)
-
-        return io.BytesIO(output), len(output)
+        reader = self._get_reader()
+        return reader.open(url), reader.get_size(url)
 
     def _hasFile(self, url):
-        """
-        Use isoinfo to list and search for the file
-        """
-        if not self._cache_file_list:
-            cmd = ["isoinfo", "-J", "-i", self.location, "-f"]
-
-            logging.debug("Running isoinfo: %s", cmd)
-            output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
-
-            self._cache_file_list = output.splitlines(False)
-
-        return url.encode("ascii") in self._cache_file_list
+        return self._get_reader().has_path(url)
 
 
 def fetcherForURI(uri, *args, **kwargs):
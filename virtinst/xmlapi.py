@@ -81,6 +81,33 @@ class _XPath(object):
         return self.join(self.segments[:-1])
 
 
+class _XPathCache(object):
+    """
+    Cache of parsed _XPath objects, keyed by the xpath string. The same
+    handful of property xpaths are split up over and over when parsing
+    or building a document, so only do it once. _XPath instances are
+    never altered after creation, so it's safe to share them.
+    """
+    # Rough upper bound, so a long running app that parses many differently
+    # shaped documents doesn't grow the cache forever
+    MAX_SIZE = 20000
+
+    def __init__(self):
+        self._cache = {}
+
+    def get(self, fullxpath):
+        ret = self._cache.get(fullxpath)
+        if ret is None:
+            if len(self._cache) >= self.MAX_SIZE:
+                self._cache = {}
+            ret = _XPath(fullxpath)
+            self._cache[fullxpath] = ret
+        return ret
+
+
+_XPathObjs = _XPathCache()
+
+
 class _XMLBase(object):
     NAMESPACES = {}
     @classmethod
@@ -132,7 +159,7 @@ class _XMLBase(object):
             return None
         if is_bool:
             return True
-        xpathobj = _XPath(xpath)
+        xpathobj = _XPathObjs.get(xpath)
         if xpathobj.is_prop:
             return self._node_get_property(node, xpathobj.propname)
         return self._node_get_text(node)
@@ -166,7 +193,7 @@ class _XMLBase(object):
         of whether it has children or not, and then clean up the XML
         chain
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _XPathObjs.get(fullxpath)
         parentnode = self._find(xpathobj.parent_xpath())
         childnode = self._find(fullxpath)
         if parentnode is None or childnode is None:
@@ -182,7 +209,7 @@ class _XMLBase(object):
             (expected_root_name, rootname))
 
     def _node_set_content(self, xpath, node, setval):
-        xpathobj = _XPath(xpath)
+        xpathobj = _XPathObjs.get(xpath)
         if setval is not None:
             setval = str(setval)
         if xpathobj.is_prop:
@@ -212,7 +239,7 @@ class _XMLBase(object):
         Even if <bar> didn't exist before. So we fill in the dependent property
         expression values
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _XPathObjs.get(fullxpath)
         parentxpath = "."
         parentnode = self._find(parentxpath)
         if parentnode is None:
@@ -246,7 +273,7 @@ class _XMLBase(object):
         if it doesn't have any children or attributes, so we don't
         leave stale elements in the XML
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _XPathObjs.get(fullxpath)
         segments = xpathobj.segments[:]
         parent = None
         while segments:
@@ -269,14 +296,33 @@ def node_is_text(n):
 
 
 class _Libxml2API(_XMLBase):
-    def __init__(self, xml):
+    def __init__(self, xml, copydoc=None):
         _XMLBase.__init__(self)
-        self._doc = libxml2.parseDoc(xml)
+        if copydoc:
+            self._doc = copydoc
+        else:
+            self._doc = libxml2.parseDoc(xml)
         self._ctx = self._doc.xpathNewContext()
         self._ctx.setContextNode(self._doc.children)
         for key, val in self.NAMESPACES.items():
             self._ctx.xpathRegisterNs(key, val)
 
+        # Results of xpathEval for this document, keyed by xpath. Any
+        # change to the document can change what an xpath points to,
+        # so every mutating _node_* call must _invalidate_index()
+        self._node_index = {}
+
+    def _invalidate_index(self):
+        if self._node_index:
+            self._node_index = {}
+
+    def _eval(self, xpath):
+        ret = self._node_index.get(xpath)
+        if ret is None:
+            ret = self._ctx.xpathEval(xpath) or []
+            self._node_index[xpath] = ret
+        return ret
+
     def __del__(self):
         self._doc.freeDoc()
         self._doc = None
@@ -292,15 +338,17 @@ class _Libxml2API(_XMLBase):
         return xml
 
     def copy_api(self):
-        return _Libxml2API(self._doc.children.serialize())
+        # Copy the parsed tree directly, rather than serializing it
+        # and parsing the result again
+        return _Libxml2API(None, copydoc=self._doc.copyDoc(1))
 
     def _find(self, fullxpath):
-        xpath = _XPath(fullxpath).xpath
-        node = self._ctx.xpathEval(xpath)
+        xpath = _XPathObjs.get(fullxpath).xpath
+        node = self._eval(xpath)
         return (node and node[0] or None)
 
     def count(self, xpath):
-        return len(self._ctx.xpathEval(xpath))
+        return len(self._eval(xpath))
 
     def _node_tostring(self, node):
         return node.serialize()
@@ -310,6 +358,7 @@ class _Libxml2API(_XMLBase):
     def _node_get_text(self, node):
         return node.content
     def _node_set_text(self, node, setval):
+        self._invalidate_index()
         if setval is not None:
             setval = util.xml_escape(setval)
         node.setContent(setval)
@@ -319,6 +368,8 @@ class _Libxml2API(_XMLBase):
         if prop:
             return prop.content
     def _node_set_property(self, node, propname, setval):
+        # Properties can be part of an xpath condition like [@foo='bar']
+        self._invalidate_index()
         if setval is None:
             prop = node.hasProp(propname)
             if prop:
@@ -349,6 +400,7 @@ class _Libxml2API(_XMLBase):
 
     def node_clear(self, xpath):
         node = self._find(xpath)
+        self._invalidate_index()
         if node:
             propnames = [p.name for p in (node.properties or [])]
             for p in propnames:
@@ -362,6 +414,7 @@ class _Libxml2API(_XMLBase):
         return node.name
 
     def _node_remove_child(self, parentnode, childnode):
+        self._invalidate_index()
         node = childnode
 
         # Look for preceding whitespace and remove it
@@ -376,6 +429,7 @@ class _Libxml2API(_XMLBase):
             parentnode.setContent(None)
 
     def _node_add_child(self, parentxpath, parentnode, newnode):
+        self._invalidate_index()
         ignore = parentxpath
         if not node_is_text(parentnode.get_last()):
             prevsib = parentnode.get_prev()
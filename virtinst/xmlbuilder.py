@@ -25,6 +25,24 @@ _allprops = []
 _seenprops = []
 
 
+def _xpath_node_names(xpath):
+    """
+    Return the element names an xpath walks through, without any
+    conditions or the final @prop. So ./source[@mode='bind']/@host
+    returns ['source']. Returns None if the xpath walks up the tree,
+    since then we can't tell which elements it touches.
+    """
+    ret = []
+    for segment in xpath.split("/"):
+        nodename = segment.split("[", 1)[0]
+        if nodename == "..":
+            return None
+        if nodename in ["", "."] or nodename.startswith("@"):
+            continue
+        ret.append(nodename)
+    return ret
+
+
 class _XMLPropertyCache(object):
     """
     Cache lookup tables mapping classes to their associated
@@ -33,9 +51,11 @@ class _XMLPropertyCache(object):
     def __init__(self):
         self._name_to_prop = {}
         self._prop_to_name = {}
+        self._prop_order = {}
+        self._dependent_children = {}
 
     def _get_prop_cache(self, cls, checkclass):
-        cachename = str(cls) + "-" + checkclass.__name__
+        cachename = (cls, checkclass)
         if cachename not in self._name_to_prop:
             ret = {}
             for c in reversed(type.mro(cls)[:-1]):
@@ -55,6 +75,57 @@ class _XMLPropertyCache(object):
     def get_prop_name(self, propinst):
         return self._prop_to_name[propinst]
 
+    def get_prop_order(self, inst):
+        """
+        Return the static parts of the XML write ordering for the class:
+        (ordered keys, set of ordered keys, trailing child prop keys).
+        Ordered keys are _XML_PROP_ORDER entries that are XMLProperty or
+        XMLChildProperty names, the trailing keys are the sorted child
+        props not mentioned in _XML_PROP_ORDER.
+
+        This is keyed on the class, since some classes (DeviceDisk etc)
+        extend _XML_PROP_ORDER in __init__, but do it identically for
+        every instance.
+        """
+        cls = inst.__class__
+        if cls not in self._prop_order:
+            xmlprops = self.get_xml_props(inst)
+            childprops = self.get_child_props(inst)
+            ordered = []
+            for key in inst._XML_PROP_ORDER:
+                if key in ordered:
+                    continue
+                if key in xmlprops or key in childprops:
+                    ordered.append(key)
+            orderset = set(ordered)
+            tail = [key for key in sorted(childprops) if key not in orderset]
+            self._prop_order[cls] = (ordered, orderset, tail)
+        return self._prop_order[cls]
+
+
+    def get_dependent_child_props(self, inst, propname):
+        """
+        Return the names of the list XMLChildProperty of inst whose
+        elements can be created or removed by writing the XMLProperty
+        propname to the XML. For DeviceDisk, writing ./source/@file can't
+        change what ./source/host matches, so that returns nothing.
+        """
+        cachename = (inst.__class__, propname)
+        if cachename not in self._dependent_children:
+            xmlprop = self.get_xml_props(inst)[propname]
+            propnodes = _xpath_node_names(xmlprop._xpath)
+            ret = []
+            for childname, childprop in self.get_child_props(inst).items():
+                if childprop.is_single:
+                    continue
+                childnodes = _xpath_node_names(childprop.get_prop_xpath(
+                    inst, childprop.child_class))
+                if (propnodes is None or childnodes is None or
+                    propnodes[:len(childnodes)] == childnodes):
+                    ret.append(childname)
+            self._dependent_children[cachename] = ret
+        return self._dependent_children[cachename]
+
 
 _PropCache = _XMLPropertyCache()
 
@@ -133,8 +204,9 @@ class XMLChildProperty(_XMLPropertyBase):
 
 
     def _get(self, xmlbuilder):
-        if self.propname not in xmlbuilder._propstore and not self.is_single:
-            xmlbuilder._propstore[self.propname] = []
+        if self.propname not in xmlbuilder._propstore:
+            # Child objects are only instantiated on first access
+            xmlbuilder._parse_child_prop(self)
         return xmlbuilder._propstore[self.propname]
 
     def _fget(self, xmlbuilder):
@@ -475,7 +547,6 @@ class XMLBuilder(object):
                                    relative_object_xpath)
 
         self._validate_xmlbuilder()
-        self._initial_child_parse()
 
     def _validate_xmlbuilder(self):
         # This is one time validation we run once per XMLBuilder class
@@ -499,28 +570,32 @@ class XMLBuilder(object):
 
         setattr(self.__class__, cachekey, True)
 
-    def _initial_child_parse(self):
-        # Walk the XML tree and hand of parsing to any registered
-        # child classes
-        for xmlprop in list(self._all_child_props().values()):
-            child_class = xmlprop.child_class
-            prop_path = xmlprop.get_prop_xpath(self, child_class)
+    def _parse_child_prop(self, xmlprop):
+        """
+        Hand off parsing of the XML at xmlprop's location to its child
+        class. This is called by XMLChildProperty on first access, so
+        objects like a parsed Guest don't pay for instantiating every
+        device if the caller only wants the name.
+        """
+        child_class = xmlprop.child_class
+        prop_path = xmlprop.get_prop_xpath(self, child_class)
 
-            if xmlprop.is_single:
-                obj = child_class(self.conn,
-                    parentxmlstate=self._xmlstate,
-                    relative_object_xpath=prop_path)
-                xmlprop.set(self, obj)
-                continue
+        if xmlprop.is_single:
+            obj = child_class(self.conn,
+                parentxmlstate=self._xmlstate,
+                relative_object_xpath=prop_path)
+            xmlprop.set(self, obj)
+            return
 
-            nodecount = self._xmlstate.xmlapi.count(
-                self._xmlstate.make_abs_xpath(prop_path))
-            for idx in range(nodecount):
-                idxstr = "[%d]" % (idx + 1)
-                obj = child_class(self.conn,
-                    parentxmlstate=self._xmlstate,
-                    relative_object_xpath=(prop_path + idxstr))
-                xmlprop.append(self, obj)
+        objs = []
+        nodecount = self._xmlstate.xmlapi.count(
+            self._xmlstate.make_abs_xpath(prop_path))
+        for idx in range(nodecount):
+            idxstr = "[%d]" % (idx + 1)
+            objs.append(child_class(self.conn,
+                parentxmlstate=self._xmlstate,
+                relative_object_xpath=(prop_path + idxstr)))
+        self._propstore[xmlprop.propname] = objs
 
     def __repr__(self):
         return "<%s %s %s>" % (self.__class__.__name__.split(".")[-1],
@@ -618,6 +693,18 @@ class XMLBuilder(object):
         """
         return _PropCache.get_child_props(self)
 
+    def _parsed_child_props(self):
+        """
+        Return the (propname, XMLChildProperty) pairs whose child objects
+        have been instantiated. Children that were never accessed have no
+        state outside of the XML document, so internal bookkeeping can
+        skip them; they will pick up the correct xpath and xmlapi
+        whenever they are first parsed.
+        """
+        return [(propname, xmlprop) for propname, xmlprop in
+                self._all_child_props().items()
+                if propname in self._propstore]
+
     def _find_child_prop(self, child_class):
         xmlprops = self._all_child_props()
         for xmlprop in list(xmlprops.values()):
@@ -636,7 +723,7 @@ class XMLBuilder(object):
         self._xmlstate.set_parent_xpath(parent_xpath)
         if relative_object_xpath != -1:
             self._xmlstate.set_relative_object_xpath(relative_object_xpath)
-        for propname in self._all_child_props():
+        for propname, ignore in self._parsed_child_props():
             for p in util.listify(getattr(self, propname, [])):
                 p._set_xpaths(self._xmlstate.abs_xpath())
 
@@ -647,7 +734,7 @@ class XMLBuilder(object):
         whenever child objects are added or removed
         """
         typecount = {}
-        for propname, xmlprop in self._all_child_props().items():
+        for propname, xmlprop in self._parsed_child_props():
             for obj in util.listify(getattr(self, propname)):
                 idxstr = ""
                 if not xmlprop.is_single:
@@ -666,7 +753,7 @@ class XMLBuilder(object):
         Set new backing XML objects in ourselves and all our child props
         """
         self._xmlstate.parse(*args, **kwargs)
-        for propname in self._all_child_props():
+        for propname, ignore in self._parsed_child_props():
             for p in util.listify(getattr(self, propname, [])):
                 p._parse_with_children(None, self._xmlstate)
 
@@ -727,6 +814,19 @@ class XMLBuilder(object):
         Callback that adds the implicitly tracked XML properties to
         the backing xml.
         """
+        if not self._xmlstate.is_build:
+            # Writing one of our own properties can create or remove
+            # elements that a not yet parsed child list matches, so
+            # parse those lists against the XML as it was before the
+            # change
+            xmlprops = self._all_xml_props()
+            for propname in list(self._propstore):
+                if propname not in xmlprops:
+                    continue
+                for childname in _PropCache.get_dependent_child_props(
+                        self, propname):
+                    getattr(self, childname)
+
         origpropstore = self._propstore.copy()
         origapi = self._xmlstate.xmlapi
         try:
@@ -741,23 +841,20 @@ class XMLBuilder(object):
         xmlprops = self._all_xml_props()
         childprops = self._all_child_props()
 
-        # Set up preferred XML ordering
-        do_order = [p for p in self._propstore if p not in childprops]
-        for key in reversed(self._XML_PROP_ORDER):
-            if key in do_order:
-                do_order.remove(key)
-                do_order.insert(0, key)
-            elif key in childprops:
-                do_order.insert(0, key)
-
-        for key in sorted(list(childprops.keys())):
-            if key not in do_order:
-                do_order.append(key)
+        # Set up preferred XML ordering: the _XML_PROP_ORDER props
+        # first, then any other set props in the order they were set,
+        # then the remaining child props
+        ordered, orderset, tail = _PropCache.get_prop_order(self)
+        do_order = [p for p in ordered
+                    if p in childprops or p in self._propstore]
+        do_order += [p for p in self._propstore
+                     if p not in orderset and p not in childprops]
+        do_order += tail
 
         # Alter the XML
         for key in do_order:
             if key in xmlprops:
                 xmlprops[key]._set_xml(self, self._propstore[key])
-            elif key in childprops:
+            elif key in childprops and key in self._propstore:
                 for obj in util.listify(getattr(self, key)):
                     obj._add_parse_bits(self._xmlstate.xmlapi)